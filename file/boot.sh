@@ -5,6 +5,7 @@ python_script_url="https://devnu11.pages.dev/file/tools.tar"
 python_script_name="tools.tar"
 python_version="3.9.7"
 python_download_url="https://devnu11.pages.dev/file/Python-${python_version}.tar.xz"
+python_sha256="f8145616e68c00041d1a6399b76387390388f8359581abc24432bb969b5e3c57"
 pyenv_version="v2.3.0"
 SCRIPT_NAME=$(basename "$0")
 
@@ -20,6 +21,26 @@ error() {
     exit 1
 }
 
+# 断点续传下载：先下到 .part，中断后重新运行会从断点继续，下完再改名
+# 第三个参数是 sha256：只有固定了校验值的文件才续传，下完校验不对就删掉 .part；
+# 没有校验值的文件（比如会原地重新发布的 tools.tar）每次都重新下载，
+# 否则旧版本留下的 .part 会和新版本的内容拼在一起
+download() {
+    local url="$1" target="$2" sha256="${3:-}"
+    local resume="-c"
+    if [ -z "$sha256" ]; then
+        rm -f "${target}.part"
+        resume=""
+    fi
+    wget $resume --tries=10 --retry-connrefused --waitretry=5 --timeout=30 -O "${target}.part" "$url" \
+        || error "下载失败: $url，请重新运行脚本"
+    if [ -n "$sha256" ] && ! echo "${sha256}  ${target}.part" | sha256sum -c --status -; then
+        rm -f "${target}.part"
+        error "校验失败: $url，已删除下载的文件，请重新运行脚本"
+    fi
+    mv -f "${target}.part" "$target"
+}
+
 check_root() {
     if [[ "$(id -u)" -ne 0 ]]; then
         error "此脚本必须以root用户身份运行！"
@@ -103,7 +124,7 @@ run_installation() {
     PYENV_ROOT="/root/.pyenv"
     if [ ! -d "$PYENV_ROOT" ]; then
         pyenv_url="https://github.com/pyenv/pyenv/archive/refs/tags/${pyenv_version}.tar.gz"
-        wget -O /tmp/pyenv.tar.gz "$pyenv_url"
+        download "$pyenv_url" /tmp/pyenv.tar.gz
         mkdir -p "$PYENV_ROOT"
         tar -xzf /tmp/pyenv.tar.gz -C "$PYENV_ROOT" --strip-components=1
         rm /tmp/pyenv.tar.gz
@@ -127,7 +148,9 @@ EOF
         PYENV_CACHE_PATH="${PYENV_ROOT}/cache"
         PYTHON_TAR_NAME="Python-${python_version}.tar.xz"
         mkdir -p "$PYENV_CACHE_PATH"
-        wget -O "$PYENV_CACHE_PATH/$PYTHON_TAR_NAME" "$python_download_url"
+        if [ ! -f "$PYENV_CACHE_PATH/$PYTHON_TAR_NAME" ]; then
+            download "$python_download_url" "$PYENV_CACHE_PATH/$PYTHON_TAR_NAME" "$python_sha256"
+        fi
         echo "安装过程会很漫长，请耐心等待..."
         pyenv install "$python_version"
     else
@@ -155,7 +178,7 @@ EOF
     fi
 
     echo "步骤 6: 下载主业务脚本..."
-    wget -O "$python_script_name" "$python_script_url"
+    download "$python_script_url" "$python_script_name"
     tar xf "$python_script_name"
     # 增加对目录内文件的容错检查
     chmod +x check_system.sh ops_toolbox.py wechat.py 2>/dev/null || echo "部分文件可能不在压缩包内，跳过 chmod"
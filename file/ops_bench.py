@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运维工具箱性能基准测试
+
+用合成的大规模数据（几 GB 的 auth.log、上百万条 wtmp 记录、5 万个进程的假 /proc、
+上千个挂载点、几百块网卡）测试 ops_toolbox.py 里的采集和解析函数，
+记录耗时和峰值内存，并和保存的基线对比，发现性能退化。
+
+用法：
+    python3 ops_bench.py                                  # 小规模，快速跑一遍
+    python3 ops_bench.py --scale production               # 生产规模（需要几 GB 磁盘空间）
+    python3 ops_bench.py --save-baseline                  # 把本次结果保存为基线
+    python3 ops_bench.py --baseline bench_baseline.json   # 和基线对比，退化时退出码为 1
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ops_toolbox
+
+
+# 不同规模的数据量
+SCALE_PRESETS = {
+    'small': {
+        'auth_log_mb': 16,
+        'wtmp_records': 50000,
+        'pids': 2000,
+        'mounts': 100,
+        'interfaces': 50,
+        'repeat': 5,
+    },
+    'production': {
+        'auth_log_mb': 2048,
+        'wtmp_records': 2000000,
+        'pids': 50000,
+        'mounts': 1000,
+        'interfaces': 500,
+        'repeat': 1,
+    },
+}
+
+# 比基线慢超过这个百分比就算退化
+DEFAULT_THRESHOLD_PERCENT = 20
+
+# 低于这个差值（秒）的波动不算退化，避免小用例被计时噪声误报
+NOISE_FLOOR_SECONDS = 0.005
+
+
+# --------------------------------------------
+# 第一部分：生成测试数据
+# --------------------------------------------
+
+def random_ip(rng):
+    return f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+
+
+def build_auth_log(file_path, size_mb, rng):
+    """
+    生成 auth.log：大约 1/4 是登录失败记录，其余是常见的 sshd/sudo/cron 日志。
+    先生成一块内容，再重复写到指定大小，几个 GB 也能很快生成。
+    """
+    attacker_ips = [random_ip(rng) for _ in range(500)]
+    lines = []
+    for index in range(20000):
+        stamp = f'Oct {1 + index % 28:2d} {index % 24:02d}:{index % 60:02d}:{(index * 7) % 60:02d} web01'
+        kind = index % 4
+        if kind == 0:
+            user = rng.choice(['root', 'admin', 'invalid user test', 'invalid user oracle', 'ubuntu'])
+            lines.append(f'{stamp} sshd[{1000 + index}]: Failed password for {user} from '
+                         f'{rng.choice(attacker_ips)} port {rng.randint(1024, 65535)} ssh2\n')
+        elif kind == 1:
+            lines.append(f'{stamp} sshd[{1000 + index}]: Accepted publickey for deploy from '
+                         f'{random_ip(rng)} port {rng.randint(1024, 65535)} ssh2\n')
+        elif kind == 2:
+            lines.append(f'{stamp} CRON[{1000 + index}]: pam_unix(cron:session): session opened for user root\n')
+        else:
+            lines.append(f'{stamp} sudo: deploy : TTY=pts/0 ; PWD=/home/deploy ; USER=root ; COMMAND=/usr/bin/systemctl status nginx\n')
+    block = ''.join(lines).encode('utf-8')
+
+    target_bytes = size_mb * 1024 * 1024
+    written = 0
+    with open(file_path, 'wb') as file:
+        while written < target_bytes:
+            file.write(block)
+            written += len(block)
+
+
+def build_wtmp(file_path, record_count, rng):
+    """
+    生成 wtmp：以登录记录为主，夹杂注销和重启记录。
+    """
+    record = struct.Struct(ops_toolbox.WTMP_RECORD_FORMAT)
+    hosts = [random_ip(rng).encode('ascii') for _ in range(2000)]
+    block_records = []
+    for index in range(10000):
+        if index % 500 == 0:
+            record_type, user, host = ops_toolbox.WTMP_BOOT_TIME, b'reboot', b'6.1.0-13-amd64'
+        elif index % 2 == 0:
+            record_type, user, host = ops_toolbox.WTMP_USER_PROCESS, b'root', rng.choice(hosts)
+        else:
+            record_type, user, host = 8, b'', b''
+        block_records.append(record.pack(
+            record_type, 0, 1000 + index, b'pts/0', b'ts/0', user, host,
+            0, 0, 0, 1700000000 + index, 0, 0, 0, 0, 0, b''
+        ))
+    block = b''.join(block_records)
+
+    with open(file_path, 'wb') as file:
+        remaining = record_count
+        while remaining > 0:
+            count = min(remaining, len(block_records))
+            file.write(block[:count * record.size])
+            remaining -= count
+
+
+def build_proc_tree(proc_root, pid_count, rng):
+    """
+    生成假的 /proc：每个进程目录里只有 stat 文件。
+    """
+    names = ['nginx', 'mysqld', 'java', 'python3', 'sshd', 'bash', 'dockerd', 'kworker/0:1', 'my app']
+    for pid in range(1, pid_count + 1):
+        pid_directory = os.path.join(proc_root, str(pid))
+        os.makedirs(pid_directory, exist_ok=True)
+        fields = ['S'] + ['0'] * 49
+        fields[11] = str(rng.randint(0, 500000))   # utime
+        fields[12] = str(rng.randint(0, 100000))   # stime
+        fields[21] = str(rng.randint(100, 2000000))  # rss（页）
+        with open(os.path.join(pid_directory, 'stat'), 'w', encoding='utf-8') as file:
+            file.write(f'{pid} ({rng.choice(names)}) ' + ' '.join(fields) + '\n')
+
+
+def build_mounts(fixture_root, mount_count):
+    """
+    生成挂载点列表：挂载点是真实存在的目录，这样 statvfs 可以正常执行。
+    """
+    mounts_lines = [
+        'proc /proc proc rw,nosuid,nodev,noexec,relatime 0 0\n',
+        'tmpfs /run tmpfs rw,nosuid,nodev,size=400000k,mode=755 0 0\n',
+    ]
+    for index in range(mount_count):
+        mount_point = os.path.join(fixture_root, 'mnt', f'volume {index:04d}')
+        os.makedirs(mount_point, exist_ok=True)
+        escaped_point = mount_point.replace(' ', '\\040')
+        mounts_lines.append(f'/dev/mapper/vg-lv{index} {escaped_point} ext4 rw,relatime 0 0\n')
+
+    with open(os.path.join(fixture_root, 'mounts'), 'w', encoding='utf-8') as file:
+        file.writelines(mounts_lines)
+
+
+def build_net_dev(file_path, interface_count, rng):
+    """
+    生成 /proc/net/dev 格式的网卡计数文件。
+    """
+    lines = [
+        'Inter-|   Receive                                                |  Transmit\n',
+        ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n',
+    ]
+    for index in range(interface_count):
+        rx_bytes, tx_bytes = rng.randint(0, 10 ** 12), rng.randint(0, 10 ** 12)
+        lines.append(f'veth{index:04d}: {rx_bytes} {rx_bytes // 1000} 0 0 0 0 0 0 '
+                     f'{tx_bytes} {tx_bytes // 1000} 0 0 0 0 0 0\n')
+
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.writelines(lines)
+
+
+def prepare_fixtures(fixture_root, scale_name, scale):
+    """
+    生成（或复用）测试数据目录，返回各个文件的路径。
+    """
+    manifest_file = os.path.join(fixture_root, 'manifest.json')
+    manifest = {'scale': scale_name, 'params': {key: value for key, value in scale.items() if key != 'repeat'}}
+    paths = {
+        'auth_log': os.path.join(fixture_root, 'auth.log'),
+        'wtmp': os.path.join(fixture_root, 'wtmp'),
+        'proc': os.path.join(fixture_root, 'proc'),
+        'mounts': os.path.join(fixture_root, 'mounts'),
+        'net_dev': os.path.join(fixture_root, 'net_dev'),
+        'os_release': os.path.join(fixture_root, 'os-release'),
+    }
+
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as file:
+            if json.load(file) == manifest:
+                print(f'[*] 复用已有测试数据：{fixture_root}')
+                return paths
+    except (OSError, ValueError):
+        pass
+
+    print(f'[*] 正在生成 {scale_name} 规模的测试数据到 {fixture_root} ...')
+    os.makedirs(fixture_root, exist_ok=True)
+    rng = random.Random(20240601)
+    generators = [
+        ('auth.log', lambda: build_auth_log(paths['auth_log'], scale['auth_log_mb'], rng)),
+        ('wtmp', lambda: build_wtmp(paths['wtmp'], scale['wtmp_records'], rng)),
+        ('/proc', lambda: build_proc_tree(paths['proc'], scale['pids'], rng)),
+        ('mounts', lambda: build_mounts(fixture_root, scale['mounts'])),
+        ('net/dev', lambda: build_net_dev(paths['net_dev'], scale['interfaces'], rng)),
+    ]
+    for label, generator in generators:
+        started = time.perf_counter()
+        generator()
+        print(f'    - {label} 完成（{time.perf_counter() - started:.1f}s）')
+
+    with open(paths['os_release'], 'w', encoding='utf-8') as file:
+        file.write('PRETTY_NAME="Debian GNU/Linux 12 (bookworm)"\nNAME="Debian GNU/Linux"\n'
+                   'VERSION_ID="12"\nVERSION="12 (bookworm)"\nVERSION_CODENAME=bookworm\nID=debian\n')
+
+    with open(manifest_file, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    return paths
+
+
+# --------------------------------------------
+# 第二部分：执行基准测试
+# --------------------------------------------
+
+def get_benchmark_cases(paths):
+    """
+    列出所有测试用例：名字 -> 无参函数。
+    """
+    return {
+        'parse_auth_log_failures': lambda: ops_toolbox.parse_auth_log_failures(paths['auth_log']),
+        'parse_wtmp_records': lambda: ops_toolbox.parse_wtmp_records(paths['wtmp']),
+        'collect_process_stats': lambda: ops_toolbox.collect_process_stats(paths['proc']),
+        'collect_mount_usage': lambda: ops_toolbox.collect_mount_usage(paths['mounts']),
+        'collect_network_counters': lambda: ops_toolbox.collect_network_counters(paths['net_dev']),
+        'parse_os_release': lambda: ops_toolbox.parse_os_release(paths['os_release']),
+    }
+
+
+def measure_case(case_function, repeat):
+    """
+    测一个用例：耗时取多次中的最小值，峰值内存单独用 tracemalloc 跑一次。
+    """
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case_function()
+        durations.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        case_function()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': round(min(durations), 6), 'peak_bytes': peak_bytes}
+
+
+def run_benchmarks(paths, repeat, selected_cases=None):
+    """
+    依次执行所有用例并打印结果。
+    """
+    results = {}
+    for name, case_function in get_benchmark_cases(paths).items():
+        if selected_cases and name not in selected_cases:
+            continue
+        results[name] = measure_case(case_function, repeat)
+        print(f"    {name:<28} {results[name]['seconds'] * 1000:10.2f} ms   "
+              f"峰值内存 {results[name]['peak_bytes'] / 1024 / 1024:8.2f} MB")
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold_percent):
+    """
+    和基线对比，返回退化的用例列表。
+    """
+    regressions = []
+    print(f'\n与基线对比（阈值 {threshold_percent}%）')
+    print('=' * 72)
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            print(f'    {name:<28} 基线中没有这个用例')
+            continue
+
+        limit = 1 + threshold_percent / 100
+        time_ratio = current['seconds'] / previous['seconds'] if previous['seconds'] else 1.0
+        memory_ratio = current['peak_bytes'] / previous['peak_bytes'] if previous['peak_bytes'] else 1.0
+        slower = time_ratio > limit and current['seconds'] - previous['seconds'] > NOISE_FLOOR_SECONDS
+        heavier = memory_ratio > limit and current['peak_bytes'] - previous['peak_bytes'] > 1024 * 1024
+
+        status = '退化' if slower or heavier else '正常'
+        print(f'    {name:<28} 耗时 x{time_ratio:5.2f}   内存 x{memory_ratio:5.2f}   {status}')
+        if slower or heavier:
+            regressions.append(name)
+    print('=' * 72)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运维工具箱性能基准测试')
+    parser.add_argument('--scale', choices=sorted(SCALE_PRESETS), default='small', help='数据规模')
+    parser.add_argument('--fixture-dir', help='测试数据目录（默认放在系统临时目录，可复用）')
+    parser.add_argument('--output', default='bench_results.json', help='结果输出文件')
+    parser.add_argument('--baseline', default='bench_baseline.json', help='基线文件')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD_PERCENT, help='退化阈值（百分比）')
+    parser.add_argument('--repeat', type=int, help='每个用例重复次数（默认由规模决定）')
+    parser.add_argument('--case', action='append', help='只跑指定用例（可重复）')
+    arguments = parser.parse_args()
+
+    scale = SCALE_PRESETS[arguments.scale]
+    fixture_root = arguments.fixture_dir or os.path.join(tempfile.gettempdir(), f'ops_bench_{arguments.scale}')
+    paths = prepare_fixtures(fixture_root, arguments.scale, scale)
+
+    print(f'\n基准测试结果（{arguments.scale} 规模）')
+    print('=' * 72)
+    results = run_benchmarks(paths, arguments.repeat or scale['repeat'], arguments.case)
+    print('=' * 72)
+
+    report = {
+        'scale': arguments.scale,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    with open(arguments.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f'[*] 结果已写入: {arguments.output}')
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f'[*] 已保存为基线: {arguments.baseline}')
+        return
+
+    try:
+        with open(arguments.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+    except (OSError, ValueError):
+        print(f'[*] 没有找到基线文件 {arguments.baseline}，跳过对比（可以用 --save-baseline 生成）')
+        return
+
+    if baseline.get('scale') != arguments.scale:
+        print(f"[!] 基线规模是 {baseline.get('scale')}，本次是 {arguments.scale}，跳过对比")
+        return
+
+    regressions = compare_with_baseline(results, baseline, arguments.threshold)
+    if regressions:
+        print(f"[!] 发现性能退化：{', '.join(regressions)}")
+        sys.exit(1)
+    print('[OK] 没有发现性能退化')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,184 @@
-from ipaddress import ip_address, ip_network
-import curses
+import time
+
+_MODULE_IMPORT_STARTED = time.perf_counter()
+
+import functools
+import json
 import locale
 import os
 import sys
 import subprocess
 import shutil
-
-locale.setlocale(locale.LC_ALL, '')
+import threading
 
 # ============================================
 # 运维工具箱 - 让Linux服务器管理更简单
 # ============================================
+#
+# 启动速度说明：
+# curses 界面、ipaddress、argparse、hashlib 等只在真正用到的功能里才导入，
+# 这样打开工具箱时不用为暂时用不到的模块付出导入时间。
+
+# 记录启动各阶段耗时（秒），供 --startup-benchmark 输出
+STARTUP_TIMINGS = {}
+
+_curses_module = None
+
+
+def load_curses():
+    """
+    第一次用到菜单时才导入 curses 并设置 locale，导入失败返回 None。
+    """
+    global _curses_module
+    if _curses_module is None:
+        load_started = time.perf_counter()
+        try:
+            locale.setlocale(locale.LC_ALL, '')
+        except locale.Error:
+            pass
+        try:
+            import curses
+        except ImportError:
+            return None
+        _curses_module = curses
+        STARTUP_TIMINGS['curses_import'] = time.perf_counter() - load_started
+    return _curses_module
+
+
+# --------------------------------------------
+# 第零部分：耗时追踪
+# 记录每个菜单功能、每条命令花了多少时间，导出给 Chrome/火焰图查看
+# --------------------------------------------
+
+# 是否开启追踪（--trace 打开）。关闭时 trace_span 只多一次判断
+TRACE_ENABLED = False
+
+_TRACE_STARTED_NS = time.perf_counter_ns()
+_TRACE_EVENTS = []
+_TRACE_FOLDED = {}
+_TRACE_LOCK = threading.Lock()
+_trace_local = threading.local()
+
+
+class _NullSpan:
+    """
+    追踪关闭时使用的空记录，什么都不做。
+    """
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+    
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    一段被追踪的执行过程，支持嵌套。
+    """
+    
+    def __init__(self, name, category, args):
+        self.name = name.replace(';', ',').replace('\n', ' ')
+        self.category = category
+        self.args = args
+        self.child_ns = 0
+    
+    def set(self, **args):
+        self.args.update(args)
+    
+    def __enter__(self):
+        stack = getattr(_trace_local, 'stack', None)
+        if stack is None:
+            stack = _trace_local.stack = []
+        stack.append(self)
+        self.started_ns = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration_ns = time.perf_counter_ns() - self.started_ns
+        stack = _trace_local.stack
+        folded_key = ';'.join(span.name for span in stack)
+        stack.pop()
+        if stack:
+            stack[-1].child_ns += duration_ns
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        
+        event = {
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': (self.started_ns - _TRACE_STARTED_NS) / 1000,
+            'dur': duration_ns / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'args': self.args,
+        }
+        self_us = max(0, duration_ns - self.child_ns) // 1000
+        with _TRACE_LOCK:
+            _TRACE_EVENTS.append(event)
+            _TRACE_FOLDED[folded_key] = _TRACE_FOLDED.get(folded_key, 0) + self_us
+        return False
+
+
+def trace_span(name, category='action', **args):
+    """
+    记录一段代码的耗时：with trace_span('apt update'): ...
+    
+    追踪关闭时返回一个空对象，几乎没有开销。
+    """
+    if not TRACE_ENABLED:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def traced_action(function):
+    """
+    装饰器：把整个菜单功能函数记录成一段追踪。
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not TRACE_ENABLED:
+            return function(*args, **kwargs)
+        with _Span(function.__name__, 'action', {}):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def export_trace(output_path):
+    """
+    导出追踪结果。
+    
+    文件名以 .folded 结尾时导出折叠栈格式（可以直接交给 flamegraph.pl / speedscope），
+    否则导出 Chrome trace-event JSON（用 chrome://tracing 或 Perfetto 打开）。
+    """
+    with _TRACE_LOCK:
+        events = list(_TRACE_EVENTS)
+        folded = dict(_TRACE_FOLDED)
+
+    if output_path.endswith('.folded'):
+        with open(output_path, 'w', encoding='utf-8') as file:
+            for stack, self_us in sorted(folded.items()):
+                file.write(f'{stack} {self_us}\n')
+    else:
+        thread_names = {}
+        for thread in threading.enumerate():
+            if thread.native_id is not None:
+                thread_names[thread.native_id] = thread.name
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+            for tid, name in thread_names.items()
+        ]
+        with open(output_path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, file, ensure_ascii=False)
+
+    print(f'[*] 追踪结果已写入: {output_path}（共 {len(events)} 段）')
 
 
 # --------------------------------------------
@@ -18,44 +186,575 @@ locale.setlocale(locale.LC_ALL, '')
 # 这些函数是最底层的，用来执行命令和检查系统
 # --------------------------------------------
 
-def run_system_command(command_list, work_directory=None):
+# 命令默认超时时间（秒），可以用环境变量调整
+DEFAULT_COMMAND_TIMEOUT = float(os.environ.get('OPS_TOOLBOX_COMMAND_TIMEOUT', '3600'))
+
+# 超时后先发 SIGTERM，等这么久还不退出再发 SIGKILL
+COMMAND_KILL_GRACE_SECONDS = 5
+
+# 命令本身退出后，再等这么久把管道里剩下的输出读完；
+# 之后还开着的管道属于它启动的后台进程（service start、nohup），不再等
+COMMAND_EXIT_DRAIN_SECONDS = 1.0
+
+# 结果里保留的输出行数（只保留最后这么多行）
+COMMAND_OUTPUT_TAIL_LINES = 50
+
+# 本次运行执行过的所有命令及其耗时
+COMMAND_TIMINGS = []
+
+
+class CommandResult:
+    """
+    命令执行结果
+    
+    可以直接当布尔值用：命令成功（退出码为0）时为 True，
+    所以 `if run_system_command(...):` 这种老写法不用改。
+    
+    属性说明：
+        command_list: 执行的命令
+        returncode: 退出码（命令没能启动时为 None）
+        duration: 墙钟耗时（秒）
+        cpu_time: 子进程消耗的 CPU 时间（用户态 + 内核态，秒）
+        stdout_tail / stderr_tail: 标准输出/错误输出的最后若干行
+        timed_out: 是否因为超时被终止
+        error: 命令没能启动时的错误信息
+    """
+    
+    def __init__(self, command_list, returncode=None, duration=0.0, cpu_time=0.0,
+                 stdout_tail=(), stderr_tail=(), timed_out=False, error=None):
+        self.command_list = list(command_list)
+        self.returncode = returncode
+        self.duration = duration
+        self.cpu_time = cpu_time
+        self.stdout_tail = list(stdout_tail)
+        self.stderr_tail = list(stderr_tail)
+        self.timed_out = timed_out
+        self.error = error
+    
+    @property
+    def succeeded(self):
+        return self.returncode == 0 and not self.timed_out
+    
+    def __bool__(self):
+        return self.succeeded
+    
+    def __repr__(self):
+        return (f'CommandResult({" ".join(self.command_list)!r}, returncode={self.returncode}, '
+                f'duration={self.duration:.3f}, timed_out={self.timed_out})')
+
+
+class _StreamTail:
+    """
+    把管道里读到的字节按行切开：一边实时转发到终端，一边只保留最后几行。
+    """
+    
+    def __init__(self, echo_stream, max_lines, line_callback=None):
+        import codecs
+        from collections import deque
+        
+        self.echo_stream = echo_stream
+        # 增量解码，避免一个中文字符被拆在两次读取里时显示成乱码
+        self.echo_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.lines = deque(maxlen=max_lines)
+        self.line_callback = line_callback
+        self.partial = b''
+    
+    def feed(self, chunk):
+        if self.echo_stream is not None:
+            self.echo_stream.write(self.echo_decoder.decode(chunk))
+            self.echo_stream.flush()
+        
+        data = self.partial + chunk
+        *complete_lines, self.partial = data.split(b'\n')
+        for raw_line in complete_lines:
+            self._add_line(raw_line)
+    
+    def close(self):
+        if self.partial:
+            self._add_line(self.partial)
+            self.partial = b''
+    
+    def _add_line(self, raw_line):
+        line = raw_line.decode('utf-8', errors='replace').rstrip('\r')
+        self.lines.append(line)
+        if self.line_callback is not None:
+            self.line_callback(line)
+
+
+def _signal_command(process, signal_number, whole_group):
+    """
+    给命令发信号；独立进程组时连同它启动的子进程一起发。
+    """
+    try:
+        if whole_group:
+            os.killpg(process.pid, signal_number)
+        else:
+            process.send_signal(signal_number)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _command_exited(process):
+    """
+    判断子进程是否已经退出，但不回收它（留给 _reap_command 取 CPU 时间）。
+    """
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
+
+
+def _reap_command(process):
+    """
+    回收子进程，返回 (退出码, CPU 时间)。
+    """
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        return process.wait(), 0.0
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage.ru_utime + usage.ru_stime
+
+
+def execute_command(command_list, work_directory=None, timeout=None, echo_output=True,
+                    interactive=False, line_callback=None):
+    """
+    执行命令并返回 CommandResult，不打印任何提示。
+    
+    参数说明：
+        command_list: 命令列表
+        work_directory: 工作目录
+        timeout: 超时时间（秒），None 表示使用 DEFAULT_COMMAND_TIMEOUT，0 表示不限制
+        echo_output: 是否把输出实时显示到终端
+        interactive: 命令是否需要用户在终端输入。
+            非交互命令的标准输入接到 /dev/null，并放进独立进程组，超时时整组终止；
+            交互命令继承终端输入，超时时只能终止命令本身
+        line_callback: 每读到一行输出（标准输出和错误输出都算）就调用一次
+    """
+    if timeout is None:
+        timeout = DEFAULT_COMMAND_TIMEOUT
+
+    started_at = time.time()
+    with trace_span(' '.join(command_list), 'command') as span:
+        result = get_command_executor().run(
+            command_list, work_directory, timeout, echo_output, interactive, line_callback
+        )
+        span.set(returncode=result.returncode, cpu_seconds=result.cpu_time, timed_out=result.timed_out)
+    record_command_timing(result, started_at)
+    return result
+
+
+def run_local_process(command_list, work_directory, timeout, echo_output, interactive, line_callback):
+    """
+    在本机真正执行命令，边读边转发输出，超时终止，返回 CommandResult。
+    """
+    import selectors
+    import signal
+
+    started = time.perf_counter()
+    try:
+        process = subprocess.Popen(
+            command_list,
+            cwd=work_directory,
+            stdin=None if interactive else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=not interactive
+        )
+    except OSError as error:
+        return CommandResult(command_list, duration=time.perf_counter() - started, error=error)
+
+    stdout_tail = _StreamTail(sys.stdout if echo_output else None, COMMAND_OUTPUT_TAIL_LINES, line_callback)
+    stderr_tail = _StreamTail(sys.stderr if echo_output else None, COMMAND_OUTPUT_TAIL_LINES, line_callback)
+
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ, stdout_tail)
+    selector.register(process.stderr, selectors.EVENT_READ, stderr_tail)
+
+    deadline = started + timeout if timeout else None
+    kill_deadline = None
+    drain_deadline = None
+    timed_out = False
+
+    try:
+        while selector.get_map():
+            now = time.perf_counter()
+            if drain_deadline is None and not timed_out and _command_exited(process):
+                drain_deadline = now + COMMAND_EXIT_DRAIN_SECONDS
+            if drain_deadline is not None and now >= drain_deadline:
+                break
+            if deadline is not None and now >= deadline and not timed_out:
+                # 超时：先礼后兵，SIGTERM 之后给一段宽限期
+                timed_out = True
+                _signal_command(process, signal.SIGTERM, not interactive)
+                kill_deadline = now + COMMAND_KILL_GRACE_SECONDS
+            elif kill_deadline is not None and now >= kill_deadline:
+                _signal_command(process, signal.SIGKILL, not interactive)
+                # 交互命令的孙进程可能还握着管道，不再等它们
+                if interactive or now >= kill_deadline + COMMAND_KILL_GRACE_SECONDS:
+                    break
+
+            wait_seconds = 0.5
+            if deadline is not None and not timed_out:
+                wait_seconds = min(wait_seconds, max(0.0, deadline - now))
+            if drain_deadline is not None:
+                wait_seconds = min(wait_seconds, max(0.0, drain_deadline - now))
+            for key, _ in selector.select(wait_seconds):
+                chunk = os.read(key.fd, 65536)
+                if chunk:
+                    key.data.feed(chunk)
+                else:
+                    selector.unregister(key.fileobj)
+    except KeyboardInterrupt:
+        _signal_command(process, signal.SIGTERM, not interactive)
+        raise
+    finally:
+        selector.close()
+        process.stdout.close()
+        process.stderr.close()
+        stdout_tail.close()
+        stderr_tail.close()
+
+    if timed_out and process.poll() is None:
+        _signal_command(process, signal.SIGKILL, not interactive)
+    returncode, cpu_time = _reap_command(process)
+
+    return CommandResult(
+        command_list,
+        returncode=returncode,
+        duration=time.perf_counter() - started,
+        cpu_time=cpu_time,
+        stdout_tail=stdout_tail.lines,
+        stderr_tail=stderr_tail.lines,
+        timed_out=timed_out
+    )
+
+
+# --------------------------------------------
+# 第一部分（续）：命令执行器
+# 默认在本机执行；也可以录制下来，之后在没有 root、没有真实发行版的机器上回放
+# --------------------------------------------
+
+class CommandExecutor:
+    """
+    命令执行器 - 所有外部命令和系统文件写入都经过它
+    
+    默认实现就是在本机执行命令、直接写文件；
+    录制和回放执行器继承这个类，替换掉具体的执行方式。
+    """
+    
+    def run(self, command_list, work_directory, timeout, echo_output, interactive, line_callback):
+        """
+        执行命令并实时转发输出，返回 CommandResult。
+        """
+        return run_local_process(command_list, work_directory, timeout, echo_output, interactive, line_callback)
+    
+    def capture(self, command_list, work_directory=None, timeout=None):
+        """
+        执行命令并捕获输出，返回 subprocess.CompletedProcess。
+        
+        和 subprocess.run 一样：程序不存在时抛 FileNotFoundError，超时抛 TimeoutExpired。
+        """
+        return subprocess.run(
+            command_list,
+            cwd=work_directory,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=timeout
+        )
+    
+    def resolve_path(self, file_path):
+        """
+        返回实际要写入的路径；本机执行时就是原路径。
+        """
+        return file_path
+    
+    def provide_host_facts(self, gather_function):
+        """
+        提供主机信息；本机执行时直接采集。
+        """
+        return gather_function()
+    
+    def close(self):
+        pass
+
+
+class RecordingExecutor(CommandExecutor):
+    """
+    录制执行器 - 照常在本机执行，同时把命令、输出、退出码和真实耗时写进 JSONL 文件
+    """
+    
+    def __init__(self, record_path):
+        self.record_path = record_path
+        self.lock = threading.Lock()
+        self.record_file = open(record_path, 'w', encoding='utf-8')
+        self._write({'kind': 'header', 'version': 1, 'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                     'hostname': os.uname().nodename})
+    
+    def _write(self, entry):
+        with self.lock:
+            self.record_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.record_file.flush()
+    
+    def run(self, command_list, work_directory, timeout, echo_output, interactive, line_callback):
+        output_lines = []
+        
+        def collect_line(line):
+            output_lines.append(line)
+            if line_callback is not None:
+                line_callback(line)
+        
+        result = super().run(command_list, work_directory, timeout, echo_output, interactive, collect_line)
+        self._write({
+            'kind': 'run',
+            'argv': list(command_list),
+            'cwd': work_directory,
+            'returncode': result.returncode,
+            'duration': result.duration,
+            'cpu_time': result.cpu_time,
+            'timed_out': result.timed_out,
+            'error': type(result.error).__name__ if result.error else None,
+            'output': output_lines,
+            'stdout_tail': result.stdout_tail,
+            'stderr_tail': result.stderr_tail,
+        })
+        return result
+    
+    def capture(self, command_list, work_directory=None, timeout=None):
+        started = time.perf_counter()
+        entry = {'kind': 'capture', 'argv': list(command_list), 'cwd': work_directory}
+        try:
+            completed = super().capture(command_list, work_directory, timeout)
+        except subprocess.TimeoutExpired:
+            entry.update(duration=time.perf_counter() - started, error='TimeoutExpired')
+            self._write(entry)
+            raise
+        except OSError as error:
+            entry.update(duration=time.perf_counter() - started, error=type(error).__name__)
+            self._write(entry)
+            raise
+        entry.update(
+            duration=time.perf_counter() - started,
+            returncode=completed.returncode,
+            stdout=completed.stdout,
+            stderr=completed.stderr,
+            error=None
+        )
+        self._write(entry)
+        return completed
+    
+    def provide_host_facts(self, gather_function):
+        facts = gather_function()
+        self._write({'kind': 'facts', 'facts': thaw_host_facts(facts)})
+        return facts
+    
+    def close(self):
+        with self.lock:
+            self.record_file.close()
+
+
+class ReplayExecutor(CommandExecutor):
+    """
+    回放执行器 - 不执行任何真实命令，按录制文件返回结果
+    
+    同一条命令录制了多次时按顺序依次返回；
+    time_scale 控制耗时缩放：1 表示按真实耗时等待，0.1 表示快 10 倍，0 表示不等待。
+    系统文件的写入会被重定向到 sandbox_root 下面，不会改动本机。
+    """
+    
+    def __init__(self, record_path, time_scale=1.0, sandbox_root=None):
+        import tempfile
+        from collections import defaultdict, deque
+        
+        self.time_scale = time_scale
+        self.sandbox_root = sandbox_root or tempfile.mkdtemp(prefix='ops_toolbox_replay_')
+        self.lock = threading.Lock()
+        self.entries = defaultdict(deque)
+        self.recorded_facts = None
+        self.missing_commands = []
+        
+        with open(record_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry['kind'] in ('run', 'capture'):
+                    self.entries[(entry['kind'], tuple(entry['argv']))].append(entry)
+                elif entry['kind'] == 'facts':
+                    self.recorded_facts = entry['facts']
+    
+    def _next_entry(self, kind, command_list):
+        with self.lock:
+            queue = self.entries.get((kind, tuple(command_list)))
+            if queue:
+                entry = queue.popleft() if len(queue) > 1 else queue[0]
+                return entry
+            self.missing_commands.append(' '.join(command_list))
+            return None
+    
+    def _wait(self, duration):
+        if self.time_scale > 0 and duration:
+            time.sleep(duration * self.time_scale)
+    
+    def run(self, command_list, work_directory, timeout, echo_output, interactive, line_callback):
+        entry = self._next_entry('run', command_list)
+        if entry is None:
+            message = f"[replay] 录制文件里没有这条命令：{' '.join(command_list)}"
+            return CommandResult(command_list, returncode=127, stderr_tail=[message])
+        
+        self._wait(entry['duration'])
+        for line in entry.get('output', []):
+            if echo_output:
+                print(line)
+            if line_callback is not None:
+                line_callback(line)
+        
+        error = FileNotFoundError(command_list[0]) if entry.get('error') == 'FileNotFoundError' else None
+        return CommandResult(
+            command_list,
+            returncode=entry['returncode'],
+            duration=entry['duration'] * self.time_scale,
+            cpu_time=entry.get('cpu_time', 0.0),
+            stdout_tail=entry.get('stdout_tail', []),
+            stderr_tail=entry.get('stderr_tail', []),
+            timed_out=entry.get('timed_out', False),
+            error=error
+        )
+    
+    def capture(self, command_list, work_directory=None, timeout=None):
+        entry = self._next_entry('capture', command_list)
+        if entry is None:
+            raise FileNotFoundError(command_list[0])
+        
+        self._wait(entry['duration'])
+        if entry.get('error') == 'TimeoutExpired':
+            raise subprocess.TimeoutExpired(command_list, timeout)
+        if entry.get('error'):
+            raise FileNotFoundError(command_list[0])
+        return subprocess.CompletedProcess(command_list, entry['returncode'], entry['stdout'], entry['stderr'])
+    
+    def resolve_path(self, file_path):
+        if not os.path.isabs(file_path):
+            return file_path
+        sandbox_path = os.path.join(self.sandbox_root, file_path.lstrip('/'))
+        os.makedirs(os.path.dirname(sandbox_path), exist_ok=True)
+        return sandbox_path
+    
+    def provide_host_facts(self, gather_function):
+        if self.recorded_facts is None:
+            return gather_function()
+        return freeze_host_facts(self.recorded_facts)
+    
+    def close(self):
+        if self.missing_commands:
+            print(f'[!] 回放时有 {len(self.missing_commands)} 条命令不在录制文件里：')
+            for command_text in dict.fromkeys(self.missing_commands):
+                print(f'    - {command_text}')
+        print(f'[*] 回放期间写入的文件都在：{self.sandbox_root}')
+
+
+_command_executor = CommandExecutor()
+
+
+def get_command_executor():
+    """
+    返回当前使用的命令执行器。
+    """
+    return _command_executor
+
+
+def use_command_executor(executor):
+    """
+    切换命令执行器，返回之前的执行器。
+    """
+    global _command_executor
+    previous_executor = _command_executor
+    _command_executor = executor
+    return previous_executor
+
+
+def record_command_timing(result, started_at):
+    """
+    把一次命令执行记到全局耗时登记表里。
+    """
+    COMMAND_TIMINGS.append({
+        'command': ' '.join(result.command_list),
+        'started_at': started_at,
+        'wall_seconds': round(result.duration, 6),
+        'cpu_seconds': round(result.cpu_time, 6),
+        'returncode': result.returncode,
+        'timed_out': result.timed_out,
+    })
+
+
+def dump_command_timings(output_path=None):
+    """
+    打印本次运行的命令耗时汇总，可选地写成 JSON 文件。
+    """
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as file:
+            json.dump(COMMAND_TIMINGS, file, ensure_ascii=False, indent=2)
+        print(f'[*] 命令耗时明细已写入: {output_path}')
+
+    if not COMMAND_TIMINGS:
+        return
+
+    total_wall = sum(item['wall_seconds'] for item in COMMAND_TIMINGS)
+    total_cpu = sum(item['cpu_seconds'] for item in COMMAND_TIMINGS)
+    print('\n命令耗时汇总（按墙钟时间排序）')
+    print('=' * 60)
+    print(f"{'墙钟(s)':>9} {'CPU(s)':>9} {'退出码':>6}  命令")
+    for item in sorted(COMMAND_TIMINGS, key=lambda entry: entry['wall_seconds'], reverse=True):
+        status = '超时' if item['timed_out'] else item['returncode']
+        print(f"{item['wall_seconds']:9.2f} {item['cpu_seconds']:9.2f} {str(status):>6}  {item['command']}")
+    print('=' * 60)
+    print(f'共 {len(COMMAND_TIMINGS)} 条命令，墙钟合计 {total_wall:.2f}s，CPU 合计 {total_cpu:.2f}s')
+
+
+def run_system_command(command_list, work_directory=None, timeout=None, interactive=False):
     """
     执行一条系统命令，并显示执行结果
     
     这个函数就像一个"命令执行器"：
     - 你告诉它要执行什么命令
-    - 它会帮你执行，并告诉你成功还是失败
+    - 它会帮你执行，实时显示输出，并告诉你成功还是失败
+    - 命令卡住超过超时时间会被终止，不会让工具箱一直挂着
     
     参数说明：
         command_list: 命令列表，比如 ['ls', '-l'] 表示执行 ls -l 命令
         work_directory: 在哪个文件夹里执行这个命令（可选，默认是当前文件夹）
+        timeout: 超时时间（秒，可选，默认 DEFAULT_COMMAND_TIMEOUT）
+        interactive: 命令是否需要在终端里和用户交互（可选）
     
     返回值：
-        如果命令执行成功，返回 True
-        如果命令执行失败，返回 False
+        CommandResult 对象，可以直接当布尔值用：
+        如果命令执行成功，相当于 True
+        如果命令执行失败，相当于 False
     """
-    try:
-        # 先把命令列表变成字符串，方便打印给用户看
-        command_text = ' '.join(command_list)
-        
-        # 执行这个命令，check=True 表示如果命令失败就抛出错误
-        subprocess.run(command_list, check=True, cwd=work_directory)
-        
-        # 如果执行到这里，说明命令执行成功了
-        return True
-        
-    except FileNotFoundError:
+    # 先把命令列表变成字符串，方便打印给用户看
+    command_text = ' '.join(command_list)
+    
+    result = execute_command(command_list, work_directory, timeout=timeout, interactive=interactive)
+    
+    if isinstance(result.error, FileNotFoundError):
         # 这个错误表示：命令对应的程序没有安装
         # 比如你想执行 nginx，但系统里没装 nginx
         program_name = command_list[0]
         print(f"[!] 错误: 找不到命令 '{program_name}'，请检查这个程序是否已安装")
-        return False
-        
-    except subprocess.CalledProcessError:
+    elif result.error is not None:
+        print(f"[!] 错误: 命令 '{command_text}' 无法启动: {result.error}")
+    elif result.timed_out:
+        # 命令卡住了，已经被终止
+        print(f"[!] 错误: 命令 '{command_text}' 执行超时（已运行 {result.duration:.0f} 秒），已终止")
+    elif result.returncode != 0:
         # 这个错误表示：命令执行了，但是失败了
         # 比如你想删除一个不存在的文件
-        print(f"[!] 错误: 命令 '{command_text}' 执行失败")
-        return False
+        print(f"[!] 错误: 命令 '{command_text}' 执行失败（退出码 {result.returncode}）")
+    
+    return result
 
 
 def check_command_exists(command_name):
@@ -74,11 +773,7 @@ def check_command_exists(command_name):
     try:
         # 使用 which 命令查找这个程序在哪里
         # 如果找到了，返回码是0；找不到，返回码不是0
-        result = subprocess.run(
-            ['which', command_name],
-            stdout=subprocess.DEVNULL,  # 不显示输出
-            stderr=subprocess.DEVNULL   # 不显示错误
-        )
+        result = get_command_executor().capture(['which', command_name])
         return result.returncode == 0
         
     except Exception:
@@ -106,6 +801,9 @@ def check_if_linux_system():
     
     # 第二步：检查用户权限（是否是root用户）
     print("[*] 正在检查用户权限...")
+    if isinstance(get_command_executor(), ReplayExecutor):
+        print("[OK] 回放模式：不执行真实命令，跳过 root 检查")
+        return
     current_user_id = os.geteuid()  # 获取当前用户的ID
     if current_user_id != 0:  # root用户的ID是0
         print('[!] 错误：当前用户不是root用户')
@@ -133,20 +831,7 @@ def read_system_info():
     print('[*] 正在读取系统信息...')
     
     try:
-        # 创建一个空的字典，用来存放从文件读取的信息
-        os_release_data = {}
-        
-        # 打开 /etc/os-release 文件
-        with open('/etc/os-release') as file:
-            # 一行一行地读取文件内容
-            for line in file:
-                # 每一行格式是：KEY=VALUE
-                # 比如：ID=ubuntu
-                if '=' in line:
-                    # 把这一行按照等号分成两部分
-                    key, value = line.strip().split('=', 1)
-                    # 把值两边的引号去掉，然后保存到字典里
-                    os_release_data[key] = value.strip().strip('"')
+        os_release_data = parse_os_release()
         
         # 从字典里取出我们需要的信息
         system_type = os_release_data.get('ID', 'unknown')
@@ -179,29 +864,38 @@ def read_system_info():
         sys.exit(1)
 
 
-def detect_system_family(system_type, system_version, system_name):
+def parse_os_release(file_path='/etc/os-release'):
     """
-    判断Linux系统属于哪个家族，并确定使用什么包管理器
+    解析 /etc/os-release，返回 KEY -> VALUE 的字典。
     
-    Linux系统主要分两大家族：
-    1. Debian家族：使用 apt 包管理器（Ubuntu、Debian等）
-    2. RedHat家族：使用 yum 或 dnf 包管理器（CentOS、Rocky、Alma等）
+    文件不存在时会抛出 FileNotFoundError，由调用方决定怎么处理。
+    """
+    # 创建一个空的字典，用来存放从文件读取的信息
+    os_release_data = {}
     
-    参数说明：
-        system_type: 系统类型
-        system_version: 系统版本
-        system_name: 系统完整名称
+    # 打开 /etc/os-release 文件
+    with open(file_path) as file:
+        # 一行一行地读取文件内容
+        for line in file:
+            # 每一行格式是：KEY=VALUE
+            # 比如：ID=ubuntu
+            if '=' in line:
+                # 把这一行按照等号分成两部分
+                key, value = line.strip().split('=', 1)
+                # 把值两边的引号去掉，然后保存到字典里
+                os_release_data[key] = value.strip().strip('"')
     
-    返回值：
-        返回一个字典，包含：
-        - system_family: 系统家族（'debian' 或 'redhat'）
-        - package_manager: 包管理器名称
-        - is_supported: 是否支持自动化操作
+    return os_release_data
+
+
+def classify_system_family(system_type, system_version):
+    """
+    判断系统家族和包管理器，不打印任何信息。
+    
+    返回值和 detect_system_family 相同。
     """
-    # 先把系统类型转成小写，方便比较
     system_type_lower = system_type.lower()
     
-    # 判断是 Debian 家族还是 RedHat 家族
     # Debian家族：Ubuntu、Debian、Linux Mint等
     debian_family = ['ubuntu', 'debian', 'linuxmint', 'pop']
     
@@ -209,1590 +903,7123 @@ def detect_system_family(system_type, system_version, system_name):
     redhat_family = ['centos', 'rocky', 'almalinux', 'rhel', 'fedora', 'ol']
     
     if system_type_lower in debian_family:
-        # 这是 Debian 家族，使用 apt 包管理器
-        print('[OK] 识别为 Debian 系列系统，使用 apt 包管理器')
         return {
             'system_family': 'debian',
             'package_manager': 'apt',
             'is_supported': True
         }
-        
-    elif system_type_lower in redhat_family:
-        # 这是 RedHat 家族
+    
+    if system_type_lower in redhat_family:
         # CentOS 8 / Rocky 8 / Alma 8 及以上使用 dnf
         # CentOS 7 及以下使用 yum
-        print('[OK] 识别为 RedHat 系列系统')
-        
-        # 判断使用 yum 还是 dnf
         try:
             version_number = int(system_version.split('.')[0])
-            if version_number >= 8:
-                package_manager = 'dnf'
-                print(f'[OK] 系统版本 >= 8，使用 dnf 包管理器')
-            else:
-                package_manager = 'yum'
-                print(f'[OK] 系统版本 < 8，使用 yum 包管理器')
-        except:
+            package_manager = 'dnf' if version_number >= 8 else 'yum'
+        except ValueError:
             # 如果无法判断版本，尝试检查 dnf 是否存在
-            if check_command_exists('dnf'):
-                package_manager = 'dnf'
-            else:
-                package_manager = 'yum'
+            package_manager = 'dnf' if check_command_exists('dnf') else 'yum'
         
         return {
             'system_family': 'redhat',
             'package_manager': package_manager,
             'is_supported': True
         }
-    else:
-        # 不认识的系统
-        print(f'[!] 警告：系统类型 {system_type} 可能不被完全支持')
-        print('[!] 程序会尝试继续运行，但可能会遇到问题')
-        return {
-            'system_family': 'unknown',
-            'package_manager': 'unknown',
-            'is_supported': False
-        }
-
+    
+    return {
+        'system_family': 'unknown',
+        'package_manager': 'unknown',
+        'is_supported': False
+    }
 
-# --------------------------------------------
-# 第二部分：包管理器统一接口
-# 不同的Linux系统用不同的包管理器，这里统一封装
-# --------------------------------------------
 
-class PackageManager:
+def detect_system_family(system_type, system_version, system_name):
     """
-    包管理器类 - 让不同Linux系统用同样的方式安装软件
+    判断Linux系统属于哪个家族，并确定使用什么包管理器
     
-    就像一个"翻译器"：
-    - Ubuntu 用 apt install
-    - CentOS 用 yum install 或 dnf install
-    - 我们只需要说"安装某个软件"，它会自动选择正确的命令
+    Linux系统主要分两大家族：
+    1. Debian家族：使用 apt 包管理器（Ubuntu、Debian等）
+    2. RedHat家族：使用 yum 或 dnf 包管理器（CentOS、Rocky、Alma等）
+    
+    参数说明：
+        system_type: 系统类型
+        system_version: 系统版本
+        system_name: 系统完整名称
+    
+    返回值：
+        返回一个字典，包含：
+        - system_family: 系统家族（'debian' 或 'redhat'）
+        - package_manager: 包管理器名称
+        - is_supported: 是否支持自动化操作
     """
+    system_info = classify_system_family(system_type, system_version)
     
-    def __init__(self, system_info):
-        """
-        初始化包管理器
-        
-        参数说明：
-            system_info: 系统信息字典（从 read_system_info 函数获取）
-        """
-        self.system_info = system_info
-        self.package_manager = system_info['package_manager']
-        self.system_family = system_info['system_family']
-        self.system_type = system_info['system_type']
+    if system_info['system_family'] == 'debian':
+        print('[OK] 识别为 Debian 系列系统，使用 apt 包管理器')
+    elif system_info['system_family'] == 'redhat':
+        print('[OK] 识别为 RedHat 系列系统')
+        print(f"[OK] 使用 {system_info['package_manager']} 包管理器")
+    else:
+        # 不认识的系统
+        print(f'[!] 警告：系统类型 {system_type} 可能不被完全支持')
+        print('[!] 程序会尝试继续运行，但可能会遇到问题')
     
-    def install_packages(self, package_list):
-        """
-        安装软件包
-        
-        参数说明：
-            package_list: 要安装的软件列表，比如 ['vim', 'wget', 'git']
-        
-        返回值：
-            安装成功返回 True，失败返回 False
-        """
-        print(f"[*] 准备安装软件: {', '.join(package_list)}")
-        
-        if self.package_manager == 'apt':
-            # Debian 家族：先更新索引，再安装
-            print("[*] 正在更新软件包索引...")
-            if not run_system_command(['apt', 'update']):
-                return False
-            print("[*] 正在安装软件...")
-            return run_system_command(['apt', 'install', '-y'] + package_list)
-            
-        elif self.package_manager in ['yum', 'dnf']:
-            # RedHat 家族：直接安装（yum/dnf 会自动处理依赖）
-            print("[*] 正在安装软件...")
-            return run_system_command([self.package_manager, 'install', '-y'] + package_list)
-        else:
-            print(f"[!] 错误：不支持的包管理器 {self.package_manager}")
-            return False
+    return system_info
 
 
-# --------------------------------------------
-# 第三部分：网络配置功能
-# 帮助用户设置静态IP地址
-# --------------------------------------------
+TOOLBOX_CACHE_DIR = os.environ.get('OPS_TOOLBOX_CACHE_DIR', '/var/cache/ops_toolbox')
+HOST_FACTS_CACHE_FILE = os.path.join(TOOLBOX_CACHE_DIR, 'host_facts.json')
 
-def get_network_interface_list():
+
+def get_host_facts_cache_key():
     """
-    获取网络接口名称列表
-    
-    网络接口就是网卡的名字，比如 eth0, ens33 等
-    这个函数会列出所有的网卡（除了本地回环 lo）
-    
-    返回值：
-        网卡名称列表，比如 ['eth0', 'eth1']
+    生成系统信息缓存的校验键。
+
+    /etc/os-release 改过（比如系统升级）或者机器重启过，缓存就自动失效；
+    工具箱脚本本身更新后也会失效。
     """
     try:
-        # 读取 /sys/class/net 目录，这里面保存了所有网卡的信息
-        all_interfaces = os.listdir('/sys/class/net')
-        
-        # 过滤掉 lo（本地回环接口），只保留真正的网卡
-        real_interfaces = []
-        for interface_name in all_interfaces:
-            if interface_name != 'lo':  # lo 是本地回环，不是真正的网卡
-                real_interfaces.append(interface_name)
-        
-        return real_interfaces
-        
-    except FileNotFoundError:
-        print('[!] 错误：无法读取网络接口信息')
-        return []
+        cache_key = {'os_release_mtime_ns': os.stat('/etc/os-release').st_mtime_ns}
+    except OSError:
+        return None
 
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r', encoding='utf-8') as file:
+            cache_key['boot_id'] = file.read().strip()
+    except OSError:
+        cache_key['boot_id'] = ''
 
-def get_command_output(command_list, work_directory=None):
-    """
-    Run a command and return stdout text, or an empty string on failure.
-    """
     try:
-        result = subprocess.run(
-            command_list,
-            check=True,
-            cwd=work_directory,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True
-        )
-        return result.stdout.strip()
-    except Exception:
-        return ''
+        cache_key['toolbox_mtime_ns'] = os.stat(os.path.abspath(__file__)).st_mtime_ns
+    except OSError:
+        cache_key['toolbox_mtime_ns'] = 0
 
+    return cache_key
 
-def get_existing_systemd_service(service_name_list):
+
+def read_cached_host_facts(cache_key):
     """
-    从候选服务名里找出当前系统真实存在的那个。
+    读取系统信息缓存，校验键不一致时返回 None。
     """
-    if not check_command_exists('systemctl'):
+    if cache_key is None:
         return None
 
-    for service_name in service_name_list:
-        result = subprocess.run(
-            ['systemctl', 'list-unit-files', f'{service_name}.service', '--no-legend'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True
-        )
-        if result.returncode == 0 and f'{service_name}.service' in result.stdout:
-            return service_name
+    try:
+        with open(HOST_FACTS_CACHE_FILE, 'r', encoding='utf-8') as file:
+            cache_data = json.load(file)
+    except (OSError, ValueError):
+        return None
 
-    return None
+    if not isinstance(cache_data, dict) or cache_data.get('key') != cache_key:
+        return None
 
+    system_info = cache_data.get('facts')
+    return system_info if isinstance(system_info, dict) else None
 
-def start_and_enable_service(service_name_list):
+
+def write_host_facts_cache(cache_key, system_info):
     """
-    启动并设置服务开机自启。
+    保存系统信息缓存，写不进去（比如只读文件系统）就算了，不影响使用。
     """
-    service_name = get_existing_systemd_service(service_name_list)
-    if not service_name:
-        return None
+    if cache_key is None:
+        return
 
-    print(f'[*] 启动 {service_name} 服务...')
-    run_system_command(['systemctl', 'start', service_name])
-    print(f'[*] 设置 {service_name} 开机自启...')
-    run_system_command(['systemctl', 'enable', service_name])
-    return service_name
+    try:
+        os.makedirs(TOOLBOX_CACHE_DIR, exist_ok=True)
+        temp_file = f'{HOST_FACTS_CACHE_FILE}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump({'key': cache_key, 'facts': system_info}, file, ensure_ascii=False)
+        os.replace(temp_file, HOST_FACTS_CACHE_FILE)
+    except OSError:
+        pass
 
 
-def get_active_connection_name(interface_name):
+# --------------------------------------------
+# 第一部分（续）：主机信息并发采集
+# 所有探测同时进行，每个探测都有超时，结果合成一个只读的信息对象
+# --------------------------------------------
+
+# 单个探测的超时时间（秒）
+HOST_FACT_PROBE_TIMEOUT = float(os.environ.get('OPS_TOOLBOX_PROBE_TIMEOUT', '3'))
+
+# 这些探测结果在重启前不会变化，可以写入磁盘缓存
+PERSISTENT_FACT_PROBES = ('os', 'virtualization', 'architecture')
+
+
+def probe_os_facts(timeout):
     """
-    Resolve the active NetworkManager connection name for an interface.
+    探测：系统类型、版本、家族和包管理器。
     """
-    if not check_command_exists('nmcli'):
-        return interface_name
-
-    connection_name = get_command_output(
-        ['nmcli', '-g', 'GENERAL.CONNECTION', 'device', 'show', interface_name]
-    )
-    if connection_name and connection_name != '--':
-        return connection_name
+    os_release_data = parse_os_release()
+    system_type = os_release_data.get('ID', 'unknown')
+    system_version = os_release_data.get('VERSION_ID', 'unknown')
 
-    return interface_name
+    os_facts = classify_system_family(system_type, system_version)
+    os_facts['system_type'] = system_type
+    os_facts['system_version'] = system_version
+    os_facts['system_codename'] = os_release_data.get('VERSION_CODENAME', 'unknown')
+    os_facts['system_name'] = os_release_data.get('PRETTY_NAME', 'unknown')
+    return os_facts
 
 
-def get_current_network_defaults(interface_name):
+def probe_virtualization_facts(timeout=None):
     """
-    Read current gateway and DNS values from NetworkManager for an interface.
+    探测：虚拟化类型，以及是不是 VMware 虚拟机。
     """
-    network_defaults = {
-        'gateway': '',
-        'dns_servers': []
+    virtualization = ''
+    if check_command_exists('systemd-detect-virt'):
+        virtualization = get_command_output(['systemd-detect-virt'], timeout=timeout).lower()
+
+    is_vmware = virtualization == 'vmware'
+    if not is_vmware:
+        dmi_file_list = [
+            '/sys/class/dmi/id/sys_vendor',
+            '/sys/class/dmi/id/product_name',
+            '/sys/class/dmi/id/board_vendor'
+        ]
+        for dmi_file in dmi_file_list:
+            try:
+                with open(dmi_file, 'r', encoding='utf-8', errors='ignore') as file:
+                    if 'vmware' in file.read().strip().lower():
+                        is_vmware = True
+                        break
+            except Exception:
+                continue
+
+    return {
+        'virtualization': virtualization or 'unknown',
+        'is_vmware': is_vmware,
     }
 
-    if not check_command_exists('nmcli'):
-        return network_defaults
 
-    gateway_output = get_command_output(
-        ['nmcli', '-g', 'IP4.GATEWAY', 'device', 'show', interface_name]
-    )
-    if gateway_output:
-        network_defaults['gateway'] = gateway_output.splitlines()[0].strip()
+def probe_architecture_facts(timeout):
+    """
+    探测：软件包架构名（amd64 / arm64 / x86_64 ...）。
+    """
+    architecture = ''
+    if check_command_exists('dpkg'):
+        architecture = get_command_output(['dpkg', '--print-architecture'], timeout=timeout)
+    if not architecture:
+        architecture = os.uname().machine
+    return {'architecture': architecture}
 
-    dns_output = get_command_output(
-        ['nmcli', '-g', 'IP4.DNS', 'device', 'show', interface_name]
-    )
-    if dns_output:
-        dns_list = []
-        for line in dns_output.splitlines():
-            dns_server = line.strip()
-            if dns_server and dns_server not in dns_list:
-                dns_list.append(dns_server)
-        network_defaults['dns_servers'] = dns_list
 
-    return network_defaults
+def probe_hardware_facts(timeout):
+    """
+    探测：CPU 核数和内存总量，只读 /proc，不开子进程。
+    """
+    memory_total_kb = 0
+    try:
+        with open('/proc/meminfo', 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('MemTotal:'):
+                    memory_total_kb = int(line.split()[1])
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return {
+        'cpu_count': os.cpu_count() or 1,
+        'memory_total_kb': memory_total_kb,
+    }
 
 
-def get_recommended_dns_servers(detected_dns_list=None):
+def get_host_fact_probes(interface_list):
     """
-    生成更通用的默认 DNS 列表。
-
-    规则：
-    1. 优先沿用当前检测到的 DNS
-    2. 但不把 8.8.8.8 / 8.8.4.4 当默认首选，避免在部分国内网络里首次解析过慢
-    3. 如果没有合适的当前 DNS，就回退到更通用的公共 DNS
+    列出所有要执行的探测：名字 -> (探测函数, 超时后的默认值)。
     """
-    if detected_dns_list is None:
-        detected_dns_list = []
+    probes = {
+        'os': (probe_os_facts, None),
+        'virtualization': (probe_virtualization_facts, {'virtualization': 'unknown', 'is_vmware': False}),
+        'architecture': (probe_architecture_facts, {'architecture': os.uname().machine}),
+        'hardware': (probe_hardware_facts, {'cpu_count': os.cpu_count() or 1, 'memory_total_kb': 0}),
+    }
 
-    preferred_dns = []
-    deprioritized_dns = {'8.8.8.8', '8.8.4.4'}
-    fallback_dns = ['223.5.5.5', '114.114.114.114']
+    # 每块网卡单独一个探测，一块网卡的 nmcli 卡住不影响其他网卡
+    for interface_name in interface_list:
+        probes[f'network:{interface_name}'] = (
+            lambda timeout, name=interface_name: get_current_network_defaults(name, timeout=timeout),
+            {'gateway': '', 'dns_servers': []}
+        )
 
-    for dns_server in detected_dns_list:
-        if dns_server and dns_server not in preferred_dns and dns_server not in deprioritized_dns:
-            preferred_dns.append(dns_server)
+    return probes
 
-    for dns_server in fallback_dns:
-        if dns_server not in preferred_dns:
-            preferred_dns.append(dns_server)
 
-    for dns_server in detected_dns_list:
-        if dns_server and dns_server not in preferred_dns:
-            preferred_dns.append(dns_server)
+def freeze_host_facts(value):
+    """
+    把字典/列表递归转换成只读的 MappingProxyType/tuple。
+    """
+    from types import MappingProxyType
 
-    if len(preferred_dns) == 1:
-        preferred_dns.append(fallback_dns[1] if preferred_dns[0] != fallback_dns[1] else fallback_dns[0])
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze_host_facts(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_host_facts(item) for item in value)
+    return value
 
-    return preferred_dns[:2]
 
+def thaw_host_facts(value):
+    """
+    freeze_host_facts 的反操作，用于写 JSON。
+    """
+    if hasattr(value, 'items'):
+        return {key: thaw_host_facts(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw_host_facts(item) for item in value]
+    return value
 
-def is_vmware_virtual_machine():
+
+def run_host_fact_probes(probes, probe_timeout):
     """
-    Best-effort check for VMware guests.
+    在线程池里同时执行所有探测。
+
+    返回值：
+        (结果字典, 状态字典)，状态是 'ok' / 'timeout' / 'error'
     """
-    if check_command_exists('systemd-detect-virt'):
-        virt_type = get_command_output(['systemd-detect-virt'])
-        if virt_type.lower() == 'vmware':
-            return True
+    from concurrent.futures import ThreadPoolExecutor, wait
 
-    dmi_file_list = [
-        '/sys/class/dmi/id/sys_vendor',
-        '/sys/class/dmi/id/product_name',
-        '/sys/class/dmi/id/board_vendor'
-    ]
-    for dmi_file in dmi_file_list:
+    results = {}
+    statuses = {}
+    if not probes:
+        return results, statuses
+
+    executor = ThreadPoolExecutor(max_workers=len(probes), thread_name_prefix='host-fact')
+    def run_probe(name, probe_function):
+        with trace_span(f'probe: {name}', 'probe'):
+            return probe_function(probe_timeout)
+
+    future_map = {
+        executor.submit(run_probe, name, probe_function): name
+        for name, (probe_function, _) in probes.items()
+    }
+    # 子进程本身带超时，这里再留一点余量等线程收尾
+    done, not_done = wait(future_map, timeout=probe_timeout + 0.5)
+    executor.shutdown(wait=False)
+
+    for future in done:
+        name = future_map[future]
         try:
-            with open(dmi_file, 'r', encoding='utf-8', errors='ignore') as file:
-                if 'vmware' in file.read().strip().lower():
-                    return True
+            results[name] = future.result()
+            statuses[name] = 'ok'
         except Exception:
-            continue
+            statuses[name] = 'error'
 
-    return False
+    for future in not_done:
+        statuses[future_map[future]] = 'timeout'
 
+    return results, statuses
 
-# --------------------------------------------
-# 第四部分：网络配置功能
-# 配置静态 IP，并做基础校验和应用
-# --------------------------------------------
 
-def choose_static_ip_interface():
+def gather_host_facts(probe_timeout=None, use_cache=True):
     """
-    让用户选择要配置静态 IP 的网卡。
+    并发采集主机信息，返回一个只读的信息对象。
+
+    返回的对象可以像字典一样读取（system_info['system_family']），
+    但不能修改。除了 read_system_info 的字段，还包括：
+        - virtualization / is_vmware: 虚拟化信息
+        - architecture: 软件包架构
+        - cpu_count / memory_total_kb: 硬件信息
+        - interfaces: 网卡列表
+        - network_defaults: 每块网卡当前的网关和 DNS
+        - probe_status: 每个探测的结果（ok / cached / timeout / error）
     """
+    if probe_timeout is None:
+        probe_timeout = HOST_FACT_PROBE_TIMEOUT
+
+    cache_key = get_host_facts_cache_key()
+    cached_facts = read_cached_host_facts(cache_key) if use_cache else None
+    if cached_facts is not None and not all(name in cached_facts for name in PERSISTENT_FACT_PROBES):
+        cached_facts = None
+
     interface_list = get_network_interface_list()
-    if not interface_list:
-        print('[!] 没有找到可用的网络接口')
-        return None
+    probes = get_host_fact_probes(interface_list)
+    if cached_facts is not None:
+        for name in PERSISTENT_FACT_PROBES:
+            probes.pop(name, None)
+
+    results, statuses = run_host_fact_probes(probes, probe_timeout)
+
+    if cached_facts is not None:
+        for name in PERSISTENT_FACT_PROBES:
+            results[name] = cached_facts.get(name, {})
+            statuses[name] = 'cached'
+    elif statuses.get('os') == 'ok':
+        write_host_facts_cache(cache_key, {name: results[name] for name in PERSISTENT_FACT_PROBES if name in results})
+
+    facts = {}
+    if 'os' in results:
+        facts.update(results['os'])
+    else:
+        # os-release 读不到时退回到老的串行方式，给出明确的错误提示
+        facts.update(read_system_info())
 
-    interface_options = [(f'网卡 {name}', name) for name in interface_list]
-    chosen_interface = select_menu_option('请选择要配置的网卡', interface_options, '上/下选择网卡，回车确认')
-    if chosen_interface is None:
-        print('[*] 已取消选择网卡')
-    return chosen_interface
+    network_defaults = {}
+    for name, (_, default_value) in probes.items():
+        if name not in results and default_value is not None:
+            results[name] = default_value
+        if name.startswith('network:'):
+            network_defaults[name.split(':', 1)[1]] = results[name]
 
+    for name in ('virtualization', 'architecture', 'hardware'):
+        facts.update(results.get(name, {}))
 
-def show_detected_network_defaults(detected_gateway, detected_dns_list, default_dns_list):
+    facts['interfaces'] = interface_list
+    facts['network_defaults'] = network_defaults
+    facts['probe_status'] = statuses
+    return freeze_host_facts(facts)
+
+
+def load_host_facts():
     """
-    显示当前检测到的网关和 DNS 参考值。
+    获取主机信息并打印摘要。
+
+    所有探测并发执行，重启前不变的信息优先使用缓存；
+    某个探测卡住（比如 NetworkManager 异常时 nmcli 无响应）只会让这一项用默认值。
     """
-    if detected_gateway:
-        print(f'[*] 当前检测到的网关：{detected_gateway}')
+    print('[*] 正在采集系统信息...')
+    system_info = get_command_executor().provide_host_facts(gather_host_facts)
 
-    if detected_dns_list:
-        print(f'[*] 当前检测到的 DNS：{", ".join(detected_dns_list)}')
-        if any(dns_server in ('8.8.8.8', '8.8.4.4') for dns_server in detected_dns_list):
-            print(f'[*] 已自动调整推荐 DNS 为：{", ".join(default_dns_list)}')
-            print('[*] 说明：8.8.8.8 在部分网络环境里首次解析可能较慢，所以不再作为默认首选')
+    print(f"[OK] 系统：{system_info['system_name']}（{system_info['system_type']} {system_info['system_version']}）")
+    if system_info['system_family'] == 'unknown':
+        print(f"[!] 警告：系统类型 {system_info['system_type']} 可能不被完全支持")
     else:
-        print(f'[*] 未检测到现有 DNS，默认推荐使用：{", ".join(default_dns_list)}')
+        print(f"[OK] {system_info['system_family']} 系列，包管理器 {system_info['package_manager']}")
+    print(f"[OK] 架构 {system_info['architecture']}，{system_info['cpu_count']} 核，"
+          f"内存 {system_info['memory_total_kb'] // 1024} MB，虚拟化 {system_info['virtualization']}")
 
+    slow_probes = [name for name, status in system_info['probe_status'].items() if status in ('timeout', 'error')]
+    if slow_probes:
+        print(f"[!] 以下信息采集超时或失败，已使用默认值：{', '.join(slow_probes)}")
 
-def collect_static_ip_config(interface_name):
-    """
-    采集静态 IP 所需的参数。
+    return system_info
+
+
+# --------------------------------------------
+# 第一部分（续）：步骤状态日志
+# 记录已经完成的步骤，重复运行时跳过没有变化的工作
+# --------------------------------------------
+
+TOOLBOX_STATE_DIR = os.environ.get('OPS_TOOLBOX_STATE_DIR', '/var/lib/ops_toolbox')
+STEP_JOURNAL_FILE = os.path.join(TOOLBOX_STATE_DIR, 'step_journal.json')
+
+# 支持记录状态的步骤，键是 --force 使用的名字
+JOURNALED_STEPS = {
+    'static_ip': '配置静态 IP',
+    'repo': '更换软件源',
+    'docker': '安装 Docker',
+    'docker_tuning': 'Docker 性能调优',
+    'nginx': '源码安装 Nginx',
+    'apache': '安装 Apache',
+}
+
+# 本次运行中要求强制重做的步骤（通过 --force 指定）
+FORCED_STEPS = set()
+
+
+def compute_step_fingerprint(step_name, step_inputs):
     """
-    current_network_defaults = get_current_network_defaults(interface_name)
-    detected_gateway = current_network_defaults['gateway']
-    detected_dns_list = current_network_defaults['dns_servers']
-    recommended_dns_list = get_recommended_dns_servers(detected_dns_list)
+    根据步骤名和输入参数计算指纹。
 
-    show_detected_network_defaults(detected_gateway, detected_dns_list, recommended_dns_list)
+    输入参数只要有一点变化（比如换了镜像、换了IP），指纹就会不同。
+    """
+    import hashlib
 
-    default_dns1, default_dns2 = recommended_dns_list
+    payload = json.dumps(
+        {'step': step_name, 'inputs': step_inputs},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
-    print('\n[*] 请输入网络参数')
-    try:
-        user_ip = input('  IP地址（例如 192.168.1.100）：').strip()
-        ip_address(user_ip)
 
-        user_netmask = input('  子网掩码（默认 255.255.255.0）：').strip()
-        if not user_netmask:
-            user_netmask = '255.255.255.0'
-        else:
-            ip_address(user_netmask)
+def hash_file(file_path):
+    """
+    计算文件的 sha256，文件不存在时返回 None。
+    """
+    import hashlib
 
-        if detected_gateway:
-            user_gateway = input(f'  网关（直接回车沿用 {detected_gateway}）：').strip()
-            if not user_gateway:
-                user_gateway = detected_gateway
-        else:
-            user_gateway = input('  网关（例如 192.168.1.1）：').strip()
-        ip_address(user_gateway)
+    try:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except OSError:
+        return None
 
-        user_dns1 = input(f'  首选 DNS（直接回车沿用 {default_dns1}）：').strip()
-        if not user_dns1:
-            user_dns1 = default_dns1
-        else:
-            ip_address(user_dns1)
 
-        user_dns2 = input(f'  备用 DNS（直接回车沿用 {default_dns2}）：').strip()
-        if not user_dns2:
-            user_dns2 = default_dns2
-        else:
-            ip_address(user_dns2)
+def describe_result_file(file_path):
+    """
+    记录结果文件的大小、修改时间和哈希。
 
-    except ValueError:
-        print('[!] 错误：IP 地址格式不正确')
+    大小和修改时间用来快速判断文件有没有变过，
+    这样复查时大部分情况下不用重新读整个文件。
+    """
+    file_path = get_command_executor().resolve_path(file_path)
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
         return None
 
-    netmask_cidr = ip_network(f'0.0.0.0/{user_netmask}', strict=False).prefixlen
     return {
-        'interface': interface_name,
-        'ip': user_ip,
-        'netmask': user_netmask,
-        'cidr': netmask_cidr,
-        'gateway': user_gateway,
-        'dns_servers': [user_dns1, user_dns2],
-        'detected_gateway': detected_gateway,
-        'detected_dns_list': detected_dns_list,
+        'size': file_stat.st_size,
+        'mtime_ns': file_stat.st_mtime_ns,
+        'sha256': hash_file(file_path),
     }
 
 
-def validate_static_ip_config(network_config):
+def is_result_file_unchanged(file_path, recorded):
     """
-    校验静态 IP 参数是否合法。
+    检查结果文件是否还和记录时一样。
     """
-    target_subnet = ip_network(f"{network_config['ip']}/{network_config['cidr']}", strict=False)
-    gateway_ip = ip_address(network_config['gateway'])
-
-    if gateway_ip not in target_subnet:
-        print(f"[!] 错误：网关 {network_config['gateway']} 不在网段 {target_subnet} 内")
-        print('[!] 这种情况通常会导致内网能通、外网不通')
+    file_path = get_command_executor().resolve_path(file_path)
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
         return False
 
-    if network_config['gateway'] == network_config['ip']:
-        print('[!] 错误：网关不能和本机 IP 相同')
+    if file_stat.st_size != recorded.get('size'):
         return False
+    if file_stat.st_mtime_ns == recorded.get('mtime_ns'):
+        return True
 
-    return True
+    # 修改时间变了但大小没变，再用哈希确认一次
+    return hash_file(file_path) == recorded.get('sha256')
 
 
-def confirm_static_ip_warnings(network_config):
+def load_step_journal():
     """
-    对明显可疑的网络参数做二次提醒。
+    读取步骤状态日志，文件不存在或损坏时返回空字典。
     """
-    detected_gateway = network_config['detected_gateway']
-    user_gateway = network_config['gateway']
+    try:
+        with open(STEP_JOURNAL_FILE, 'r', encoding='utf-8') as file:
+            journal = json.load(file)
+        return journal if isinstance(journal, dict) else {}
+    except (OSError, ValueError):
+        return {}
 
-    if detected_gateway and user_gateway != detected_gateway:
-        print(f'[!] 提醒：当前检测到的网关是 {detected_gateway}，你输入的是 {user_gateway}')
 
-    if is_vmware_virtual_machine() and user_gateway.endswith('.1'):
-        print('[!] 提醒：VMware NAT 网络里，*.1 往往是宿主机地址，真正网关常见是 *.2')
-        if detected_gateway and detected_gateway != user_gateway:
-            print(f'[!] 当前检测到的网关参考值：{detected_gateway}')
-        if not confirm_with_menu('仍然继续使用这个网关吗？', default=False):
-            print('[*] 已取消配置，请重新执行并填写正确网关')
-            return False
+def save_step_journal(journal):
+    """
+    保存步骤状态日志，先写临时文件再替换，避免写到一半断电导致文件损坏。
+    """
+    os.makedirs(os.path.dirname(STEP_JOURNAL_FILE), exist_ok=True)
+    temp_file = f'{STEP_JOURNAL_FILE}.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as file:
+        json.dump(journal, file, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp_file, STEP_JOURNAL_FILE)
 
-    return True
 
+def is_step_forced(step_name):
+    """
+    判断某个步骤是否被要求强制重做。
+    """
+    return step_name in FORCED_STEPS or 'all' in FORCED_STEPS
 
-def show_static_ip_summary(network_config):
+
+def is_step_up_to_date(step_name, fingerprint):
     """
-    打印将要应用的静态 IP 配置。
+    判断步骤是否已经用同样的输入完成过，并且结果文件没有被改动。
     """
-    print('\n即将应用的网络配置：')
-    print('=' * 50)
-    print(f"网卡：{network_config['interface']}")
-    print(f"IP地址：{network_config['ip']}")
-    print(f"子网掩码：{network_config['netmask']}")
-    print(f"网关：{network_config['gateway']}")
-    print(f"DNS1：{network_config['dns_servers'][0]}")
-    print(f"DNS2：{network_config['dns_servers'][1]}")
-    print('=' * 50)
+    if is_step_forced(step_name):
+        return False
 
+    entry = load_step_journal().get(step_name)
+    if not entry or entry.get('fingerprint') != fingerprint:
+        return False
 
-def apply_redhat_static_ip_config(system_info, network_config):
+    for file_path, recorded in entry.get('result_files', {}).items():
+        if not is_result_file_unchanged(file_path, recorded):
+            return False
+
+    return True
+
+
+def record_step_completed(step_name, fingerprint, result_files):
     """
-    在 RedHat 系列系统上应用静态 IP 配置。
+    把完成的步骤写入状态日志。
     """
-    print('\n[*] 正在为 RedHat 系列系统配置网络...')
+    recorded_files = {}
+    for file_path in result_files:
+        if not file_path:
+            continue
+        file_record = describe_result_file(file_path)
+        if file_record:
+            recorded_files[file_path] = file_record
+
+    journal = load_step_journal()
+    journal[step_name] = {
+        'fingerprint': fingerprint,
+        'completed_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'result_files': recorded_files,
+    }
 
     try:
-        version_number = int(system_info['system_version'].split('.')[0])
-    except Exception:
-        version_number = 8
+        save_step_journal(journal)
+    except OSError as error:
+        print(f'[!] 警告：无法写入步骤状态日志 {STEP_JOURNAL_FILE}: {error}')
 
-    if version_number >= 8 or system_info['system_type'] in ['rocky', 'almalinux']:
-        print('[*] 使用 nmcli 配置网络')
-        connection_name = get_active_connection_name(network_config['interface'])
-        print(f'[*] 识别到的连接名：{connection_name}')
 
-        command_steps = [
-            (f"[*] 正在把 {network_config['interface']} 设置为静态 IP 模式...", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.method', 'manual']),
-            (f"[*] 正在设置 IP 地址：{network_config['ip']}/{network_config['cidr']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.addresses', f"{network_config['ip']}/{network_config['cidr']}"]),
-            (f"[*] 正在设置网关：{network_config['gateway']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.gateway', network_config['gateway']]),
-            (f"[*] 正在设置 DNS：{', '.join(network_config['dns_servers'])}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.dns', ' '.join(network_config['dns_servers'])]),
-            ('[*] 正在设置开机自启...', ['nmcli', 'connection', 'modify', connection_name, 'connection.autoconnect', 'yes']),
-            ('[*] 正在重新加载连接...', ['nmcli', 'connection', 'reload']),
-        ]
+def run_journaled_step(step_name, step_inputs, result_files, step_function):
+    """
+    带状态记录地执行一个步骤。
 
-        for message, command in command_steps:
-            print(message)
-            if not run_system_command(command):
-                print('[!] 网络配置应用失败，请检查上面的错误信息')
-                return
+    参数说明：
+        step_name: 步骤名，比如 'repo'、'docker'
+        step_inputs: 决定步骤结果的输入参数（字典）
+        result_files: 步骤产生的文件列表，或者返回文件列表的函数（步骤完成后才调用）
+        step_function: 真正执行步骤的函数，成功返回 True
 
-        print('[*] 正在激活连接...')
-        if run_system_command(['nmcli', 'connection', 'up', connection_name]):
-            print('[*] 网络配置已应用')
-            print('[!] 如果你是通过 SSH 连接，网络重启时连接可能会短暂中断')
-        else:
-            print('[!] 激活网络连接失败')
-        return
+    返回值：
+        步骤成功（或已经完成过被跳过）返回 True，否则返回 False
+    """
+    fingerprint = compute_step_fingerprint(step_name, step_inputs)
+    if is_step_up_to_date(step_name, fingerprint):
+        step_label = JOURNALED_STEPS.get(step_name, step_name)
+        print(f'[OK] {step_label} 已用相同参数完成过，本次跳过')
+        print(f'[*] 如需重新执行，请加参数：--force {step_name}')
+        return True
 
-    print('[*] 使用传统 network-scripts 方式配置')
-    config_text = f"""TYPE=Ethernet
-BOOTPROTO=static
-NAME={network_config['interface']}
-DEVICE={network_config['interface']}
-ONBOOT=yes
-IPADDR={network_config['ip']}
-NETMASK={network_config['netmask']}
-GATEWAY={network_config['gateway']}
-DNS1={network_config['dns_servers'][0]}
-DNS2={network_config['dns_servers'][1]}
-"""
+    with trace_span(f'step: {step_name}', 'step'):
+        if not step_function():
+            return False
 
-    print('\n生成的配置如下：')
-    print('=' * 50)
-    print(config_text)
-    print('=' * 50)
+    if callable(result_files):
+        result_files = result_files()
+    record_step_completed(step_name, fingerprint, result_files)
+    return True
 
-    if not confirm_with_menu('是否写入配置文件？'):
-        print('[*] 已取消配置')
-        return
 
-    config_file_path = f"/etc/sysconfig/network-scripts/ifcfg-{network_config['interface']}"
-    with open(config_file_path, 'w', encoding='utf-8') as config_file:
-        config_file.write(config_text)
+# --------------------------------------------
+# 第一部分（续）：分段断点续传下载
+# 大文件按 HTTP Range 分成几段并发下载，中断后从 .part 文件接着下
+# --------------------------------------------
 
-    print('[*] 正在重启网络服务...')
-    if run_system_command(['systemctl', 'restart', 'network']):
-        print('[*] 网络配置已应用')
-    else:
-        print('[!] 重启网络服务失败')
+DOWNLOAD_SEGMENT_COUNT = 4
+# 文件小于 2 段这么大时不再拆分
+DOWNLOAD_MIN_SEGMENT_BYTES = 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+DOWNLOAD_TIMEOUT = 30
+# 每一段连续失败这么多次才放弃；每次重试都从已下载的位置继续
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_MAX_REDIRECTS = 5
+# 下载进度每隔这么多秒写一次到 .part.json
+DOWNLOAD_STATE_SAVE_SECONDS = 2.0
+DOWNLOAD_USER_AGENT = 'ops-toolbox-downloader'
 
 
-def apply_debian_static_ip_via_netplan(network_config):
+class _RemoteFileChanged(OSError):
     """
-    用 netplan 配置 Debian/Ubuntu 静态 IP。
+    下载过程中服务器上的文件变了（If-Range 不匹配），已下载的部分作废。
     """
-    config_text = f"""network:
-  version: 2
-  renderer: networkd
-  ethernets:
-    {network_config['interface']}:
-      dhcp4: no
-      addresses: [{network_config['ip']}/{network_config['cidr']}]
-      routes:
-        - to: default
-          via: {network_config['gateway']}
-      nameservers:
-        addresses: [{network_config['dns_servers'][0]}, {network_config['dns_servers'][1]}]
-"""
 
-    print('\n生成的 netplan 配置如下：')
-    print('=' * 50)
-    print(config_text)
-    print('=' * 50)
 
-    if not confirm_with_menu('是否写入配置文件？'):
-        print('[*] 已取消配置')
-        return
+class _PooledResponse:
+    """
+    with 语句用的响应包装：正常结束时把连接还给连接池，出错时直接关掉连接。
+    """
 
-    config_file_path = f"/etc/netplan/01-{network_config['interface']}.yaml"
-    with open(config_file_path, 'w', encoding='utf-8') as config_file:
-        config_file.write(config_text)
+    def __init__(self, pool, host_key, connection, response):
+        self.pool = pool
+        self.host_key = host_key
+        self.connection = connection
+        self.response = response
 
-    print('[*] 正在应用网络配置...')
-    if run_system_command(['netplan', 'apply']):
-        print('[*] 网络配置已应用')
-    else:
-        print('[!] 应用网络配置失败')
+    def __enter__(self):
+        return self.response
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.pool._release(self.host_key, self.connection, self.response)
+        else:
+            self.connection.close()
+        return False
 
-def apply_debian_static_ip_via_interfaces(network_config):
-    """
-    用 ifupdown 的 interfaces.d 配置 Debian 静态 IP。
+
+class HTTPConnectionPool:
     """
-    config_text = f"""auto {network_config['interface']}
-iface {network_config['interface']} inet static
-    address {network_config['ip']}/{network_config['cidr']}
-    gateway {network_config['gateway']}
-    dns-nameservers {network_config['dns_servers'][0]} {network_config['dns_servers'][1]}
-"""
+    按 (协议, 主机, 端口) 复用 HTTP 长连接
 
-    print('\n生成的 interfaces 配置如下：')
-    print('=' * 50)
-    print(config_text)
-    print('=' * 50)
+    同一个下载器里的多个文件、多个分段共用这些连接，省掉重复的 TCP 和 TLS 握手。
+    """
 
-    if not confirm_with_menu('是否写入配置文件？'):
-        print('[*] 已取消配置')
-        return
+    def __init__(self, timeout=DOWNLOAD_TIMEOUT, max_idle_per_host=DOWNLOAD_SEGMENT_COUNT * 2):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+
+    def _new_connection(self, host_key):
+        import http.client
+
+        scheme, host, port = host_key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, host_key):
+        with self._lock:
+            idle = self._idle_connections.get(host_key)
+            if idle:
+                return idle.pop(), True
+        return self._new_connection(host_key), False
+
+    def _release(self, host_key, connection, response):
+        # 只有响应体读完、服务器也没要求断开时，连接才能给下一个请求用
+        if response.isclosed() and not response.will_close:
+            with self._lock:
+                idle = self._idle_connections.setdefault(host_key, [])
+                if len(idle) < self.max_idle_per_host:
+                    idle.append(connection)
+                    return
+        connection.close()
+
+    def open(self, url, headers=None):
+        """
+        发送 GET 请求（会自动跟随重定向），返回用在 with 语句里的响应，用完自动归还连接。
 
-    interfaces_dir = '/etc/network/interfaces.d'
-    os.makedirs(interfaces_dir, exist_ok=True)
-    config_file_path = f'{interfaces_dir}/{network_config["interface"]}'
-    with open(config_file_path, 'w', encoding='utf-8') as config_file:
-        config_file.write(config_text)
+        响应的 url 属性是跟随重定向之后的最终地址。
+        """
+        import http.client
+        import urllib.parse
+
+        request_headers = {'User-Agent': DOWNLOAD_USER_AGENT}
+        request_headers.update(headers or {})
+        for _ in range(DOWNLOAD_MAX_REDIRECTS + 1):
+            parsed = urllib.parse.urlsplit(url)
+            if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+                raise ValueError(f'不支持的下载地址：{url}')
+            host_key = (parsed.scheme, parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80))
+            path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+
+            connection, reused = self._acquire(host_key)
+            try:
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not reused:
+                    raise
+                # 空闲连接可能已经被服务器关掉了，换一条新连接重试一次
+                connection = self._new_connection(host_key)
+                try:
+                    connection.request('GET', path, headers=request_headers)
+                    response = connection.getresponse()
+                except (http.client.HTTPException, OSError):
+                    connection.close()
+                    raise
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                response.read()
+                self._release(host_key, connection, response)
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+
+            response.url = url
+            return _PooledResponse(self, host_key, connection, response)
+        raise OSError(f'重定向次数过多：{url}')
+
+    def close(self):
+        with self._lock:
+            connections = [conn for idle in self._idle_connections.values() for conn in idle]
+            self._idle_connections.clear()
+        for connection in connections:
+            connection.close()
+
+
+def parse_download_checksum(checksum):
+    """
+    解析 'sha256:<十六进制>' 格式的校验值，返回 (算法, 十六进制)。
 
-    print('[*] 正在重启 networking 服务...')
-    if run_system_command(['systemctl', 'restart', 'networking']):
-        print('[*] 网络配置已应用')
+    不带算法前缀时按长度推断：32 位是 md5，40 位是 sha1，64 位是 sha256。
+    """
+    if ':' in checksum:
+        algorithm, digest = checksum.split(':', 1)
     else:
-        print('[!] networking 服务重启失败，请确认系统正在使用 ifupdown')
+        algorithm = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}.get(len(checksum), '')
+        digest = checksum
+    if algorithm.lower() not in ('md5', 'sha1', 'sha256', 'sha512'):
+        raise ValueError(f'无法识别的校验值：{checksum}')
+    return algorithm.lower(), digest.strip().lower()
 
 
-def apply_debian_static_ip_via_nmcli(network_config):
+def compute_file_digest(file_path, algorithm):
     """
-    用 NetworkManager 配置 Debian 静态 IP。
+    计算文件的哈希值（十六进制）。
     """
-    connection_name = get_active_connection_name(network_config['interface'])
-    print(f'[*] 识别到的连接名：{connection_name}')
-
-    command_steps = [
-        (f"[*] 正在把 {network_config['interface']} 设置为静态 IP 模式...", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.method', 'manual']),
-        (f"[*] 正在设置 IP 地址：{network_config['ip']}/{network_config['cidr']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.addresses', f"{network_config['ip']}/{network_config['cidr']}"]),
-        (f"[*] 正在设置网关：{network_config['gateway']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.gateway', network_config['gateway']]),
-        (f"[*] 正在设置 DNS：{', '.join(network_config['dns_servers'])}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.dns', ' '.join(network_config['dns_servers'])]),
-        ('[*] 正在设置开机自启...', ['nmcli', 'connection', 'modify', connection_name, 'connection.autoconnect', 'yes']),
-        ('[*] 正在重新加载连接...', ['nmcli', 'connection', 'reload']),
-    ]
+    import hashlib
 
-    for message, command in command_steps:
-        print(message)
-        if not run_system_command(command):
-            print('[!] 网络配置应用失败，请检查上面的错误信息')
-            return
+    digest = hashlib.new(algorithm)
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    print('[*] 正在激活连接...')
-    if run_system_command(['nmcli', 'connection', 'up', connection_name]):
-        print('[*] 网络配置已应用')
-    else:
-        print('[!] 激活网络连接失败')
 
+class SegmentedDownloader:
+    """
+    分段、断点续传的 HTTP 下载器
 
-def apply_debian_static_ip_config(network_config):
+    下载中的数据写在 <目标>.part，进度记录在 <目标>.part.json；
+    中断后再次下载同一个地址会校验服务器上的文件没变（ETag / Last-Modified），然后只下载缺的部分。
+    多个文件用同一个下载器时共用连接池。
     """
-    在 Debian 系列系统上应用静态 IP 配置。
-    """
-    print('\n[*] 正在为 Debian 系列系统配置网络...')
 
-    if check_command_exists('netplan') or os.path.isdir('/etc/netplan'):
-        print('[*] 检测到 netplan，使用 netplan 方式配置')
-        apply_debian_static_ip_via_netplan(network_config)
-        return
+    def __init__(self, segment_count=DOWNLOAD_SEGMENT_COUNT, timeout=DOWNLOAD_TIMEOUT, retries=DOWNLOAD_RETRIES):
+        self.segment_count = max(1, segment_count)
+        self.retries = retries
+        self.pool = HTTPConnectionPool(timeout=timeout, max_idle_per_host=self.segment_count * 2)
 
-    if check_command_exists('nmcli'):
-        print('[*] 检测到 NetworkManager，使用 nmcli 方式配置')
-        apply_debian_static_ip_via_nmcli(network_config)
-        return
+    def close(self):
+        self.pool.close()
 
-    print('[*] 未检测到 netplan 或 NetworkManager，回退到 interfaces.d 方式配置')
-    apply_debian_static_ip_via_interfaces(network_config)
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc_info):
+        self.close()
 
-def apply_static_ip_config(system_info, network_config):
-    """
-    按系统类型分发静态 IP 配置。
-    """
-    show_static_ip_summary(network_config)
-    if not confirm_with_menu('是否应用配置？'):
-        print('[*] 已取消配置')
-        return
+    def probe(self, url):
+        """
+        用 Range: bytes=0-0 探测文件大小、是否支持分段，以及用于续传校验的 ETag / Last-Modified。
 
-    system_family = system_info['system_family']
-    if system_family == 'redhat':
-        apply_redhat_static_ip_config(system_info, network_config)
-    elif system_family == 'debian':
-        apply_debian_static_ip_config(network_config)
-    else:
-        print('[!] 当前系统暂不支持自动配置静态 IP')
+        服务器不支持 Range、直接回 200 时不读响应体，把还没读的响应放在返回值的 response 里，
+        由调用方接着读进文件（用完要关闭），免得探测时读完整个文件、下载时又下一遍。
+        """
+        pooled_response = self.pool.open(url, {'Range': 'bytes=0-0'})
+        response = pooled_response.response
+        if response.status not in (200, 206):
+            pooled_response.connection.close()
+            raise OSError(f'HTTP {response.status}')
+
+        etag = response.getheader('ETag')
+        info = {
+            'url': response.url,
+            'etag': etag,
+            'last_modified': response.getheader('Last-Modified'),
+            'size': None,
+            'ranges': False,
+            'response': None,
+        }
+        content_range = response.getheader('Content-Range') or ''
+        if response.status == 206 and '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+            info['size'] = int(content_range.rsplit('/', 1)[1])
+            info['ranges'] = True
+        elif (response.getheader('Content-Length') or '').isdigit():
+            info['size'] = int(response.getheader('Content-Length'))
+
+        # 弱 ETag 不能用在 If-Range 里，只能退回到 Last-Modified
+        info['validator'] = etag if etag and not etag.startswith('W/') else info['last_modified']
+
+        if response.status == 200:
+            info['response'] = pooled_response
+        else:
+            with pooled_response:
+                response.read()
+        return info
+
+    def _plan_segments(self, size):
+        segment_count = min(self.segment_count, max(1, size // DOWNLOAD_MIN_SEGMENT_BYTES))
+        segment_size = -(-size // segment_count)
+        return [
+            {'start': start, 'end': min(start + segment_size, size) - 1, 'done': 0}
+            for start in range(0, size, segment_size)
+        ]
+
+    def _load_state(self, state_path, part_path, info):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(part_path):
+            return None
+        if state.get('size') != info['size'] or state.get('validator') != info['validator'] or not info['validator']:
+            return None
+        return state
+
+    def _save_state(self, state_path, state):
+        temp_path = f'{state_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temp_path, state_path)
+
+    def _download_segment(self, url, file_descriptor, segment, validator, progress, stop_event):
+        failures = 0
+        segment_length = segment['end'] - segment['start'] + 1
+        while segment['done'] < segment_length:
+            headers = {'Range': f"bytes={segment['start'] + segment['done']}-{segment['end']}"}
+            if validator:
+                headers['If-Range'] = validator
+            done_before = segment['done']
+            try:
+                with self.pool.open(url, headers) as response:
+                    if response.status == 200:
+                        raise _RemoteFileChanged('服务器上的文件已经变化')
+                    if response.status != 206:
+                        raise OSError(f'HTTP {response.status}')
+                    while True:
+                        if stop_event.is_set():
+                            return
+                        chunk = response.read(DOWNLOAD_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        os.pwrite(file_descriptor, chunk, segment['start'] + segment['done'])
+                        segment['done'] += len(chunk)
+                        progress(len(chunk))
+                # 连接中途断开时 read() 只会提前返回空数据，有进展就接着下，没进展算一次失败
+                if segment['done'] == done_before:
+                    raise OSError('连接断开，没有收到数据')
+                failures = 0
+            except _RemoteFileChanged:
+                raise
+            except (OSError, ValueError) as error:
+                failures += 1
+                if failures > self.retries:
+                    raise OSError(f'分段 {segment["start"]}-{segment["end"]} 多次失败：{error}')
+                time.sleep(min(2 ** failures, 30) * 0.5)
+
+    def _download_stream(self, url, part_path, progress, first_response=None):
+        """
+        服务器不支持 Range 时整文件单线程下载，失败只能从头重来。
 
+        first_response 是探测时拿到、还没读的 200 响应，第一次尝试直接读它。
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                pooled_response = first_response if attempt == 0 and first_response else self.pool.open(url)
+                with pooled_response as response, open(part_path, 'wb') as file:
+                    if response.status != 200:
+                        raise OSError(f'HTTP {response.status}')
+                    while True:
+                        chunk = response.read(DOWNLOAD_CHUNK_BYTES)
+                        if not chunk:
+                            return
+                        file.write(chunk)
+                        progress(len(chunk))
+            except (OSError, ValueError):
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(2 ** attempt, 30) * 0.5)
+
+    def download(self, url, target_path, checksum=None, show_progress=True):
+        """
+        下载 url 到 target_path，成功返回 True。
 
-def config_static_ip(system_info):
-    """
-    配置静态 IP 地址。
+        参数说明：
+            checksum: 可选，'sha256:<十六进制>' 之类的校验值，不匹配时删除文件并返回 False
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        target_path = get_command_executor().resolve_path(target_path)
+        part_path = f'{target_path}.part'
+        state_path = f'{target_path}.part.json'
+        display_name = os.path.basename(target_path)
+
+        for _ in range(2):
+            try:
+                info = self.probe(url)
+            except (OSError, ValueError) as error:
+                print(f'[!] 无法连接下载地址 {url}：{error}')
+                return False
+
+            state = self._load_state(state_path, part_path, info) if info['ranges'] else None
+            if state is None and info['ranges']:
+                state = {'url': url, 'size': info['size'], 'validator': info['validator'],
+                         'segments': self._plan_segments(info['size'])}
+                with open(part_path, 'wb') as file:
+                    file.truncate(info['size'])
+            elif state is not None:
+                print(f'[*] 发现未完成的下载，继续下载 {display_name}')
+
+            downloaded = sum(segment['done'] for segment in state['segments']) if state else 0
+            progress_lock = threading.Lock()
+            progress_state = {'bytes': downloaded, 'printed_at': 0.0, 'saved_at': time.monotonic()}
+            started_at = time.monotonic()
+
+            def report_progress(byte_count):
+                with progress_lock:
+                    progress_state['bytes'] += byte_count
+                    now = time.monotonic()
+                    if state and now - progress_state['saved_at'] >= DOWNLOAD_STATE_SAVE_SECONDS:
+                        progress_state['saved_at'] = now
+                        self._save_state(state_path, state)
+                    if show_progress and now - progress_state['printed_at'] >= 0.5:
+                        progress_state['printed_at'] = now
+                        speed = (progress_state['bytes'] - downloaded) / max(now - started_at, 0.001)
+                        total = f"/{_format_bytes(info['size'])}" if info['size'] else ''
+                        print(f"\r[*] 下载 {display_name}：{_format_bytes(progress_state['bytes'])}{total}"
+                              f"  {_format_bytes(speed)}/s", end='', flush=True)
+
+            try:
+                if state is None:
+                    self._download_stream(info['url'], part_path, report_progress, info['response'])
+                else:
+                    pending = [segment for segment in state['segments']
+                               if segment['done'] < segment['end'] - segment['start'] + 1]
+                    file_descriptor = os.open(part_path, os.O_WRONLY)
+                    # 一段失败或按了 Ctrl+C 时通知其他分段停下，已下载的进度在 finally 里落盘
+                    stop_event = threading.Event()
+                    try:
+                        with ThreadPoolExecutor(max_workers=max(1, len(pending))) as pool:
+                            futures = [
+                                pool.submit(self._download_segment, info['url'], file_descriptor,
+                                            segment, info['validator'], report_progress, stop_event)
+                                for segment in pending
+                            ]
+                            try:
+                                for future in futures:
+                                    future.result()
+                            except BaseException:
+                                stop_event.set()
+                                raise
+                    finally:
+                        os.close(file_descriptor)
+                        self._save_state(state_path, state)
+            except _RemoteFileChanged:
+                if show_progress:
+                    print()
+                print(f'[!] {display_name} 在服务器上已更新，重新开始下载')
+                for path in (part_path, state_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                continue
+            except (OSError, ValueError) as error:
+                if show_progress:
+                    print()
+                print(f'[!] 下载 {display_name} 失败：{error}')
+                print('[*] 已下载的部分已保留，重新执行会从断点继续')
+                return False
+            break
+        else:
+            print(f'[!] {display_name} 下载过程中一直在变化，放弃下载')
+            return False
+
+        if show_progress:
+            print()
+        if checksum:
+            algorithm, expected_digest = parse_download_checksum(checksum)
+            actual_digest = compute_file_digest(part_path, algorithm)
+            if actual_digest != expected_digest:
+                print(f'[!] {display_name} 校验失败：期望 {algorithm} {expected_digest}，实际 {actual_digest}')
+                for path in (part_path, state_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return False
+
+        os.replace(part_path, target_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        print(f"[OK] 已下载 {display_name}（{_format_bytes(os.path.getsize(target_path))}）")
+        return True
+
+
+def download_files(downloads, segment_count=DOWNLOAD_SEGMENT_COUNT):
     """
-    chosen_interface = choose_static_ip_interface()
-    if chosen_interface is None:
-        return
+    依次下载多个文件，共用同一个连接池。
 
-    network_config = collect_static_ip_config(chosen_interface)
-    if network_config is None:
-        return
+    参数说明：
+        downloads: [(下载地址, 目标路径, 校验值或 None)]
 
-    if not validate_static_ip_config(network_config):
-        return
+    返回值：
+        全部成功返回 True
+    """
+    with SegmentedDownloader(segment_count=segment_count) as downloader:
+        return all([downloader.download(url, target_path, checksum) for url, target_path, checksum in downloads])
 
-    if not confirm_static_ip_warnings(network_config):
-        return
 
-    apply_static_ip_config(system_info, network_config)
+def download_file(url, target_path, checksum=None):
+    """
+    分段、断点续传地下载单个文件，成功返回 True。
+    """
+    return download_files([(url, target_path, checksum)])
 
 
 # --------------------------------------------
-# 第五部分：安全设置功能
-# 关闭防火墙和 SELinux（生产环境请谨慎使用）
+# 第二部分：包管理器统一接口
+# 不同的Linux系统用不同的包管理器，这里统一封装
 # --------------------------------------------
 
-def disable_firewall_and_selinux(system_info):
+class PackageManager:
     """
-    关闭防火墙和 SELinux
-    
-    注意：这个操作会降低系统安全性！
-    通常只在开发测试环境使用，生产环境请谨慎操作
+    包管理器类 - 让不同Linux系统用同样的方式安装软件
     
-    参数说明：
-        system_info: 系统信息字典
+    就像一个"翻译器"：
+    - Ubuntu 用 apt install
+    - CentOS 用 yum install 或 dnf install
+    - 我们只需要说"安装某个软件"，它会自动选择正确的命令
     """
-    system_family = system_info['system_family']
     
-    if system_family == 'redhat':
-        # RedHat 系列：关闭 firewalld 和 SELinux
-        print('[*] 正在关闭 RedHat 系统的防火墙和 SELinux...')
-        
-        # 关闭 firewalld
-        print('[*] 停止 firewalld 服务...')
-        run_system_command(['systemctl', 'stop', 'firewalld'])
-        
-        print('[*] 禁用 firewalld 开机自启...')
-        run_system_command(['systemctl', 'disable', 'firewalld'])
+    def __init__(self, system_info):
+        """
+        初始化包管理器
         
-        # 临时关闭 SELinux
-        print('[*] 临时关闭 SELinux...')
-        run_system_command(['setenforce', '0'])
+        参数说明：
+            system_info: 系统信息字典（从 read_system_info 函数获取）
+        """
+        self.system_info = system_info
+        self.package_manager = system_info['package_manager']
+        self.system_family = system_info['system_family']
+        self.system_type = system_info['system_type']
+    
+    def install_packages(self, package_list):
+        """
+        安装软件包
         
-        # 永久关闭 SELinux（修改配置文件）
-        print('[*] 永久禁用 SELinux...')
-        run_system_command(['sed', '-i', 's/^SELINUX=enforcing/SELINUX=disabled/', '/etc/selinux/config'])
+        参数说明：
+            package_list: 要安装的软件列表，比如 ['vim', 'wget', 'git']
         
-        print('[OK] firewalld 和 SELinux 已禁用')
-        print('[!] 注意：SELinux 永久禁用需要重启系统才能生效')
-    
-    elif system_family == 'debian':
-        # Debian 系列：关闭 ufw
-        print('[*] 正在关闭 Debian 系统的防火墙...')
+        返回值：
+            安装成功返回 True，失败返回 False
+        """
+        print(f"[*] 准备安装软件: {', '.join(package_list)}")
+        # 安装期间包管理器的锁要让出来，装完再接着预下载还没完成的分组
+        stop_package_prefetch()
+        try:
+            return self._run_package_manager(package_list)
+        finally:
+            resume_package_prefetch(package_list)
 
-        if check_command_exists('ufw'):
-            print('[*] 禁用 ufw 防火墙...')
-            run_system_command(['ufw', 'disable'])
-            print('[OK] ufw 防火墙已禁用')
-        elif check_command_exists('systemctl') and get_existing_systemd_service(['firewalld']):
-            print('[*] 检测到 firewalld，正在停止并禁用...')
-            run_system_command(['systemctl', 'stop', 'firewalld'])
-            run_system_command(['systemctl', 'disable', 'firewalld'])
-            print('[OK] firewalld 已禁用')
+    def _run_package_manager(self, package_list):
+        if self.package_manager == 'apt':
+            # Debian 家族：先更新索引，再安装
+            print("[*] 正在更新软件包索引...")
+            if not run_system_command(['apt', 'update']):
+                return False
+            print("[*] 正在安装软件...")
+            return run_system_command(['apt', 'install', '-y'] + package_list)
+            
+        elif self.package_manager in ['yum', 'dnf']:
+            # RedHat 家族：直接安装（yum/dnf 会自动处理依赖）
+            print("[*] 正在安装软件...")
+            return run_system_command([self.package_manager, 'install', '-y'] + package_list)
         else:
-            print('[*] 当前系统没有检测到受支持的防火墙管理工具，跳过自动处理')
-    else:
-        print('[!] 当前系统不支持自动关闭防火墙')
-
-
-# --------------------------------------------
-# 第五部分：软件源配置功能
-# 更换国内镜像源，加快软件下载速度
-# --------------------------------------------
+            print(f"[!] 错误：不支持的包管理器 {self.package_manager}")
+            return False
 
-def backup_file_if_exists(file_path, backup_path=None):
-    """
-    如果文件存在，就先备份一份。
-    """
-    if not os.path.exists(file_path):
-        return None
 
-    if backup_path is None:
-        backup_path = f'{file_path}.backup'
+# apt 索引超过这个时间没更新，预下载前先刷新一次
+PREFETCH_METADATA_MAX_AGE_SECONDS = 3600
+# 停止预下载时给包管理器留的退出时间
+PREFETCH_STOP_TIMEOUT_SECONDS = 10
+DOCKER_APT_PACKAGES = [
+    'docker-ce',
+    'docker-ce-cli',
+    'containerd.io',
+    'docker-buildx-plugin',
+    'docker-compose-plugin'
+]
+DOCKER_RPM_PACKAGES = ['docker-ce', 'docker-ce-cli', 'containerd.io']
 
-    shutil.copy2(file_path, backup_path)
-    return backup_path
+# 当前正在运行的后台预下载（同一时间只有一个）
+_active_prefetcher = None
+# 被安装命令打断的预下载：(系统信息, 还没完成的分组)，安装结束后接着下载
+_paused_prefetch = None
 
 
-def choose_repository_mirror(system_family, system_type):
+def get_common_tool_packages(system_family):
     """
-    选择要使用的软件源镜像。
+    返回"安装常用工具"要装的软件包列表。
     """
-    if system_family != 'debian':
-        return 'aliyun'
+    common_tool_list = [
+        'vim',              # 文本编辑器
+        'wget',             # 下载工具
+        'curl',             # HTTP工具
+        'net-tools',        # 网络工具
+        'lrzsz',            # 上传下载工具
+        'bash-completion',  # 命令补全
+        'git'               # 版本控制
+    ]
 
-    title = '请选择软件源镜像'
-    subtitle = '官方源更通用，尤其适合海外服务器'
+    if system_family == 'debian':
+        # Debian 下这些包经常会作为其他功能前置依赖用到
+        common_tool_list.extend([
+            'ca-certificates',
+            'gnupg',
+            'lsb-release'
+        ])
 
-    options = [('官方源（推荐）', 'official')]
-    options.extend([
-        ('阿里云', 'aliyun'),
-        ('清华', 'tsinghua'),
-        ('腾讯', 'tencent'),
-    ])
+    # 去重，保留原顺序
+    return list(dict.fromkeys(common_tool_list))
 
-    selected_mirror = select_menu_option(title, options, subtitle)
-    return selected_mirror or 'official'
 
+def get_prefetch_package_groups(system_info):
+    """
+    列出接下来可能要安装的软件包，按功能分组返回 [(名称, 软件包列表)]。
 
-def write_text_file(file_path, content):
+    MySQL / Docker 的软件包来自各自的官方仓库，仓库还没配置时跳过，避免白白报错。
     """
-    用 UTF-8 写文本文件。
+    system_family = system_info['system_family']
+    executor = get_command_executor()
+    groups = [('常用工具', get_common_tool_packages(system_family))]
+
+    if system_family == 'debian':
+        groups.append(('MySQL', ['default-mysql-server']))
+        if os.path.exists(executor.resolve_path('/etc/apt/sources.list.d/docker.list')):
+            groups.append(('Docker', DOCKER_APT_PACKAGES))
+    elif system_family == 'redhat':
+        if os.path.exists(executor.resolve_path('/etc/yum.repos.d/mysql.repo')):
+            groups.append(('MySQL', ['mysql-community-server']))
+        if os.path.exists(executor.resolve_path('/etc/yum.repos.d/docker-ce.repo')):
+            groups.append(('Docker', DOCKER_RPM_PACKAGES))
+    return groups
+
+
+class PackagePrefetcher:
     """
-    with open(file_path, 'w', encoding='utf-8') as file:
-        file.write(content)
+    后台预下载软件包
 
+    用户还在菜单里选择的时候，先用最低的 CPU / 磁盘优先级把可能要装的软件包只下载不安装，
+    真正安装时包已经在本地缓存里了。
+    安装前必须先调用 stop()，否则包管理器的锁会和安装命令冲突。
+    """
 
-def normalize_debian_codename(system_version, system_codename):
+    def __init__(self, system_info, package_groups):
+        self.system_info = system_info
+        self.package_manager = system_info['package_manager']
+        self.package_groups = package_groups
+        self.completed_groups = []
+        self._process = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='package-prefetch', daemon=True)
+
+    def _low_priority_prefix(self):
+        prefix = []
+        if check_command_exists('nice'):
+            prefix += ['nice', '-n', '19']
+        if check_command_exists('ionice'):
+            prefix += ['ionice', '-c', '3']
+        return prefix
+
+    def _build_commands(self):
+        """
+        生成要依次执行的命令 [(分组名, 命令)]；分组名为 None 的是刷新索引。
+        """
+        commands = []
+        if self.package_manager == 'apt':
+            try:
+                metadata_age = time.time() - os.path.getmtime('/var/lib/apt/lists')
+            except OSError:
+                metadata_age = PREFETCH_METADATA_MAX_AGE_SECONDS + 1
+            if metadata_age > PREFETCH_METADATA_MAX_AGE_SECONDS:
+                commands.append((None, ['apt-get', 'update', '-q']))
+            for group_name, packages in self.package_groups:
+                commands.append((group_name, ['apt-get', 'install', '-y', '-q', '--download-only'] + packages))
+        elif self.package_manager in ('yum', 'dnf'):
+            commands.append((None, [self.package_manager, 'makecache', '-q']))
+            for group_name, packages in self.package_groups:
+                commands.append((group_name, [self.package_manager, 'install', '-y', '-q', '--downloadonly'] + packages))
+        return commands
+
+    def _run(self):
+        prefix = self._low_priority_prefix()
+        environment = dict(os.environ, DEBIAN_FRONTEND='noninteractive')
+        for group_name, command in self._build_commands():
+            with self._lock:
+                if self._stopped.is_set():
+                    return
+                try:
+                    self._process = subprocess.Popen(
+                        prefix + command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL, env=environment, start_new_session=True
+                    )
+                except OSError:
+                    return
+            return_code = self._process.wait()
+            if return_code == 0 and group_name:
+                self.completed_groups.append(group_name)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止预下载并等包管理器退出，返回已经下载完成的分组名列表。
+        """
+        import signal
+
+        with self._lock:
+            self._stopped.set()
+            process = self._process
+        if process is not None and process.poll() is None:
+            # 包管理器被 SIGTERM 打断时会清理下载到一半的文件并释放锁
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait(timeout=PREFETCH_STOP_TIMEOUT_SECONDS)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+            except ProcessLookupError:
+                pass
+        self._thread.join(timeout=PREFETCH_STOP_TIMEOUT_SECONDS)
+        return list(self.completed_groups)
+
+
+def start_package_prefetch(system_info, package_groups=None):
     """
-    尽量拿到 Debian 的发行代号。
+    软件源配置好之后，在后台预下载常用工具、MySQL、Docker 的软件包。
+
+    package_groups 不传时按 get_prefetch_package_groups 的结果下载。
+    录制 / 回放模式下不预下载，避免产生不在录制里的系统命令。
     """
-    if system_codename and system_codename not in ['unknown', 'n/a', 'N/A']:
-        return system_codename.strip().lower()
+    global _active_prefetcher, _paused_prefetch
 
-    codename_map = {
-        '10': 'buster',
-        '11': 'bullseye',
-        '12': 'bookworm',
-        '13': 'trixie',
-    }
-    version_major = str(system_version).split('.')[0]
-    return codename_map.get(version_major, '')
+    if type(get_command_executor()) is not CommandExecutor:
+        return
+    stop_package_prefetch()
+    _paused_prefetch = None
 
+    package_groups = package_groups or get_prefetch_package_groups(system_info)
+    if not package_groups:
+        return
+    import atexit
 
-def get_debian_mirror_endpoints(mirror_name):
-    """
-    返回 Debian 不同镜像对应的主仓库和安全仓库地址。
-    """
-    mirror_map = {
-        'official': ('http://deb.debian.org/debian', 'http://security.debian.org/debian-security'),
-        'aliyun': ('http://mirrors.aliyun.com/debian', 'http://mirrors.aliyun.com/debian-security'),
-        'tsinghua': ('https://mirrors.tuna.tsinghua.edu.cn/debian', 'https://mirrors.tuna.tsinghua.edu.cn/debian-security'),
-        'tencent': ('https://mirrors.cloud.tencent.com/debian', 'https://mirrors.cloud.tencent.com/debian-security'),
-    }
-    return mirror_map.get(mirror_name, mirror_map['official'])
+    _active_prefetcher = PackagePrefetcher(system_info, package_groups)
+    _active_prefetcher.start()
+    # 退出工具箱时也要停掉，不然包管理器会在后台一直占着锁
+    atexit.register(stop_package_prefetch)
+    group_names = '、'.join(name for name, _ in package_groups)
+    print(f'[*] 已在后台低优先级预下载软件包（{group_names}），安装时会优先使用本地缓存')
 
 
-def get_ubuntu_mirror_endpoints(mirror_name):
+def stop_package_prefetch():
     """
-    返回 Ubuntu 不同镜像对应的主仓库和安全仓库地址。
+    停止后台预下载（没有在运行时什么也不做）；在调用包管理器安装之前必须先调用。
     """
-    mirror_map = {
-        'official': ('http://archive.ubuntu.com/ubuntu', 'http://security.ubuntu.com/ubuntu'),
-        'aliyun': ('http://mirrors.aliyun.com/ubuntu', 'http://mirrors.aliyun.com/ubuntu'),
-        'tsinghua': ('https://mirrors.tuna.tsinghua.edu.cn/ubuntu', 'https://mirrors.tuna.tsinghua.edu.cn/ubuntu'),
-        'tencent': ('https://mirrors.cloud.tencent.com/ubuntu', 'https://mirrors.cloud.tencent.com/ubuntu'),
-    }
-    return mirror_map.get(mirror_name, mirror_map['official'])
+    global _active_prefetcher, _paused_prefetch
 
+    prefetcher = _active_prefetcher
+    _active_prefetcher = None
+    if prefetcher is None:
+        return
+    total = len(prefetcher.package_groups)
+    completed_groups = prefetcher.stop()
+    remaining_groups = [group for group in prefetcher.package_groups if group[0] not in completed_groups]
+    _paused_prefetch = (prefetcher.system_info, remaining_groups) if remaining_groups else None
+    if remaining_groups:
+        print(f'[*] 已停止后台预下载（完成 {len(completed_groups)}/{total} 组）')
 
-def build_ubuntu_sources_content(system_codename, mirror_name):
+
+def resume_package_prefetch(installed_packages=()):
     """
-    生成 Ubuntu 软件源配置内容。
+    安装结束后，继续预下载被打断的分组；软件包都已经装过的分组跳过。
     """
-    archive_url, security_url = get_ubuntu_mirror_endpoints(mirror_name)
-    return f"""# Ubuntu 软件源
-deb {archive_url} {system_codename} main restricted universe multiverse
-deb {security_url} {system_codename}-security main restricted universe multiverse
-deb {archive_url} {system_codename}-updates main restricted universe multiverse
-deb {archive_url} {system_codename}-backports main restricted universe multiverse
+    global _paused_prefetch
 
-# 源码仓库（可选）
-# deb-src {archive_url} {system_codename} main restricted universe multiverse
-"""
+    if _paused_prefetch is None or _active_prefetcher is not None:
+        return
+    system_info, package_groups = _paused_prefetch
+    _paused_prefetch = None
+    package_groups = [
+        (group_name, packages) for group_name, packages in package_groups
+        if not set(packages) <= set(installed_packages)
+    ]
+    if package_groups:
+        start_package_prefetch(system_info, package_groups)
 
 
-def build_debian_sources_content(system_version, system_codename, use_deb822, mirror_name):
+# --------------------------------------------
+# 第三部分：网络配置功能
+# 帮助用户设置静态IP地址
+# --------------------------------------------
+
+def get_network_interface_list():
     """
-    生成 Debian 软件源配置内容。
+    获取网络接口名称列表
+    
+    网络接口就是网卡的名字，比如 eth0, ens33 等
+    这个函数会列出所有的网卡（除了本地回环 lo）
+    
+    返回值：
+        网卡名称列表，比如 ['eth0', 'eth1']
     """
-    debian_codename = normalize_debian_codename(system_version, system_codename)
-    if not debian_codename:
+    try:
+        # 读取 /sys/class/net 目录，这里面保存了所有网卡的信息
+        all_interfaces = os.listdir('/sys/class/net')
+        
+        # 过滤掉 lo（本地回环接口），只保留真正的网卡
+        real_interfaces = []
+        for interface_name in all_interfaces:
+            if interface_name != 'lo':  # lo 是本地回环，不是真正的网卡
+                real_interfaces.append(interface_name)
+        
+        return real_interfaces
+        
+    except FileNotFoundError:
+        print('[!] 错误：无法读取网络接口信息')
+        return []
+
+
+def get_command_output(command_list, work_directory=None, timeout=None):
+    """
+    Run a command and return stdout text, or an empty string on failure or timeout.
+    """
+    try:
+        result = get_command_executor().capture(command_list, work_directory, timeout=timeout)
+    except Exception:
+        return ''
+    if result.returncode != 0:
+        return ''
+    return result.stdout.strip()
+
+
+def get_existing_systemd_service(service_name_list):
+    """
+    从候选服务名里找出当前系统真实存在的那个。
+    """
+    if not check_command_exists('systemctl'):
         return None
 
-    version_major = str(system_version).split('.')[0]
-    components = ['main', 'contrib', 'non-free']
-    if version_major.isdigit() and int(version_major) >= 12:
-        components.append('non-free-firmware')
-    components_text = ' '.join(components)
-    archive_url, security_url = get_debian_mirror_endpoints(mirror_name)
+    for service_name in service_name_list:
+        try:
+            result = get_command_executor().capture(
+                ['systemctl', 'list-unit-files', f'{service_name}.service', '--no-legend'],
+                timeout=HOST_FACT_PROBE_TIMEOUT
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if result.returncode == 0 and f'{service_name}.service' in result.stdout:
+            return service_name
 
-    if use_deb822:
-        keyring_file = '/usr/share/keyrings/debian-archive-keyring.gpg'
-        common_fields = []
-        if mirror_name == 'official' and os.path.exists(keyring_file):
-            common_fields.append(f'Signed-By: {keyring_file}')
+    return None
 
-        main_stanza = [
-            'Types: deb',
-            f'URIs: {archive_url}',
-            f'Suites: {debian_codename} {debian_codename}-updates',
-            f'Components: {components_text}',
-        ] + common_fields
 
-        security_stanza = [
-            'Types: deb',
-            f'URIs: {security_url}',
-            f'Suites: {debian_codename}-security',
-            f'Components: {components_text}',
-        ] + common_fields
+def start_and_enable_service(service_name_list):
+    """
+    启动并设置服务开机自启。
+    """
+    service_name = get_existing_systemd_service(service_name_list)
+    if not service_name:
+        return None
 
-        return '\n'.join(main_stanza) + '\n\n' + '\n'.join(security_stanza) + '\n'
+    print(f'[*] 启动 {service_name} 服务...')
+    run_system_command(['systemctl', 'start', service_name])
+    print(f'[*] 设置 {service_name} 开机自启...')
+    run_system_command(['systemctl', 'enable', service_name])
+    return service_name
 
-    return f"""# Debian 软件源
-deb {archive_url} {debian_codename} {components_text}
-deb {archive_url} {debian_codename}-updates {components_text}
-deb {security_url} {debian_codename}-security {components_text}
-"""
 
+def get_active_connection_name(interface_name):
+    """
+    Resolve the active NetworkManager connection name for an interface.
+    """
+    if not check_command_exists('nmcli'):
+        return interface_name
+
+    connection_name = get_command_output(
+        ['nmcli', '-g', 'GENERAL.CONNECTION', 'device', 'show', interface_name]
+    )
+    if connection_name and connection_name != '--':
+        return connection_name
 
-def configure_debian_apt_sources(system_version, system_codename, mirror_name):
+    return interface_name
+
+
+def get_current_network_defaults(interface_name, timeout=None):
     """
-    配置 Debian 的 APT 软件源，兼容传统 sources.list 和 Debian 12+ 的 deb822 格式。
+    Read current gateway and DNS values from NetworkManager for an interface.
     """
-    sources_file = '/etc/apt/sources.list'
-    deb822_file = '/etc/apt/sources.list.d/debian.sources'
-    use_deb822 = os.path.exists(deb822_file)
+    network_defaults = {
+        'gateway': '',
+        'dns_servers': []
+    }
 
-    if str(system_version).split('.')[0].isdigit() and int(str(system_version).split('.')[0]) >= 12:
-        use_deb822 = True
+    if not check_command_exists('nmcli'):
+        return network_defaults
 
-    backup_file = backup_file_if_exists(sources_file, '/etc/apt/sources.list.backup')
-    if backup_file:
-        print(f'[*] 备份原有软件源配置到: {backup_file}')
+    gateway_output = get_command_output(
+        ['nmcli', '-g', 'IP4.GATEWAY', 'device', 'show', interface_name],
+        timeout=timeout
+    )
+    if gateway_output:
+        network_defaults['gateway'] = gateway_output.splitlines()[0].strip()
 
-    deb822_backup = backup_file_if_exists(deb822_file, '/etc/apt/sources.list.d/debian.sources.backup')
-    if deb822_backup:
-        print(f'[*] 备份 deb822 软件源配置到: {deb822_backup}')
+    dns_output = get_command_output(
+        ['nmcli', '-g', 'IP4.DNS', 'device', 'show', interface_name],
+        timeout=timeout
+    )
+    if dns_output:
+        dns_list = []
+        for line in dns_output.splitlines():
+            dns_server = line.strip()
+            if dns_server and dns_server not in dns_list:
+                dns_list.append(dns_server)
+        network_defaults['dns_servers'] = dns_list
 
-    new_sources_content = build_debian_sources_content(system_version, system_codename, use_deb822, mirror_name)
-    if not new_sources_content:
-        print('[!] 无法识别 Debian 发行代号，暂时不能自动生成软件源配置')
-        return False
+    return network_defaults
 
-    if use_deb822:
-        print('[*] 检测到 Debian 12+ 或 deb822 格式，使用 /etc/apt/sources.list.d/debian.sources')
-        write_text_file(deb822_file, new_sources_content)
-        if os.path.exists(sources_file):
-            write_text_file(sources_file, '# 该文件由 ops_toolbox 保留，实际源配置请看 sources.list.d/debian.sources\n')
-    else:
-        print('[*] 使用传统 /etc/apt/sources.list 格式')
-        write_text_file(sources_file, new_sources_content)
-        if os.path.exists(deb822_file):
-            write_text_file(deb822_file, '# 该文件由 ops_toolbox 暂时停用，避免与 sources.list 重复\n')
 
-    return True
+# DNS 测速的候选公共 DNS 和测试域名
+DNS_CANDIDATE_SERVERS = ('223.5.5.5', '119.29.29.29', '114.114.114.114', '1.1.1.1', '8.8.8.8')
+DNS_BENCHMARK_NAMES = ('www.baidu.com', 'www.qq.com', 'mirrors.aliyun.com', 'github.com', 'www.cloudflare.com')
+DNS_BENCHMARK_TIMEOUT = 1.0
+DNS_BENCHMARK_ROUNDS = 2
+# 失败率超过这个值的 DNS 不参与推荐
+DNS_MAX_FAILURE_RATE = 0.2
+DNS_BENCHMARK_CACHE_FILE = os.path.join(TOOLBOX_CACHE_DIR, 'dns_benchmark.json')
+DNS_BENCHMARK_CACHE_SECONDS = 24 * 3600
 
 
-def change_software_repository(system_info):
+def benchmark_dns_servers(servers, names=DNS_BENCHMARK_NAMES, timeout=DNS_BENCHMARK_TIMEOUT,
+                          rounds=DNS_BENCHMARK_ROUNDS):
     """
-    更换软件源为国内镜像（阿里云镜像）
-    
-    这个功能可以让软件下载速度更快
-    因为国内访问国外的软件源比较慢
-    
+    并发向每个 DNS 发真实查询，统计延迟和失败率。
+
+    同一轮的查询同时发出，各轮依次进行：第一轮让 DNS 把域名缓存下来，
+    延迟只统计之后的轮次（只有一轮时就用这一轮），总耗时最多 rounds × timeout 秒。
+    超时、网络不通和服务器出错（SERVFAIL、REFUSED 等）在每一轮都算失败。
+
+    返回值：
+        {DNS: {'median': 秒, 'p95': 秒, 'failure_rate': 0~1, 'queries': 查询次数}}
+        全部失败的 DNS 的 median 和 p95 为 None
+    """
+    import statistics
+    from concurrent.futures import ThreadPoolExecutor
+
+    def measure(server, name):
+        try:
+            latency, response_code = query_dns_server(server, name, timeout)
+        except OSError:
+            return None
+        return latency if response_code in (0, 3) else None
+
+    jobs = [(server, name) for server in servers for name in names]
+    round_latencies = []
+    # 线程数等于一轮的查询数，保证一轮里所有查询真的是同时发出的
+    with ThreadPoolExecutor(max_workers=len(jobs) or 1) as pool:
+        for _ in range(max(1, rounds)):
+            round_latencies.append(list(pool.map(lambda job: measure(*job), jobs)))
+    measured_rounds = round_latencies[1:] or round_latencies
+
+    results = {}
+    for server in servers:
+        samples = [latency for latencies in round_latencies
+                   for (job_server, _), latency in zip(jobs, latencies) if job_server == server]
+        succeeded = sorted(latency for latencies in measured_rounds
+                           for (job_server, _), latency in zip(jobs, latencies)
+                           if job_server == server and latency is not None)
+        results[server] = {
+            'median': statistics.median(succeeded) if succeeded else None,
+            'p95': succeeded[min(len(succeeded) - 1, int(round(0.95 * (len(succeeded) - 1))))] if succeeded else None,
+            'failure_rate': sum(latency is None for latency in samples) / len(samples) if samples else 1.0,
+            'queries': len(samples),
+        }
+    return results
+
+
+def rank_dns_servers(benchmark_results, max_failure_rate=DNS_MAX_FAILURE_RATE):
+    """
+    按可靠性和速度排序：失败率达标的排前面，再按中位延迟、p95 延迟排序。
+    全部失败的 DNS 不出现在结果里。
+    """
+    usable = [(server, stats) for server, stats in benchmark_results.items() if stats['median'] is not None]
+    usable.sort(key=lambda item: (
+        item[1]['failure_rate'] > max_failure_rate,
+        item[1]['median'],
+        item[1]['p95'],
+    ))
+    return [server for server, _ in usable]
+
+
+def _load_dns_benchmark_cache():
+    try:
+        with open(DNS_BENCHMARK_CACHE_FILE, 'r', encoding='utf-8') as file:
+            cache_data = json.load(file)
+        return cache_data if isinstance(cache_data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_dns_benchmark_cache(cache_data):
+    try:
+        os.makedirs(TOOLBOX_CACHE_DIR, exist_ok=True)
+        temp_file = f'{DNS_BENCHMARK_CACHE_FILE}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(cache_data, file, ensure_ascii=False)
+        os.replace(temp_file, DNS_BENCHMARK_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def get_recommended_dns_servers(detected_dns_list=None, subnet=None, candidate_servers=DNS_CANDIDATE_SERVERS,
+                                use_cache=True):
+    """
+    实测当前检测到的 DNS 和候选公共 DNS，推荐最快且可靠的两个。
+
+    测速结果按所在网段缓存 DNS_BENCHMARK_CACHE_SECONDS 秒，同一网段再次配置时不用重测；
+    所有 DNS 都查不通（比如机器还没联网）时退回到 get_fallback_dns_servers 的固定规则。
+
     参数说明：
-        system_info: 系统信息字典
+        detected_dns_list: 当前系统正在用的 DNS
+        subnet: 所在网段（如 '192.168.1.0/24'），用作缓存键；为 None 时不缓存
     """
-    system_type = system_info['system_type']
-    system_version = system_info['system_version']
-    system_name = system_info['system_name']
-    system_codename = system_info['system_codename']
-    system_family = system_info['system_family']
-    package_manager = system_info['package_manager']
-    mirror_name = choose_repository_mirror(system_family, system_type)
-    
-    if system_family == 'redhat':
-        # RedHat 系列：CentOS、Rocky、Alma 等
-        print('[*] 正在为 RedHat 系列系统更换软件源...')
-        
-        # 第一步：备份原有的软件源配置
-        backup_directory = '/etc/yum.backup'
-        print(f'[*] 创建备份目录: {backup_directory}')
-        os.makedirs(backup_directory, exist_ok=True)
-        
-        # 把原来的配置文件移动到备份目录
-        print('[*] 备份原有软件源配置...')
-        # 使用 bash -c 来执行通配符命令
-        run_system_command(['bash', '-c', f'mv /etc/yum.repos.d/*.repo {backup_directory}/ 2>/dev/null || true'])
-        
-        # 第二步：根据不同的系统下载对应的软件源配置
-        if system_type == 'centos':
-            # CentOS 系统
-            if system_version.startswith('7'):
-                print('[*] 配置 CentOS 7 软件源...')
-                run_system_command(['wget', '-O', '/etc/yum.repos.d/CentOS-Base.repo', 
-                                  'https://mirrors.aliyun.com/repo/Centos-7.repo'])
-                run_system_command(['wget', '-O', '/etc/yum.repos.d/epel.repo', 
-                                  'https://mirrors.aliyun.com/repo/epel-7.repo'])
-            elif system_version.startswith('8'):
-                print('[*] 配置 CentOS 8 软件源...')
-                if 'Stream' in system_name:
-                    run_system_command(['wget', '-O', '/etc/yum.repos.d/CentOS-Base.repo',
-                                      'https://mirrors.aliyun.com/repo/centos-stream/8/CentOS-Stream-BaseOS.repo'])
-                else:
-                    run_system_command(['wget', '-O', '/etc/yum.repos.d/CentOS-Base.repo',
-                                      'https://mirrors.aliyun.com/repo/Centos-8.repo'])
-        
-        elif system_type in ['rocky', 'almalinux']:
-            # Rocky Linux 或 AlmaLinux
-            print(f'[*] 配置 {system_type.title()} 软件源...')
-            # 对于 Rocky/Alma，使用通用的 EL8/EL9 仓库
-            version_major = system_version.split('.')[0]
-            if version_major == '8':
-                run_system_command(['wget', '-O', '/etc/yum.repos.d/Rocky-Base.repo',
-                                  'https://mirrors.aliyun.com/repo/rocky/8/Rocky-BaseOS.repo'])
-            elif version_major == '9':
-                run_system_command(['wget', '-O', '/etc/yum.repos.d/Rocky-Base.repo',
-                                  'https://mirrors.aliyun.com/repo/rocky/9/Rocky-BaseOS.repo'])
-        
-        # 第三步：清理并重建缓存
-        print('[*] 清理软件包缓存...')
-        run_system_command([package_manager, 'clean', 'all'])
-        
-        print('[*] 重建软件包缓存...')
-        run_system_command([package_manager, 'makecache'])
-        
-        print('[OK] RedHat 系列系统软件源更换完成')
-    
-    elif system_family == 'debian':
-        # Debian 系列：Ubuntu、Debian 等
-        print('[*] 正在为 Debian 系列系统更换软件源...')
-        print(f'[*] 已选择镜像：{mirror_name}')
+    detected_dns_list = [server for server in (detected_dns_list or []) if server]
+    servers = list(dict.fromkeys(detected_dns_list + list(candidate_servers)))
+
+    cache_data = _load_dns_benchmark_cache() if use_cache and subnet else {}
+    cached = cache_data.get(subnet) if subnet else None
+    if (isinstance(cached, dict) and cached.get('servers') == servers
+            and time.time() - cached.get('measured_at', 0) < DNS_BENCHMARK_CACHE_SECONDS):
+        ranked = cached.get('ranked', [])
+    else:
+        print(f'[*] 正在测量 {len(servers)} 个 DNS 的响应速度...')
+        results = benchmark_dns_servers(servers)
+        ranked = rank_dns_servers(results)
+        for server in servers:
+            stats = results[server]
+            if stats['median'] is None:
+                print(f'    {server:<16} 查询失败')
+            else:
+                print(f"    {server:<16} 中位 {stats['median'] * 1000:6.1f} ms  p95 {stats['p95'] * 1000:6.1f} ms"
+                      f"  失败率 {stats['failure_rate'] * 100:3.0f}%")
+        if subnet and ranked:
+            cache_data[subnet] = {'servers': servers, 'ranked': ranked, 'measured_at': time.time()}
+            _save_dns_benchmark_cache(cache_data)
+
+    if not ranked:
+        print('[*] 所有 DNS 都测速失败，按默认规则推荐')
+        if any(server in ('8.8.8.8', '8.8.4.4') for server in detected_dns_list):
+            print('[*] 说明：8.8.8.8 在部分网络环境里首次解析可能较慢，默认规则下不作为首选')
+        return get_fallback_dns_servers(detected_dns_list)
+    if len(ranked) == 1:
+        fallback = [server for server in get_fallback_dns_servers(detected_dns_list) if server != ranked[0]]
+        return [ranked[0], fallback[0]]
+    return ranked[:2]
+
+
+def get_fallback_dns_servers(detected_dns_list=None):
+    """
+    测速失败时使用的默认 DNS 列表。
 
-        # 第二步：生成新的软件源配置
-        if system_type == 'ubuntu':
-            # Ubuntu 系统
-            print(f'[*] 配置 Ubuntu {system_version} ({system_codename}) 软件源...')
-            new_sources_content = build_ubuntu_sources_content(system_codename, mirror_name)
-        elif system_type == 'debian':
-            # Debian 系统
-            print(f'[*] 配置 Debian {system_version} ({system_codename}) 软件源...')
-            if not configure_debian_apt_sources(system_version, system_codename, mirror_name):
-                return
-            new_sources_content = None
-        else:
-            print('[!] 当前 Debian 系列系统暂不支持自动配置')
-            return
-        
-        # 第三步：写入新的配置文件
-        if system_type == 'ubuntu':
-            sources_file = '/etc/apt/sources.list'
-            backup_file = backup_file_if_exists(sources_file, '/etc/apt/sources.list.backup')
-            if backup_file:
-                print(f'[*] 备份原有软件源配置到: {backup_file}')
-            write_text_file(sources_file, new_sources_content)
-        
-        # 第四步：更新软件包索引
-        print('[*] 更新软件包索引...')
-        if not run_system_command(['apt', 'update']):
-            print('[!] 软件源文件已经写入，但 apt update 失败，请检查源配置或网络连通性')
+    规则：
+    1. 优先沿用当前检测到的 DNS
+    2. 但不把 8.8.8.8 / 8.8.4.4 当默认首选，避免在部分国内网络里首次解析过慢
+    3. 如果没有合适的当前 DNS，就回退到更通用的公共 DNS
+    """
+    if detected_dns_list is None:
+        detected_dns_list = []
+
+    preferred_dns = []
+    deprioritized_dns = {'8.8.8.8', '8.8.4.4'}
+    fallback_dns = ['223.5.5.5', '114.114.114.114']
+
+    for dns_server in detected_dns_list:
+        if dns_server and dns_server not in preferred_dns and dns_server not in deprioritized_dns:
+            preferred_dns.append(dns_server)
+
+    for dns_server in fallback_dns:
+        if dns_server not in preferred_dns:
+            preferred_dns.append(dns_server)
+
+    for dns_server in detected_dns_list:
+        if dns_server and dns_server not in preferred_dns:
+            preferred_dns.append(dns_server)
+
+    if len(preferred_dns) == 1:
+        preferred_dns.append(fallback_dns[1] if preferred_dns[0] != fallback_dns[1] else fallback_dns[0])
+
+    return preferred_dns[:2]
+
+
+def is_vmware_virtual_machine(system_info=None):
+    """
+    Best-effort check for VMware guests.
+
+    Uses the gathered host facts when available instead of probing again.
+    """
+    if system_info is not None and 'is_vmware' in system_info:
+        return system_info['is_vmware']
+    return probe_virtualization_facts(HOST_FACT_PROBE_TIMEOUT)['is_vmware']
+
+
+# --------------------------------------------
+# 第三部分（续）：网络探测
+# 直接收发 ARP、ICMP 和 DNS 报文，不依赖 arping、ping、dig 等外部命令
+# --------------------------------------------
+
+# 应用静态 IP 前的检查总耗时上限（秒），所有检查并发进行
+NETWORK_PRECHECK_TIMEOUT = 0.8
+# 检查 DNS 时解析的域名
+DNS_PROBE_NAME = 'www.baidu.com'
+
+ETH_P_ARP = 0x0806
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+
+
+def get_interface_mac(interface_name):
+    """
+    读取网卡 MAC 地址，返回 6 字节，读取失败返回 None。
+    """
+    try:
+        with open(f'/sys/class/net/{interface_name}/address', 'r', encoding='utf-8') as file:
+            return bytes.fromhex(file.read().strip().replace(':', ''))
+    except (OSError, ValueError):
+        return None
+
+
+def get_interface_ipv4(interface_name):
+    """
+    读取网卡当前的 IPv4 地址，没有地址时返回 None。
+    """
+    import fcntl
+    import socket
+    import struct
+
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            request = struct.pack('256s', interface_name.encode('utf-8')[:15])
+            return socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)[20:24])
+    except OSError:
+        return None
+
+
+def get_interface_network(interface_name):
+    """
+    返回网卡当前所在的网段（如 '192.168.1.0/24'），没有地址时返回 None。
+    """
+    import fcntl
+    import socket
+    import struct
+    from ipaddress import ip_network
+
+    ip_text = get_interface_ipv4(interface_name)
+    if ip_text is None:
+        return None
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            request = struct.pack('256s', interface_name.encode('utf-8')[:15])
+            netmask = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFNETMASK, request)[20:24])
+    except OSError:
+        return None
+    return str(ip_network(f'{ip_text}/{netmask}', strict=False))
+
+
+def probe_arp_addresses(interface_name, target_ips, sender_ip='0.0.0.0', timeout=0.5):
+    """
+    在网卡上广播 ARP 请求，返回 {IP: 对方 MAC} 记录谁应答了。
+
+    发送方 IP 用 0.0.0.0 时就是 RFC 5227 的地址冲突探测，不会污染其他主机的 ARP 缓存。
+    需要 root 权限（AF_PACKET 原始套接字），没有权限时抛 OSError。
+    """
+    import select
+    import socket
+    import struct
+
+    own_mac = get_interface_mac(interface_name)
+    if own_mac is None:
+        raise OSError(f'无法读取网卡 {interface_name} 的 MAC 地址')
+
+    answered = {}
+    deadline = time.monotonic() + timeout
+    with socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP)) as sock:
+        sock.bind((interface_name, ETH_P_ARP))
+        for target_ip in target_ips:
+            frame = (
+                b'\xff' * 6 + own_mac + struct.pack('!H', ETH_P_ARP)
+                + struct.pack('!HHBBH', 1, 0x0800, 6, 4, 1)
+                + own_mac + socket.inet_aton(sender_ip)
+                + b'\x00' * 6 + socket.inet_aton(target_ip)
+            )
+            sock.send(frame)
+
+        wanted = {socket.inet_aton(target_ip): target_ip for target_ip in target_ips}
+        while len(answered) < len(wanted):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                break
+            frame = sock.recv(128)
+            if len(frame) < 42:
+                continue
+            sender_mac, sender_address = frame[22:28], frame[28:32]
+            # 应答和别人的探测/宣告都算：只要有别的机器声称自己是这个 IP
+            if sender_address in wanted and sender_mac != own_mac:
+                answered[wanted[sender_address]] = ':'.join(f'{byte:02x}' for byte in sender_mac)
+    return answered
+
+
+def _icmp_checksum(data):
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(int.from_bytes(data[index:index + 2], 'big') for index in range(0, len(data), 2))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def probe_icmp_echo(address, timeout=0.5):
+    """
+    发一个 ICMP Echo（相当于 ping -c 1），收到应答返回 True。
+
+    优先用不需要 root 的 ICMP 数据报套接字，不允许时再用原始套接字。
+    """
+    import select
+    import socket
+    import struct
+
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        has_ip_header = False
+    except OSError:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        has_ip_header = True
+
+    identifier = os.getpid() & 0xffff
+    sequence = int.from_bytes(os.urandom(2), 'big')
+    payload = b'ops_toolbox'
+    header = struct.pack('!BBHHH', 8, 0, 0, identifier, sequence)
+    packet = struct.pack('!BBHHH', 8, 0, _icmp_checksum(header + payload), identifier, sequence) + payload
+    deadline = time.monotonic() + timeout
+    with sock:
+        sock.sendto(packet, (address, 0))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                return False
+            reply, (reply_address, _) = sock.recvfrom(1024)
+            if has_ip_header:
+                reply = reply[(reply[0] & 0x0f) * 4:]
+                # 原始套接字会收到本机所有的 ICMP 应答（包括监控或别人在跑的 ping），要核对标识符
+                if reply[4:6] != struct.pack('!H', identifier):
+                    continue
+            # 数据报套接字的标识符由内核改写并过滤，序号在两种套接字里都保持不变
+            if reply_address == address and reply[:1] == b'\x00' and reply[6:8] == struct.pack('!H', sequence):
+                return True
+
+
+def build_dns_query(name, query_id):
+    """
+    构造一个查询 A 记录的 DNS 请求报文。
+    """
+    import struct
+
+    question = b''.join(
+        bytes([len(label)]) + label for label in name.encode('idna').split(b'.') if label
+    ) + b'\x00'
+    return struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + question + struct.pack('!HH', 1, 1)
+
+
+def query_dns_server(server, name=DNS_PROBE_NAME, timeout=0.5):
+    """
+    向 DNS 服务器发一次 UDP 查询。
+
+    返回值：
+        (耗时秒数, 响应码)；响应码 0 表示正常，3 表示域名不存在，其他表示服务器出错
+        超时或网络不通时抛 OSError（超时是 TimeoutError）
+    """
+    import socket
+    import struct
+
+    query_id = int.from_bytes(os.urandom(2), 'big')
+    request = build_dns_query(name, query_id)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        started = time.perf_counter()
+        sock.sendto(request, (server, 53) if isinstance(server, str) else server)
+        deadline = started + timeout
+        while True:
+            sock.settimeout(max(deadline - time.perf_counter(), 0.001))
+            try:
+                response = sock.recv(4096)
+            except socket.timeout:
+                raise TimeoutError(f'DNS 服务器 {server} 无响应')
+            if len(response) < 12:
+                continue
+            response_id, flags = struct.unpack('!HH', response[:4])
+            if response_id == query_id and flags & 0x8000:
+                return time.perf_counter() - started, flags & 0x000f
+
+
+def run_network_prechecks(network_config, timeout=None):
+    """
+    应用静态 IP 之前并发检查：目标 IP 是否已被占用、网关是否在线、DNS 是否能解析。
+
+    返回值：
+        {'ip_checked': 是否完成了冲突探测, 'ip_conflict': 冲突设备的 MAC 或 None,
+         'gateway_reachable': True/False/None, 'dns': {DNS 服务器: 耗时秒数或 None}, 'errors': [说明]}
+        无法检查的项目为 None，并在 errors 里说明原因
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    timeout = NETWORK_PRECHECK_TIMEOUT if timeout is None else timeout
+    interface_name = network_config['interface']
+    target_ip = network_config['ip']
+    gateway_ip = network_config['gateway']
+    current_ip = get_interface_ipv4(interface_name)
+    # 目标 IP 就是网卡当前地址时，冲突探测没有意义（自己不会应答自己）
+    check_conflict = target_ip != current_ip
+    probe_timeout = max(timeout - 0.1, 0.1)
+
+    def arp_probe():
+        from ipaddress import ip_address, ip_network
+
+        target_subnet = ip_network(f"{target_ip}/{network_config['cidr']}", strict=False)
+        sender_ip = current_ip if current_ip and ip_address(current_ip) in target_subnet else '0.0.0.0'
+        probe_ips = [gateway_ip] + ([target_ip] if check_conflict else [])
+        return probe_arp_addresses(interface_name, probe_ips, sender_ip, probe_timeout)
+
+    result = {'ip_checked': False, 'ip_conflict': None, 'gateway_reachable': None, 'dns': {}, 'errors': []}
+    dns_servers = list(dict.fromkeys(network_config['dns_servers']))
+    # 不用 with：退出 with 时会等所有探测结束，总超时就失效了
+    pool = ThreadPoolExecutor(max_workers=2 + len(dns_servers))
+    arp_future = pool.submit(arp_probe)
+    icmp_future = pool.submit(probe_icmp_echo, gateway_ip, probe_timeout)
+    dns_futures = {server: pool.submit(query_dns_server, server, DNS_PROBE_NAME, probe_timeout)
+                   for server in dns_servers}
+    wait([arp_future, icmp_future] + list(dns_futures.values()), timeout=timeout)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    def finished_cleanly(future):
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    arp_answers = {}
+    if not arp_future.done():
+        result['errors'].append(f'ARP 探测 {timeout:g} 秒内没有完成，IP 冲突和网关状态无法确认')
+    elif arp_future.cancelled() or arp_future.exception() is not None:
+        result['errors'].append(f'ARP 探测不可用：{arp_future.exception() if not arp_future.cancelled() else "已取消"}')
+    else:
+        arp_answers = arp_future.result()
+        if check_conflict:
+            result['ip_checked'] = True
+            result['ip_conflict'] = arp_answers.get(target_ip)
+
+    icmp_reachable = False
+    if not icmp_future.done():
+        result['errors'].append(f'ping 网关 {timeout:g} 秒内没有完成，结果不确定')
+    elif icmp_future.cancelled() or icmp_future.exception() is not None:
+        result['errors'].append(f'ICMP 探测不可用：{icmp_future.exception() if not icmp_future.cancelled() else "已取消"}')
+    else:
+        icmp_reachable = icmp_future.result()
+
+    if gateway_ip in arp_answers or icmp_reachable:
+        result['gateway_reachable'] = True
+    elif finished_cleanly(arp_future) or finished_cleanly(icmp_future):
+        result['gateway_reachable'] = False
+
+    for server, future in dns_futures.items():
+        if not future.done():
+            # 超时还没结束的探测不算失败，只说明结果不确定
+            result['errors'].append(f'DNS {server} 探测 {timeout:g} 秒内没有完成，结果不确定')
+            continue
+        try:
+            latency, response_code = future.result()
+            result['dns'][server] = latency if response_code in (0, 3) else None
+        except Exception:
+            result['dns'][server] = None
+    return result
+
+
+def confirm_network_prechecks(network_config):
+    """
+    执行应用前检查并打印结论；发现 IP 冲突直接取消，其他问题让用户确认。
+    """
+    print(f'\n[*] 正在检查网络（约 {NETWORK_PRECHECK_TIMEOUT:g} 秒）...')
+    started = time.perf_counter()
+    result = run_network_prechecks(network_config)
+    elapsed = time.perf_counter() - started
+
+    for message in result['errors']:
+        print(f'[!] {message}')
+
+    if result['ip_conflict']:
+        print(f"[!] 错误：IP {network_config['ip']} 已被设备 {result['ip_conflict']} 使用，应用后会地址冲突")
+        print('[*] 已取消配置，请换一个空闲的 IP')
+        return False
+    if result['ip_checked']:
+        print(f"[OK] IP {network_config['ip']} 未被占用")
+    elif network_config['ip'] != get_interface_ipv4(network_config['interface']):
+        print('[!] 未能确认目标 IP 是否空闲')
+
+    problems = []
+    if result['gateway_reachable']:
+        print(f"[OK] 网关 {network_config['gateway']} 在线")
+    elif result['gateway_reachable'] is False:
+        print(f"[!] 网关 {network_config['gateway']} 没有应答 ARP 和 ping")
+        problems.append('网关无应答')
+
+    for server, latency in result['dns'].items():
+        if latency is None:
+            print(f'[!] DNS {server} 查询失败')
+        else:
+            print(f'[OK] DNS {server} 响应 {latency * 1000:.0f} ms')
+    if result['dns'] and all(latency is None for latency in result['dns'].values()):
+        problems.append('DNS 全部查询失败')
+
+    print(f'[*] 检查耗时 {elapsed * 1000:.0f} ms')
+    if problems:
+        print(f"[!] 发现问题：{'、'.join(problems)}，应用后可能会断网（包括当前 SSH 连接）")
+        if not confirm_with_menu('仍然继续应用这个配置吗？', default=False):
+            print('[*] 已取消配置')
+            return False
+    return True
+
+
+# --------------------------------------------
+# 第四部分：网络配置功能
+# 配置静态 IP，并做基础校验和应用
+# --------------------------------------------
+
+def choose_static_ip_interface(system_info):
+    """
+    让用户选择要配置静态 IP 的网卡。
+    """
+    interface_list = list(system_info.get('interfaces') or get_network_interface_list())
+    if not interface_list:
+        print('[!] 没有找到可用的网络接口')
+        return None
+
+    interface_options = [(f'网卡 {name}', name) for name in interface_list]
+    chosen_interface = select_menu_option('请选择要配置的网卡', interface_options, '上/下选择网卡，回车确认')
+    if chosen_interface is None:
+        print('[*] 已取消选择网卡')
+    return chosen_interface
+
+
+def show_detected_network_defaults(detected_gateway, detected_dns_list, default_dns_list):
+    """
+    显示当前检测到的网关和 DNS 参考值。
+    """
+    if detected_gateway:
+        print(f'[*] 当前检测到的网关：{detected_gateway}')
+
+    if detected_dns_list:
+        print(f'[*] 当前检测到的 DNS：{", ".join(detected_dns_list)}')
+        print(f'[*] 推荐 DNS：{", ".join(default_dns_list)}')
+    else:
+        print(f'[*] 未检测到现有 DNS，默认推荐使用：{", ".join(default_dns_list)}')
+
+
+def collect_static_ip_config(system_info, interface_name):
+    """
+    采集静态 IP 所需的参数。
+    """
+    from ipaddress import ip_address, ip_network
+
+    current_network_defaults = system_info.get('network_defaults', {}).get(interface_name)
+    if current_network_defaults is None:
+        current_network_defaults = get_current_network_defaults(interface_name, timeout=HOST_FACT_PROBE_TIMEOUT)
+    detected_gateway = current_network_defaults['gateway']
+    detected_dns_list = list(current_network_defaults['dns_servers'])
+    recommended_dns_list = get_recommended_dns_servers(detected_dns_list, get_interface_network(interface_name))
+
+    show_detected_network_defaults(detected_gateway, detected_dns_list, recommended_dns_list)
+
+    default_dns1, default_dns2 = recommended_dns_list
+
+    print('\n[*] 请输入网络参数')
+    try:
+        user_ip = input('  IP地址（例如 192.168.1.100）：').strip()
+        ip_address(user_ip)
+
+        user_netmask = input('  子网掩码（默认 255.255.255.0）：').strip()
+        if not user_netmask:
+            user_netmask = '255.255.255.0'
+        else:
+            ip_address(user_netmask)
+
+        if detected_gateway:
+            user_gateway = input(f'  网关（直接回车沿用 {detected_gateway}）：').strip()
+            if not user_gateway:
+                user_gateway = detected_gateway
+        else:
+            user_gateway = input('  网关（例如 192.168.1.1）：').strip()
+        ip_address(user_gateway)
+
+        user_dns1 = input(f'  首选 DNS（直接回车沿用 {default_dns1}）：').strip()
+        if not user_dns1:
+            user_dns1 = default_dns1
+        else:
+            ip_address(user_dns1)
+
+        user_dns2 = input(f'  备用 DNS（直接回车沿用 {default_dns2}）：').strip()
+        if not user_dns2:
+            user_dns2 = default_dns2
+        else:
+            ip_address(user_dns2)
+
+    except ValueError:
+        print('[!] 错误：IP 地址格式不正确')
+        return None
+
+    netmask_cidr = ip_network(f'0.0.0.0/{user_netmask}', strict=False).prefixlen
+    return {
+        'interface': interface_name,
+        'ip': user_ip,
+        'netmask': user_netmask,
+        'cidr': netmask_cidr,
+        'gateway': user_gateway,
+        'dns_servers': [user_dns1, user_dns2],
+        'detected_gateway': detected_gateway,
+        'detected_dns_list': detected_dns_list,
+    }
+
+
+def validate_static_ip_config(network_config):
+    """
+    校验静态 IP 参数是否合法。
+    """
+    from ipaddress import ip_address, ip_network
+
+    target_subnet = ip_network(f"{network_config['ip']}/{network_config['cidr']}", strict=False)
+    gateway_ip = ip_address(network_config['gateway'])
+
+    if gateway_ip not in target_subnet:
+        print(f"[!] 错误：网关 {network_config['gateway']} 不在网段 {target_subnet} 内")
+        print('[!] 这种情况通常会导致内网能通、外网不通')
+        return False
+
+    if network_config['gateway'] == network_config['ip']:
+        print('[!] 错误：网关不能和本机 IP 相同')
+        return False
+
+    return True
+
+
+def confirm_static_ip_warnings(system_info, network_config):
+    """
+    对明显可疑的网络参数做二次提醒。
+    """
+    detected_gateway = network_config['detected_gateway']
+    user_gateway = network_config['gateway']
+
+    if detected_gateway and user_gateway != detected_gateway:
+        print(f'[!] 提醒：当前检测到的网关是 {detected_gateway}，你输入的是 {user_gateway}')
+
+    if is_vmware_virtual_machine(system_info) and user_gateway.endswith('.1'):
+        print('[!] 提醒：VMware NAT 网络里，*.1 往往是宿主机地址，真正网关常见是 *.2')
+        if detected_gateway and detected_gateway != user_gateway:
+            print(f'[!] 当前检测到的网关参考值：{detected_gateway}')
+        if not confirm_with_menu('仍然继续使用这个网关吗？', default=False):
+            print('[*] 已取消配置，请重新执行并填写正确网关')
+            return False
+
+    return True
+
+
+def show_static_ip_summary(network_config):
+    """
+    打印将要应用的静态 IP 配置。
+    """
+    print('\n即将应用的网络配置：')
+    print('=' * 50)
+    print(f"网卡：{network_config['interface']}")
+    print(f"IP地址：{network_config['ip']}")
+    print(f"子网掩码：{network_config['netmask']}")
+    print(f"网关：{network_config['gateway']}")
+    print(f"DNS1：{network_config['dns_servers'][0]}")
+    print(f"DNS2：{network_config['dns_servers'][1]}")
+    print('=' * 50)
+
+
+def apply_redhat_static_ip_config(system_info, network_config):
+    """
+    在 RedHat 系列系统上应用静态 IP 配置。
+    """
+    print('\n[*] 正在为 RedHat 系列系统配置网络...')
+
+    try:
+        version_number = int(system_info['system_version'].split('.')[0])
+    except Exception:
+        version_number = 8
+
+    if version_number >= 8 or system_info['system_type'] in ['rocky', 'almalinux']:
+        print('[*] 使用 nmcli 配置网络')
+        connection_name = get_active_connection_name(network_config['interface'])
+        print(f'[*] 识别到的连接名：{connection_name}')
+
+        command_steps = [
+            (f"[*] 正在把 {network_config['interface']} 设置为静态 IP 模式...", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.method', 'manual']),
+            (f"[*] 正在设置 IP 地址：{network_config['ip']}/{network_config['cidr']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.addresses', f"{network_config['ip']}/{network_config['cidr']}"]),
+            (f"[*] 正在设置网关：{network_config['gateway']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.gateway', network_config['gateway']]),
+            (f"[*] 正在设置 DNS：{', '.join(network_config['dns_servers'])}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.dns', ' '.join(network_config['dns_servers'])]),
+            ('[*] 正在设置开机自启...', ['nmcli', 'connection', 'modify', connection_name, 'connection.autoconnect', 'yes']),
+            ('[*] 正在重新加载连接...', ['nmcli', 'connection', 'reload']),
+        ]
+
+        for message, command in command_steps:
+            print(message)
+            if not run_system_command(command):
+                print('[!] 网络配置应用失败，请检查上面的错误信息')
+                return False
+
+        print('[*] 正在激活连接...')
+        if run_system_command(['nmcli', 'connection', 'up', connection_name], timeout=90):
+            print('[*] 网络配置已应用')
+            print('[!] 如果你是通过 SSH 连接，网络重启时连接可能会短暂中断')
+            return True
+
+        print('[!] 激活网络连接失败')
+        return False
+
+    print('[*] 使用传统 network-scripts 方式配置')
+    config_text = f"""TYPE=Ethernet
+BOOTPROTO=static
+NAME={network_config['interface']}
+DEVICE={network_config['interface']}
+ONBOOT=yes
+IPADDR={network_config['ip']}
+NETMASK={network_config['netmask']}
+GATEWAY={network_config['gateway']}
+DNS1={network_config['dns_servers'][0]}
+DNS2={network_config['dns_servers'][1]}
+"""
+
+    print('\n生成的配置如下：')
+    print('=' * 50)
+    print(config_text)
+    print('=' * 50)
+
+    if not confirm_with_menu('是否写入配置文件？'):
+        print('[*] 已取消配置')
+        return False
+
+    config_file_path = f"/etc/sysconfig/network-scripts/ifcfg-{network_config['interface']}"
+    write_text_file(config_file_path, config_text)
+
+    print('[*] 正在重启网络服务...')
+    if run_system_command(['systemctl', 'restart', 'network'], timeout=120):
+        print('[*] 网络配置已应用')
+        return True
+
+    print('[!] 重启网络服务失败')
+    return False
+
+
+def apply_debian_static_ip_via_netplan(network_config):
+    """
+    用 netplan 配置 Debian/Ubuntu 静态 IP。
+    """
+    config_text = f"""network:
+  version: 2
+  renderer: networkd
+  ethernets:
+    {network_config['interface']}:
+      dhcp4: no
+      addresses: [{network_config['ip']}/{network_config['cidr']}]
+      routes:
+        - to: default
+          via: {network_config['gateway']}
+      nameservers:
+        addresses: [{network_config['dns_servers'][0]}, {network_config['dns_servers'][1]}]
+"""
+
+    print('\n生成的 netplan 配置如下：')
+    print('=' * 50)
+    print(config_text)
+    print('=' * 50)
+
+    if not confirm_with_menu('是否写入配置文件？'):
+        print('[*] 已取消配置')
+        return False
+
+    config_file_path = f"/etc/netplan/01-{network_config['interface']}.yaml"
+    write_text_file(config_file_path, config_text)
+
+    print('[*] 正在应用网络配置...')
+    if run_system_command(['netplan', 'apply'], timeout=120):
+        print('[*] 网络配置已应用')
+        return True
+
+    print('[!] 应用网络配置失败')
+    return False
+
+
+def apply_debian_static_ip_via_interfaces(network_config):
+    """
+    用 ifupdown 的 interfaces.d 配置 Debian 静态 IP。
+    """
+    config_text = f"""auto {network_config['interface']}
+iface {network_config['interface']} inet static
+    address {network_config['ip']}/{network_config['cidr']}
+    gateway {network_config['gateway']}
+    dns-nameservers {network_config['dns_servers'][0]} {network_config['dns_servers'][1]}
+"""
+
+    print('\n生成的 interfaces 配置如下：')
+    print('=' * 50)
+    print(config_text)
+    print('=' * 50)
+
+    if not confirm_with_menu('是否写入配置文件？'):
+        print('[*] 已取消配置')
+        return False
+
+    interfaces_dir = '/etc/network/interfaces.d'
+    make_directory(interfaces_dir)
+    config_file_path = f'{interfaces_dir}/{network_config["interface"]}'
+    write_text_file(config_file_path, config_text)
+
+    print('[*] 正在重启 networking 服务...')
+    if run_system_command(['systemctl', 'restart', 'networking'], timeout=120):
+        print('[*] 网络配置已应用')
+        return True
+
+    print('[!] networking 服务重启失败，请确认系统正在使用 ifupdown')
+    return False
+
+
+def apply_debian_static_ip_via_nmcli(network_config):
+    """
+    用 NetworkManager 配置 Debian 静态 IP。
+    """
+    connection_name = get_active_connection_name(network_config['interface'])
+    print(f'[*] 识别到的连接名：{connection_name}')
+
+    command_steps = [
+        (f"[*] 正在把 {network_config['interface']} 设置为静态 IP 模式...", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.method', 'manual']),
+        (f"[*] 正在设置 IP 地址：{network_config['ip']}/{network_config['cidr']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.addresses', f"{network_config['ip']}/{network_config['cidr']}"]),
+        (f"[*] 正在设置网关：{network_config['gateway']}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.gateway', network_config['gateway']]),
+        (f"[*] 正在设置 DNS：{', '.join(network_config['dns_servers'])}", ['nmcli', 'connection', 'modify', connection_name, 'ipv4.dns', ' '.join(network_config['dns_servers'])]),
+        ('[*] 正在设置开机自启...', ['nmcli', 'connection', 'modify', connection_name, 'connection.autoconnect', 'yes']),
+        ('[*] 正在重新加载连接...', ['nmcli', 'connection', 'reload']),
+    ]
+
+    for message, command in command_steps:
+        print(message)
+        if not run_system_command(command):
+            print('[!] 网络配置应用失败，请检查上面的错误信息')
+            return False
+
+    print('[*] 正在激活连接...')
+    if run_system_command(['nmcli', 'connection', 'up', connection_name], timeout=90):
+        print('[*] 网络配置已应用')
+        return True
+
+    print('[!] 激活网络连接失败')
+    return False
+
+
+def apply_debian_static_ip_config(network_config):
+    """
+    在 Debian 系列系统上应用静态 IP 配置。
+    """
+    print('\n[*] 正在为 Debian 系列系统配置网络...')
+
+    if check_command_exists('netplan') or os.path.isdir('/etc/netplan'):
+        print('[*] 检测到 netplan，使用 netplan 方式配置')
+        return apply_debian_static_ip_via_netplan(network_config)
+
+    if check_command_exists('nmcli'):
+        print('[*] 检测到 NetworkManager，使用 nmcli 方式配置')
+        return apply_debian_static_ip_via_nmcli(network_config)
+
+    print('[*] 未检测到 netplan 或 NetworkManager，回退到 interfaces.d 方式配置')
+    return apply_debian_static_ip_via_interfaces(network_config)
+
+
+def apply_static_ip_config(system_info, network_config):
+    """
+    按系统类型分发静态 IP 配置。
+    """
+    show_static_ip_summary(network_config)
+    if not confirm_with_menu('是否应用配置？'):
+        print('[*] 已取消配置')
+        return
+
+    system_family = system_info['system_family']
+    if system_family == 'redhat':
+        apply_function = lambda: apply_redhat_static_ip_config(system_info, network_config)
+    elif system_family == 'debian':
+        apply_function = lambda: apply_debian_static_ip_config(network_config)
+    else:
+        print('[!] 当前系统暂不支持自动配置静态 IP')
+        return
+
+    # 只用真正会写进系统的参数计算指纹，检测到的参考值不算在内
+    step_inputs = {
+        'system_type': system_info['system_type'],
+        'system_version': system_info['system_version'],
+        'interface': network_config['interface'],
+        'ip': network_config['ip'],
+        'cidr': network_config['cidr'],
+        'gateway': network_config['gateway'],
+        'dns_servers': network_config['dns_servers'],
+    }
+    candidate_files = [
+        f"/etc/netplan/01-{network_config['interface']}.yaml",
+        f"/etc/sysconfig/network-scripts/ifcfg-{network_config['interface']}",
+        f"/etc/network/interfaces.d/{network_config['interface']}",
+    ]
+    run_journaled_step(
+        'static_ip',
+        step_inputs,
+        lambda: [path for path in candidate_files if os.path.exists(path)],
+        apply_function
+    )
+
+
+@traced_action
+def config_static_ip(system_info):
+    """
+    配置静态 IP 地址。
+    """
+    chosen_interface = choose_static_ip_interface(system_info)
+    if chosen_interface is None:
+        return
+
+    network_config = collect_static_ip_config(system_info, chosen_interface)
+    if network_config is None:
+        return
+
+    if not validate_static_ip_config(network_config):
+        return
+
+    if not confirm_static_ip_warnings(system_info, network_config):
+        return
+
+    if not confirm_network_prechecks(network_config):
+        return
+
+    apply_static_ip_config(system_info, network_config)
+
+
+# --------------------------------------------
+# 第五部分：安全设置功能
+# 关闭防火墙和 SELinux（生产环境请谨慎使用）
+# --------------------------------------------
+
+@traced_action
+def disable_firewall_and_selinux(system_info):
+    """
+    关闭防火墙和 SELinux
+    
+    注意：这个操作会降低系统安全性！
+    通常只在开发测试环境使用，生产环境请谨慎操作
+    
+    参数说明：
+        system_info: 系统信息字典
+    """
+    system_family = system_info['system_family']
+    
+    if system_family == 'redhat':
+        # RedHat 系列：关闭 firewalld 和 SELinux
+        print('[*] 正在关闭 RedHat 系统的防火墙和 SELinux...')
+        
+        # 关闭 firewalld
+        print('[*] 停止 firewalld 服务...')
+        run_system_command(['systemctl', 'stop', 'firewalld'])
+        
+        print('[*] 禁用 firewalld 开机自启...')
+        run_system_command(['systemctl', 'disable', 'firewalld'])
+        
+        # 临时关闭 SELinux
+        print('[*] 临时关闭 SELinux...')
+        run_system_command(['setenforce', '0'])
+        
+        # 永久关闭 SELinux（修改配置文件）
+        print('[*] 永久禁用 SELinux...')
+        run_system_command(['sed', '-i', 's/^SELINUX=enforcing/SELINUX=disabled/', '/etc/selinux/config'])
+        
+        print('[OK] firewalld 和 SELinux 已禁用')
+        print('[!] 注意：SELinux 永久禁用需要重启系统才能生效')
+    
+    elif system_family == 'debian':
+        # Debian 系列：关闭 ufw
+        print('[*] 正在关闭 Debian 系统的防火墙...')
+
+        if check_command_exists('ufw'):
+            print('[*] 禁用 ufw 防火墙...')
+            run_system_command(['ufw', 'disable'])
+            print('[OK] ufw 防火墙已禁用')
+        elif check_command_exists('systemctl') and get_existing_systemd_service(['firewalld']):
+            print('[*] 检测到 firewalld，正在停止并禁用...')
+            run_system_command(['systemctl', 'stop', 'firewalld'])
+            run_system_command(['systemctl', 'disable', 'firewalld'])
+            print('[OK] firewalld 已禁用')
+        else:
+            print('[*] 当前系统没有检测到受支持的防火墙管理工具，跳过自动处理')
+    else:
+        print('[!] 当前系统不支持自动关闭防火墙')
+
+
+# --------------------------------------------
+# 第五部分：软件源配置功能
+# 更换国内镜像源，加快软件下载速度
+# --------------------------------------------
+
+def backup_file_if_exists(file_path, backup_path=None):
+    """
+    如果文件存在，就先备份一份。
+    """
+    executor = get_command_executor()
+    if not os.path.exists(executor.resolve_path(file_path)):
+        return None
+
+    if backup_path is None:
+        backup_path = f'{file_path}.backup'
+
+    shutil.copy2(executor.resolve_path(file_path), executor.resolve_path(backup_path))
+    return backup_path
+
+
+def choose_repository_mirror(system_family, system_type):
+    """
+    选择要使用的软件源镜像。
+    """
+    if system_family != 'debian':
+        return 'aliyun'
+
+    title = '请选择软件源镜像'
+    subtitle = '官方源更通用，尤其适合海外服务器'
+
+    options = [('官方源（推荐）', 'official')]
+    options.extend([
+        ('阿里云', 'aliyun'),
+        ('清华', 'tsinghua'),
+        ('腾讯', 'tencent'),
+    ])
+
+    selected_mirror = select_menu_option(title, options, subtitle)
+    return selected_mirror or 'official'
+
+
+def write_text_file(file_path, content):
+    """
+    用 UTF-8 写文本文件。
+    """
+    with open(get_command_executor().resolve_path(file_path), 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def make_directory(directory_path):
+    """
+    创建目录（已存在时不报错）。
+    """
+    os.makedirs(get_command_executor().resolve_path(directory_path), exist_ok=True)
+
+
+def normalize_debian_codename(system_version, system_codename):
+    """
+    尽量拿到 Debian 的发行代号。
+    """
+    if system_codename and system_codename not in ['unknown', 'n/a', 'N/A']:
+        return system_codename.strip().lower()
+
+    codename_map = {
+        '10': 'buster',
+        '11': 'bullseye',
+        '12': 'bookworm',
+        '13': 'trixie',
+    }
+    version_major = str(system_version).split('.')[0]
+    return codename_map.get(version_major, '')
+
+
+def get_debian_mirror_endpoints(mirror_name):
+    """
+    返回 Debian 不同镜像对应的主仓库和安全仓库地址。
+    """
+    mirror_map = {
+        'official': ('http://deb.debian.org/debian', 'http://security.debian.org/debian-security'),
+        'aliyun': ('http://mirrors.aliyun.com/debian', 'http://mirrors.aliyun.com/debian-security'),
+        'tsinghua': ('https://mirrors.tuna.tsinghua.edu.cn/debian', 'https://mirrors.tuna.tsinghua.edu.cn/debian-security'),
+        'tencent': ('https://mirrors.cloud.tencent.com/debian', 'https://mirrors.cloud.tencent.com/debian-security'),
+    }
+    return mirror_map.get(mirror_name, mirror_map['official'])
+
+
+def get_ubuntu_mirror_endpoints(mirror_name):
+    """
+    返回 Ubuntu 不同镜像对应的主仓库和安全仓库地址。
+    """
+    mirror_map = {
+        'official': ('http://archive.ubuntu.com/ubuntu', 'http://security.ubuntu.com/ubuntu'),
+        'aliyun': ('http://mirrors.aliyun.com/ubuntu', 'http://mirrors.aliyun.com/ubuntu'),
+        'tsinghua': ('https://mirrors.tuna.tsinghua.edu.cn/ubuntu', 'https://mirrors.tuna.tsinghua.edu.cn/ubuntu'),
+        'tencent': ('https://mirrors.cloud.tencent.com/ubuntu', 'https://mirrors.cloud.tencent.com/ubuntu'),
+    }
+    return mirror_map.get(mirror_name, mirror_map['official'])
+
+
+def build_ubuntu_sources_content(system_codename, mirror_name):
+    """
+    生成 Ubuntu 软件源配置内容。
+    """
+    archive_url, security_url = get_ubuntu_mirror_endpoints(mirror_name)
+    return f"""# Ubuntu 软件源
+deb {archive_url} {system_codename} main restricted universe multiverse
+deb {security_url} {system_codename}-security main restricted universe multiverse
+deb {archive_url} {system_codename}-updates main restricted universe multiverse
+deb {archive_url} {system_codename}-backports main restricted universe multiverse
+
+# 源码仓库（可选）
+# deb-src {archive_url} {system_codename} main restricted universe multiverse
+"""
+
+
+def build_debian_sources_content(system_version, system_codename, use_deb822, mirror_name):
+    """
+    生成 Debian 软件源配置内容。
+    """
+    debian_codename = normalize_debian_codename(system_version, system_codename)
+    if not debian_codename:
+        return None
+
+    version_major = str(system_version).split('.')[0]
+    components = ['main', 'contrib', 'non-free']
+    if version_major.isdigit() and int(version_major) >= 12:
+        components.append('non-free-firmware')
+    components_text = ' '.join(components)
+    archive_url, security_url = get_debian_mirror_endpoints(mirror_name)
+
+    if use_deb822:
+        keyring_file = '/usr/share/keyrings/debian-archive-keyring.gpg'
+        common_fields = []
+        if mirror_name == 'official' and os.path.exists(keyring_file):
+            common_fields.append(f'Signed-By: {keyring_file}')
+
+        main_stanza = [
+            'Types: deb',
+            f'URIs: {archive_url}',
+            f'Suites: {debian_codename} {debian_codename}-updates',
+            f'Components: {components_text}',
+        ] + common_fields
+
+        security_stanza = [
+            'Types: deb',
+            f'URIs: {security_url}',
+            f'Suites: {debian_codename}-security',
+            f'Components: {components_text}',
+        ] + common_fields
+
+        return '\n'.join(main_stanza) + '\n\n' + '\n'.join(security_stanza) + '\n'
+
+    return f"""# Debian 软件源
+deb {archive_url} {debian_codename} {components_text}
+deb {archive_url} {debian_codename}-updates {components_text}
+deb {security_url} {debian_codename}-security {components_text}
+"""
+
+
+def configure_debian_apt_sources(system_version, system_codename, mirror_name):
+    """
+    配置 Debian 的 APT 软件源，兼容传统 sources.list 和 Debian 12+ 的 deb822 格式。
+    """
+    sources_file = '/etc/apt/sources.list'
+    deb822_file = '/etc/apt/sources.list.d/debian.sources'
+    use_deb822 = os.path.exists(deb822_file)
+
+    if str(system_version).split('.')[0].isdigit() and int(str(system_version).split('.')[0]) >= 12:
+        use_deb822 = True
+
+    backup_file = backup_file_if_exists(sources_file, '/etc/apt/sources.list.backup')
+    if backup_file:
+        print(f'[*] 备份原有软件源配置到: {backup_file}')
+
+    deb822_backup = backup_file_if_exists(deb822_file, '/etc/apt/sources.list.d/debian.sources.backup')
+    if deb822_backup:
+        print(f'[*] 备份 deb822 软件源配置到: {deb822_backup}')
+
+    new_sources_content = build_debian_sources_content(system_version, system_codename, use_deb822, mirror_name)
+    if not new_sources_content:
+        print('[!] 无法识别 Debian 发行代号，暂时不能自动生成软件源配置')
+        return False
+
+    if use_deb822:
+        print('[*] 检测到 Debian 12+ 或 deb822 格式，使用 /etc/apt/sources.list.d/debian.sources')
+        write_text_file(deb822_file, new_sources_content)
+        if os.path.exists(sources_file):
+            write_text_file(sources_file, '# 该文件由 ops_toolbox 保留，实际源配置请看 sources.list.d/debian.sources\n')
+    else:
+        print('[*] 使用传统 /etc/apt/sources.list 格式')
+        write_text_file(sources_file, new_sources_content)
+        if os.path.exists(deb822_file):
+            write_text_file(deb822_file, '# 该文件由 ops_toolbox 暂时停用，避免与 sources.list 重复\n')
+
+    return True
+
+
+REPO_FILE_CACHE_DIR = os.path.join(TOOLBOX_CACHE_DIR, 'repo_files')
+REPO_FILE_CACHE_INDEX = os.path.join(REPO_FILE_CACHE_DIR, 'index.json')
+REPO_FILE_FETCH_TIMEOUT = 60
+
+
+def get_redhat_repository_files(system_type, system_version, system_name):
+    """
+    返回 RedHat 系列要下载的源文件列表 [(目标路径, 下载地址)]，不支持的版本返回空列表。
+    """
+    version_major = system_version.split('.')[0]
+    if system_type == 'centos':
+        if version_major == '7':
+            return [
+                ('/etc/yum.repos.d/CentOS-Base.repo', 'https://mirrors.aliyun.com/repo/Centos-7.repo'),
+                ('/etc/yum.repos.d/epel.repo', 'https://mirrors.aliyun.com/repo/epel-7.repo'),
+            ]
+        if version_major == '8':
+            if 'Stream' in system_name:
+                return [('/etc/yum.repos.d/CentOS-Base.repo',
+                         'https://mirrors.aliyun.com/repo/centos-stream/8/CentOS-Stream-BaseOS.repo')]
+            return [('/etc/yum.repos.d/CentOS-Base.repo', 'https://mirrors.aliyun.com/repo/Centos-8.repo')]
+    elif system_type in ['rocky', 'almalinux']:
+        # 对于 Rocky/Alma，使用通用的 EL8/EL9 仓库
+        if version_major in ('8', '9'):
+            return [('/etc/yum.repos.d/Rocky-Base.repo',
+                     f'https://mirrors.aliyun.com/repo/rocky/{version_major}/Rocky-BaseOS.repo')]
+    return []
+
+
+def _load_repo_file_cache_index():
+    try:
+        with open(REPO_FILE_CACHE_INDEX, 'r', encoding='utf-8') as file:
+            index = json.load(file)
+        return index if isinstance(index, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_repo_file_cache_index(index):
+    try:
+        os.makedirs(REPO_FILE_CACHE_DIR, exist_ok=True)
+        temp_file = f'{REPO_FILE_CACHE_INDEX}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(index, file, ensure_ascii=False)
+        os.replace(temp_file, REPO_FILE_CACHE_INDEX)
+    except OSError:
+        pass
+
+
+def fetch_repository_file(url, cache_entry, timeout=REPO_FILE_FETCH_TIMEOUT):
+    """
+    下载一个源文件，本地有缓存时带 If-None-Match / If-Modified-Since 做条件请求。
+
+    返回 (文件内容, 新的缓存记录)；下载失败返回 (None, None)。
+    服务器回 304 时直接用缓存里的内容，不再传输文件本身。
+    """
+    import hashlib
+    import urllib.error
+    import urllib.request
+
+    cache_file = os.path.join(REPO_FILE_CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest())
+    cached_body = None
+    if cache_entry:
+        try:
+            with open(cache_file, 'rb') as file:
+                cached_body = file.read()
+        except OSError:
+            cached_body = None
+
+    request = urllib.request.Request(url)
+    if cached_body is not None:
+        if cache_entry.get('etag'):
+            request.add_header('If-None-Match', cache_entry['etag'])
+        if cache_entry.get('last_modified'):
+            request.add_header('If-Modified-Since', cache_entry['last_modified'])
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            new_entry = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+    except urllib.error.HTTPError as error:
+        if error.code == 304 and cached_body is not None:
+            return cached_body, cache_entry
+        print(f'[!] 下载 {url} 失败：HTTP {error.code}')
+        return None, None
+    except (urllib.error.URLError, OSError, ValueError) as error:
+        print(f'[!] 下载 {url} 失败：{error}')
+        return None, None
+
+    try:
+        os.makedirs(REPO_FILE_CACHE_DIR, exist_ok=True)
+        with open(cache_file, 'wb') as file:
+            file.write(body)
+    except OSError:
+        new_entry = None
+    return body, new_entry
+
+
+def fetch_repository_files(downloads):
+    """
+    并发下载源文件列表 [(目标路径, 下载地址)]，返回 {目标路径: 文件文本}。
+
+    有任何一个下载失败就返回 None，调用方据此放弃更换，保留原有配置。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache_index = _load_repo_file_cache_index()
+    with ThreadPoolExecutor(max_workers=min(8, len(downloads)) or 1) as pool:
+        futures = [
+            (target_path, url, pool.submit(fetch_repository_file, url, cache_index.get(url)))
+            for target_path, url in downloads
+        ]
+        results = [(target_path, url) + future.result() for target_path, url, future in futures]
+
+    contents = {}
+    for target_path, url, body, cache_entry in results:
+        if body is None:
+            return None
+        if cache_entry:
+            cache_index[url] = cache_entry
+        contents[target_path] = body.decode('utf-8', errors='replace')
+    _save_repo_file_cache_index(cache_index)
+    return contents
+
+
+def read_repository_directory(repo_directory='/etc/yum.repos.d'):
+    """
+    读取源目录下所有 .repo 文件，返回 {文件名: 内容}，用来判断源配置有没有变化。
+    """
+    resolved_directory = get_command_executor().resolve_path(repo_directory)
+    try:
+        file_names = sorted(os.listdir(resolved_directory))
+    except OSError:
+        return {}
+
+    contents = {}
+    for name in file_names:
+        if not name.endswith('.repo'):
+            continue
+        try:
+            with open(os.path.join(resolved_directory, name), 'r', encoding='utf-8', errors='replace') as file:
+                contents[name] = file.read()
+        except OSError:
+            continue
+    return contents
+
+
+def get_repository_result_files(system_family):
+    """
+    列出更换软件源后应该保持不变的配置文件。
+    """
+    if system_family == 'redhat':
+        repo_directory = '/etc/yum.repos.d'
+        try:
+            file_names = sorted(os.listdir(repo_directory))
+        except OSError:
+            return []
+        return [os.path.join(repo_directory, name) for name in file_names if name.endswith('.repo')]
+
+    candidate_files = ['/etc/apt/sources.list', '/etc/apt/sources.list.d/debian.sources']
+    return [path for path in candidate_files if os.path.exists(path)]
+
+
+@traced_action
+def change_software_repository(system_info):
+    """
+    更换软件源为国内镜像（阿里云镜像）
+    
+    这个功能可以让软件下载速度更快
+    因为国内访问国外的软件源比较慢
+    
+    同一镜像已经配置过、并且源文件没被改动时会直接跳过，
+    可以用 --force repo 强制重新配置。
+    
+    参数说明：
+        system_info: 系统信息字典
+    """
+    system_family = system_info['system_family']
+    mirror_name = choose_repository_mirror(system_family, system_info['system_type'])
+
+    step_inputs = {
+        'system_type': system_info['system_type'],
+        'system_version': system_info['system_version'],
+        'system_codename': system_info['system_codename'],
+        'system_name': system_info['system_name'],
+        'mirror': mirror_name,
+    }
+    if run_journaled_step(
+        'repo',
+        step_inputs,
+        lambda: get_repository_result_files(system_family),
+        lambda: apply_software_repository(system_info, mirror_name)
+    ):
+        start_package_prefetch(system_info)
+
+
+def apply_software_repository(system_info, mirror_name):
+    """
+    真正执行软件源更换，成功返回 True。
+    """
+    system_type = system_info['system_type']
+    system_version = system_info['system_version']
+    system_name = system_info['system_name']
+    system_codename = system_info['system_codename']
+    system_family = system_info['system_family']
+    package_manager = system_info['package_manager']
+    stop_package_prefetch()
+    
+    if system_family == 'redhat':
+        # RedHat 系列：CentOS、Rocky、Alma 等
+        print('[*] 正在为 RedHat 系列系统更换软件源...')
+        
+        # 第一步：先把新的源文件下载好，下载失败时原有配置保持不动
+        repository_files = get_redhat_repository_files(system_type, system_version, system_name)
+        new_repository_contents = {}
+        if repository_files:
+            print(f'[*] 正在并发下载 {len(repository_files)} 个软件源文件...')
+            new_repository_contents = fetch_repository_files(repository_files)
+            if new_repository_contents is None:
+                print('[!] 软件源文件下载失败，保留原有软件源配置')
+                return False
+
+        old_repository_contents = read_repository_directory()
+
+        # 第二步：备份原有的软件源配置
+        backup_directory = '/etc/yum.backup'
+        print(f'[*] 创建备份目录: {backup_directory}')
+        make_directory(backup_directory)
+        
+        # 把原来的配置文件移动到备份目录
+        print('[*] 备份原有软件源配置...')
+        # 使用 bash -c 来执行通配符命令
+        run_system_command(['bash', '-c', f'mv /etc/yum.repos.d/*.repo {backup_directory}/ 2>/dev/null || true'])
+        
+        # 第三步：写入下载好的源文件
+        print(f'[*] 配置 {system_type} {system_version} 软件源...')
+        for target_path, content in new_repository_contents.items():
+            write_text_file(target_path, content)
+
+        # 第四步：源内容有变化时才让元数据过期并重建缓存。
+        # 不再 clean all：expire-cache 只把元数据标记为过期，makecache 比对 repomd 校验和后
+        # 只下载真正变化的部分，已下载的软件包和没变的元数据都保留
+        if read_repository_directory() == old_repository_contents:
+            print('[OK] 软件源内容没有变化，沿用现有的元数据缓存')
+        else:
+            print('[*] 软件源内容有变化，正在更新软件包缓存...')
+            run_system_command([package_manager, 'clean', 'expire-cache'])
+            if not run_system_command([package_manager, 'makecache']):
+                print('[!] 软件源文件已经写入，但重建缓存失败，请检查源配置或网络连通性')
+                return False
+        
+        print('[OK] RedHat 系列系统软件源更换完成')
+        return True
+    
+    elif system_family == 'debian':
+        # Debian 系列：Ubuntu、Debian 等
+        print('[*] 正在为 Debian 系列系统更换软件源...')
+        print(f'[*] 已选择镜像：{mirror_name}')
+
+        # 第二步：生成新的软件源配置
+        if system_type == 'ubuntu':
+            # Ubuntu 系统
+            print(f'[*] 配置 Ubuntu {system_version} ({system_codename}) 软件源...')
+            new_sources_content = build_ubuntu_sources_content(system_codename, mirror_name)
+        elif system_type == 'debian':
+            # Debian 系统
+            print(f'[*] 配置 Debian {system_version} ({system_codename}) 软件源...')
+            if not configure_debian_apt_sources(system_version, system_codename, mirror_name):
+                return False
+            new_sources_content = None
+        else:
+            print('[!] 当前 Debian 系列系统暂不支持自动配置')
+            return False
+        
+        # 第三步：写入新的配置文件
+        if system_type == 'ubuntu':
+            sources_file = '/etc/apt/sources.list'
+            backup_file = backup_file_if_exists(sources_file, '/etc/apt/sources.list.backup')
+            if backup_file:
+                print(f'[*] 备份原有软件源配置到: {backup_file}')
+            write_text_file(sources_file, new_sources_content)
+        
+        # 第四步：更新软件包索引
+        print('[*] 更新软件包索引...')
+        if not run_system_command(['apt', 'update']):
+            print('[!] 软件源文件已经写入，但 apt update 失败，请检查源配置或网络连通性')
+            return False
+        
+        print('[OK] Debian 系列系统软件源更换完成')
+        return True
+
+    print('[!] 当前系统不支持自动更换软件源')
+    return False
+
+
+# --------------------------------------------
+# 第六部分：常用软件安装功能
+# 安装开发和运维常用的工具
+# --------------------------------------------
+
+@traced_action
+def install_common_tools(system_info):
+    """
+    安装常用的工具软件
+    
+    这些工具包括：
+    - vim: 文本编辑器
+    - wget: 文件下载工具
+    - curl: 另一个文件下载和HTTP工具
+    - net-tools: 网络工具（ifconfig等）
+    - lrzsz: 文件上传下载工具（rz/sz命令）
+    - bash-completion: bash 命令自动补全
+    - git: 版本控制工具
+    
+    参数说明：
+        system_info: 系统信息字典
+    """
+    common_tool_list = get_common_tool_packages(system_info['system_family'])
+    
+    # 显示要安装的软件列表
+    print('[*] 即将安装以下常用工具：')
+    for tool_name in common_tool_list:
+        print(f'    - {tool_name}')
+    
+    # 询问用户是否确认安装
+    print()
+    user_confirm = input('是否继续安装？(y/n): ')
+    
+    if user_confirm.lower() == 'y':
+        # 创建包管理器对象
+        pkg_manager = PackageManager(system_info)
+        
+        # 使用包管理器安装软件
+        if pkg_manager.install_packages(common_tool_list):
+            print('[OK] 常用工具安装完成')
+
+
+# --------------------------------------------
+# 第七部分：系统性能调优
+# 按服务器用途调整内核参数、文件句柄上限和透明大页
+# --------------------------------------------
+
+KERNEL_TUNING_SYSCTL_FILE = '/etc/sysctl.d/90-ops-toolbox-tuning.conf'
+KERNEL_TUNING_LIMITS_FILE = '/etc/security/limits.d/90-ops-toolbox-nofile.conf'
+KERNEL_TUNING_SYSTEMD_FILE = '/etc/systemd/system.conf.d/90-ops-toolbox-limits.conf'
+KERNEL_TUNING_THP_SERVICE = 'ops-toolbox-thp.service'
+KERNEL_TUNING_THP_UNIT_FILE = f'/etc/systemd/system/{KERNEL_TUNING_THP_SERVICE}'
+# 每次调优前把当前生效的内核参数保存在这里，删掉上面几个配置文件后可以用 sysctl -p <文件> 还原
+KERNEL_TUNING_BACKUP_DIRECTORY = '/var/backups/ops_toolbox'
+TRANSPARENT_HUGEPAGE_PATH = '/sys/kernel/mm/transparent_hugepage'
+# 容量类参数只往大调：新内核的默认值可能已经比预设大（比如 fs.file-max）
+KERNEL_TUNING_RAISE_ONLY = {
+    'net.core.somaxconn', 'net.core.netdev_max_backlog', 'net.ipv4.tcp_max_syn_backlog',
+    'net.core.rmem_max', 'net.core.wmem_max', 'fs.file-max', 'fs.inotify.max_user_watches',
+    'fs.inotify.max_user_instances', 'vm.max_map_count', 'kernel.pid_max',
+}
+
+# 各用途的调优预设：
+#   somaxconn / syn_backlog  监听队列长度
+#   swappiness               越小越不愿意换出内存
+#   dirty_ratio              脏页占内存比例（前台阻塞 / 后台回写）
+#   nofile                   每个进程能打开的文件数
+#   thp                      透明大页策略，数据库建议关闭
+#   reserved_ports           不分配给出站连接的端口，免得服务重启时端口被临时端口占住
+KERNEL_TUNING_PROFILES = {
+    'web': {
+        'label': 'Web / 反向代理（大量短连接）',
+        'somaxconn': 65535,
+        'syn_backlog': 65535,
+        'swappiness': 10,
+        'dirty_ratio': (20, 5),
+        'nofile': 1048576,
+        'thp': 'madvise',
+        'reserved_ports': '',
+    },
+    'db': {
+        'label': '数据库（MySQL / PostgreSQL / Redis 等）',
+        'somaxconn': 4096,
+        'syn_backlog': 8192,
+        'swappiness': 1,
+        'dirty_ratio': (10, 3),
+        'nofile': 65536,
+        'thp': 'never',
+        # MySQL X 协议的 33060 落在临时端口范围里
+        'reserved_ports': '33060',
+    },
+    'container': {
+        'label': '容器宿主机（Docker / Kubernetes 节点）',
+        'somaxconn': 32768,
+        'syn_backlog': 32768,
+        'swappiness': 10,
+        'dirty_ratio': (15, 5),
+        'nofile': 1048576,
+        'thp': 'madvise',
+        # Kubernetes NodePort 范围和 kubelet 端口
+        'reserved_ports': '10250,10256,30000-32767',
+    },
+}
+
+
+def merge_port_ranges(*values):
+    """
+    合并 '10250,30000-32767' 格式的端口列表，按内核的写法排序并合并相邻的端口段。
+    """
+    ports = set()
+    for value in values:
+        for item in (value or '').replace(' ', '').split(','):
+            if '-' in item:
+                start, end = item.split('-', 1)
+                ports.update(range(int(start), int(end) + 1))
+            elif item:
+                ports.add(int(item))
+
+    ranges = []
+    for port in sorted(ports):
+        if ranges and ranges[-1][1] == port - 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ','.join(str(start) if start == end else f'{start}-{end}' for start, end in ranges)
+
+
+def compute_kernel_tuning(profile_name, memory_total_kb):
+    """
+    根据用途预设和内存大小计算 sysctl 参数，返回 {参数名: 值}（值都是字符串）。
+    """
+    profile = KERNEL_TUNING_PROFILES[profile_name]
+    memory_gb = max(memory_total_kb // (1024 * 1024), 1)
+    dirty_ratio, dirty_background_ratio = profile['dirty_ratio']
+    # 内存很大时按比例算出来的脏页太多，一次回写会卡住磁盘，这里减半
+    if memory_gb >= 64:
+        dirty_ratio, dirty_background_ratio = max(dirty_ratio // 2, 5), max(dirty_background_ratio // 2, 1)
+
+    settings = {
+        'net.core.somaxconn': profile['somaxconn'],
+        'net.core.netdev_max_backlog': max(profile['somaxconn'] // 4, 4096),
+        'net.ipv4.tcp_max_syn_backlog': profile['syn_backlog'],
+        # 下限不低于内核默认的 32768，避开 Kubernetes NodePort 和常见服务的监听端口
+        'net.ipv4.ip_local_port_range': '32768 65535',
+        'net.ipv4.tcp_tw_reuse': 1,
+        'net.ipv4.tcp_fin_timeout': 15,
+        'net.ipv4.tcp_slow_start_after_idle': 0,
+        # 读写缓冲区上限：1 GB 内存给 4 MB，最多 16 MB
+        'net.core.rmem_max': min(16, max(4, memory_gb * 4)) * 1024 * 1024,
+        'net.core.wmem_max': min(16, max(4, memory_gb * 4)) * 1024 * 1024,
+        'vm.swappiness': profile['swappiness'],
+        'vm.dirty_ratio': dirty_ratio,
+        'vm.dirty_background_ratio': dirty_background_ratio,
+        # 系统级句柄上限至少是单进程上限的两倍
+        'fs.file-max': max(profile['nofile'] * 2, memory_total_kb // 4),
+    }
+    if profile['reserved_ports']:
+        settings['net.ipv4.ip_local_reserved_ports'] = merge_port_ranges(profile['reserved_ports'])
+    if profile_name == 'container':
+        settings.update({
+            'net.ipv4.ip_forward': 1,
+            'fs.inotify.max_user_watches': 524288,
+            'fs.inotify.max_user_instances': 8192,
+            'vm.max_map_count': 262144,
+            'kernel.pid_max': 4194304,
+        })
+    return {name: str(value) for name, value in settings.items()}
+
+
+def read_sysctl_value(name):
+    """
+    从 /proc/sys 读取当前生效的内核参数；参数不存在时返回 None。
+    """
+    try:
+        with open(os.path.join('/proc/sys', name.replace('.', '/')), 'r', encoding='utf-8') as file:
+            return ' '.join(file.read().split())
+    except OSError:
+        return None
+
+
+def read_transparent_hugepage_policy():
+    """
+    读取透明大页的当前策略（方括号里的那一项）。
+    """
+    try:
+        with open(os.path.join(TRANSPARENT_HUGEPAGE_PATH, 'enabled'), 'r', encoding='utf-8') as file:
+            content = file.read()
+    except OSError:
+        return None
+    if '[' in content:
+        return content[content.index('[') + 1:content.index(']')]
+    return content.strip()
+
+
+def snapshot_kernel_tuning(setting_names):
+    """
+    记录当前的内核参数、文件句柄上限和透明大页策略，用于调优前后对比。
+
+    nofile 取 systemd 给服务的默认上限（DefaultLimitNOFILE），本进程自己的上限调优后不会变。
+    """
+    snapshot = {name: read_sysctl_value(name) for name in setting_names}
+    output = get_command_output(['systemctl', 'show', '-p', 'DefaultLimitNOFILE'])
+    snapshot['nofile'] = output.split('=', 1)[1] if output.startswith('DefaultLimitNOFILE=') else None
+    snapshot['transparent_hugepage'] = read_transparent_hugepage_policy()
+    return snapshot
+
+
+def render_kernel_tuning_files(profile_name, settings):
+    """
+    生成需要写入的配置文件，返回 {文件路径: 内容}。
+    """
+    profile = KERNEL_TUNING_PROFILES[profile_name]
+    header = f"# 由 Linux 运维工具箱生成（{profile['label']}），重新调优会覆盖本文件\n"
+    nofile = profile['nofile']
+
+    sysctl_text = header + ''.join(f'{name} = {value}\n' for name, value in settings.items())
+    # limits.conf 里的 * 不包含 root，需要单独写一行
+    limits_text = header + ''.join(
+        f'{user} {kind} nofile {nofile}\n' for user in ('*', 'root') for kind in ('soft', 'hard')
+    )
+    systemd_text = header + f'[Manager]\nDefaultLimitNOFILE={nofile}\n'
+    thp_unit_text = header + (
+        '[Unit]\n'
+        'Description=Set transparent hugepage policy\n'
+        'DefaultDependencies=no\n'
+        'After=sysinit.target local-fs.target\n\n'
+        '[Service]\n'
+        'Type=oneshot\n'
+        f"ExecStart=/bin/sh -c 'echo {profile['thp']} > {TRANSPARENT_HUGEPAGE_PATH}/enabled "
+        f"&& echo {profile['thp']} > {TRANSPARENT_HUGEPAGE_PATH}/defrag'\n\n"
+        '[Install]\n'
+        'WantedBy=basic.target\n'
+    )
+    return {
+        KERNEL_TUNING_SYSCTL_FILE: sysctl_text,
+        KERNEL_TUNING_LIMITS_FILE: limits_text,
+        KERNEL_TUNING_SYSTEMD_FILE: systemd_text,
+        KERNEL_TUNING_THP_UNIT_FILE: thp_unit_text,
+    }
+
+
+def save_kernel_tuning_backup(snapshot):
+    """
+    把调优前的内核参数保存成 sysctl 格式，返回备份文件路径。
+    """
+    backup_path = os.path.join(
+        KERNEL_TUNING_BACKUP_DIRECTORY, f"sysctl-before-{time.strftime('%Y%m%d-%H%M%S')}.conf"
+    )
+    # 只执行 sysctl -p 的话，下次开机还会加载调优后的配置，所以要先删掉工具写入的文件
+    lines = [
+        '# 调优前的内核参数，还原步骤：',
+        f'#   systemctl disable --now {KERNEL_TUNING_THP_SERVICE}',
+        f'#   rm -f {KERNEL_TUNING_SYSCTL_FILE} {KERNEL_TUNING_LIMITS_FILE} '
+        f'{KERNEL_TUNING_SYSTEMD_FILE} {KERNEL_TUNING_THP_UNIT_FILE}',
+        '#   systemctl daemon-reexec',
+        f'#   sysctl -p {backup_path}',
+    ]
+    for name, value in snapshot.items():
+        if value is None:
+            continue
+        if '.' in name and ' ' not in name:
+            lines.append(f'{name} = {value}')
+        else:
+            lines.append(f'# {name} = {value}')
+    make_directory(KERNEL_TUNING_BACKUP_DIRECTORY)
+    write_text_file(backup_path, '\n'.join(lines) + '\n')
+    return backup_path
+
+
+def print_kernel_tuning_report(before, after, settings):
+    """
+    打印调优前后的对比表。
+    """
+    name_width = max(len(name) for name in before) + 2
+    print(f"\n{'参数'.ljust(name_width)}{'调优前'.ljust(22)}{'调优后'}")
+    print('-' * (name_width + 44))
+    for name, before_value in before.items():
+        after_value = after.get(name)
+        marker = ''
+        if name in settings and after_value != settings[name]:
+            marker = f'  [!] 期望 {settings[name]}'
+        elif before_value != after_value:
+            marker = '  *'
+        print(f"{name.ljust(name_width)}{str(before_value or '-').ljust(22)}{after_value or '-'}{marker}")
+    print('\n[*] 标 * 的是本次改动的参数；nofile 上限对重新登录后的会话和新启动的服务生效')
+
+
+@traced_action
+def tune_kernel_parameters(system_info):
+    """
+    选择服务器用途后写入 sysctl、文件句柄上限和透明大页配置，并显示调优前后对比。
+    """
+    profile_options = [(profile['label'], name) for name, profile in KERNEL_TUNING_PROFILES.items()]
+    profile_options.append(('返回上一级', None))
+    profile_name = select_menu_option('请选择服务器用途', profile_options, '上下键选择，回车确认')
+    if profile_name is None:
+        return False
+
+    settings = compute_kernel_tuning(profile_name, system_info.get('memory_total_kb') or 0)
+    before = snapshot_kernel_tuning(settings)
+    for name in KERNEL_TUNING_RAISE_ONLY & settings.keys():
+        if (before[name] or '').isdigit() and int(before[name]) > int(settings[name]):
+            settings[name] = before[name]
+    # 保留端口在已有的基础上追加，不覆盖别人配置的
+    if 'net.ipv4.ip_local_reserved_ports' in settings:
+        settings['net.ipv4.ip_local_reserved_ports'] = merge_port_ranges(
+            before['net.ipv4.ip_local_reserved_ports'], settings['net.ipv4.ip_local_reserved_ports']
+        )
+    planned_files = render_kernel_tuning_files(profile_name, settings)
+
+    print(f"\n[*] 调优预设：{KERNEL_TUNING_PROFILES[profile_name]['label']}")
+    print('=' * 50)
+    for name, value in settings.items():
+        print(f'{name} = {value}')
+    print(f"nofile = {KERNEL_TUNING_PROFILES[profile_name]['nofile']}")
+    print(f"transparent_hugepage = {KERNEL_TUNING_PROFILES[profile_name]['thp']}")
+    print('=' * 50)
+    if not confirm_with_menu('是否应用以上调优参数？'):
+        print('[*] 已取消性能调优')
+        return False
+
+    backup_path = save_kernel_tuning_backup(before)
+    print(f'[OK] 调优前的内核参数已备份到 {backup_path}')
+
+    executor = get_command_executor()
+    for file_path, content in planned_files.items():
+        try:
+            with open(executor.resolve_path(file_path), 'r', encoding='utf-8') as file:
+                if file.read() == content:
+                    continue
+        except OSError:
+            pass
+        make_directory(os.path.dirname(file_path))
+        backup_file_if_exists(file_path)
+        write_text_file(file_path, content)
+        print(f'[OK] 已写入 {file_path}')
+
+    # 只加载本工具的文件；-e 忽略当前内核没有的参数
+    print('[*] 正在加载内核参数...')
+    run_system_command(['sysctl', '-e', '-p', KERNEL_TUNING_SYSCTL_FILE])
+
+    if check_command_exists('systemctl'):
+        run_system_command(['systemctl', 'daemon-reload'])
+        run_system_command(['systemctl', 'daemon-reexec'])
+        if os.path.isdir(TRANSPARENT_HUGEPAGE_PATH):
+            run_system_command(['systemctl', 'enable', '--now', KERNEL_TUNING_THP_SERVICE])
+            # oneshot 服务已经运行过时 --now 不会再执行，这里重启一次让新策略立即生效
+            run_system_command(['systemctl', 'restart', KERNEL_TUNING_THP_SERVICE])
+
+    after = snapshot_kernel_tuning(settings)
+    print_kernel_tuning_report(before, after, settings)
+    return True
+
+
+STORAGE_UDEV_RULES_FILE = '/etc/udev/rules.d/60-ops-toolbox-io.rules'
+# 不参与调优的块设备：虚拟设备、光驱、软驱，以及 LVM / RAID 这类叠在物理盘上的设备
+STORAGE_SKIPPED_DEVICE_PREFIXES = ('loop', 'ram', 'zram', 'sr', 'fd', 'dm-', 'md', 'nbd')
+# 挂载参数只改这些本地文件系统
+STORAGE_TUNED_FILESYSTEMS = ('ext3', 'ext4', 'xfs', 'btrfs')
+STORAGE_ATIME_OPTIONS = ('noatime', 'relatime', 'strictatime', 'atime', 'lazytime')
+
+# 各类磁盘的调度器（按优先级，取内核支持的第一个）和预读大小
+STORAGE_DEVICE_CLASSES = {
+    'nvme': {
+        'label': 'NVMe',
+        'schedulers': ('none', 'mq-deadline'),
+        'read_ahead_kb': 128,
+        'udev_match': 'KERNEL=="nvme[0-9]*n[0-9]*", ENV{DEVTYPE}=="disk"',
+    },
+    'virtio': {
+        # 虚拟盘由宿主机调度，客户机里不再排序
+        'label': '虚拟磁盘',
+        'schedulers': ('none', 'mq-deadline'),
+        'read_ahead_kb': 256,
+        'udev_match': 'KERNEL=="vd[a-z]*|xvd[a-z]*", ENV{DEVTYPE}=="disk"',
+    },
+    'ssd': {
+        'label': 'SSD',
+        'schedulers': ('mq-deadline', 'none'),
+        'read_ahead_kb': 256,
+        'udev_match': 'KERNEL=="sd[a-z]*|mmcblk[0-9]*", ENV{DEVTYPE}=="disk", ATTR{queue/rotational}=="0"',
+    },
+    'hdd': {
+        'label': '机械盘',
+        'schedulers': ('bfq', 'mq-deadline'),
+        'read_ahead_kb': 1024,
+        'udev_match': 'KERNEL=="sd[a-z]*", ENV{DEVTYPE}=="disk", ATTR{queue/rotational}=="1"',
+    },
+}
+
+
+def _read_sys_text(path):
+    """
+    读取 /sys 下的单值文件，读不到时返回空字符串。
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read().strip()
+    except OSError:
+        return ''
+
+
+def classify_block_devices(sys_block_path='/sys/block'):
+    """
+    按设备名和 queue/rotational 把整块磁盘分成 nvme / virtio / ssd / hdd。
+
+    返回列表，每项包含 name、device_class、scheduler（当前）、schedulers（内核支持的）、read_ahead_kb。
+    """
+    try:
+        names = sorted(os.listdir(sys_block_path))
+    except OSError:
+        return []
+
+    devices = []
+    for name in names:
+        if name.startswith(STORAGE_SKIPPED_DEVICE_PREFIXES):
+            continue
+        queue_path = os.path.join(sys_block_path, name, 'queue')
+        scheduler_text = _read_sys_text(os.path.join(queue_path, 'scheduler'))
+        if not scheduler_text:
+            continue
+
+        if name.startswith('nvme'):
+            device_class = 'nvme'
+        elif name.startswith(('vd', 'xvd')):
+            device_class = 'virtio'
+        elif _read_sys_text(os.path.join(queue_path, 'rotational')) == '1':
+            device_class = 'hdd'
+        else:
+            device_class = 'ssd'
+
+        current_scheduler = scheduler_text.split('[', 1)[1].split(']', 1)[0] if '[' in scheduler_text else scheduler_text
+        devices.append({
+            'name': name,
+            'device_class': device_class,
+            'scheduler': current_scheduler,
+            'schedulers': scheduler_text.replace('[', '').replace(']', '').split(),
+            'read_ahead_kb': _read_sys_text(os.path.join(queue_path, 'read_ahead_kb')),
+        })
+    return devices
+
+
+def choose_io_scheduler(device):
+    """
+    从内核支持的调度器里选出这类磁盘最合适的一个；都不支持时返回 None。
+    """
+    for scheduler in STORAGE_DEVICE_CLASSES[device['device_class']]['schedulers']:
+        if scheduler in device['schedulers']:
+            return scheduler
+    return None
+
+
+def build_storage_udev_rules(devices):
+    """
+    为本机出现过的磁盘类型生成 udev 规则；规则按类型匹配，换盘或加盘后同样生效。
+    """
+    lines = ['# 由 Linux 运维工具箱生成，重新执行存储调优会覆盖本文件']
+    seen_classes = set()
+    for device in devices:
+        device_class = device['device_class']
+        if device_class in seen_classes:
+            continue
+        seen_classes.add(device_class)
+
+        class_info = STORAGE_DEVICE_CLASSES[device_class]
+        scheduler = choose_io_scheduler(device)
+        actions = [f'ATTR{{queue/read_ahead_kb}}="{class_info["read_ahead_kb"]}"']
+        if scheduler:
+            actions.insert(0, f'ATTR{{queue/scheduler}}="{scheduler}"')
+        lines.append(f"# {class_info['label']}")
+        lines.append(f'ACTION=="add|change", {class_info["udev_match"]}, ' + ', '.join(actions))
+    return '\n'.join(lines) + '\n'
+
+
+def update_fstab_mount_options(fstab_text):
+    """
+    给本地文件系统的挂载项加上 noatime，返回 (新内容, 改动的挂载点列表)。
+
+    已经显式指定过 atime 类参数的挂载项保持不变；其余行（注释、空格对齐）原样保留。
+    """
+    import re
+
+    new_lines = []
+    changed_mount_points = []
+    for line in fstab_text.splitlines(keepends=True):
+        body = line.rstrip('\n')
+        indent = body[:len(body) - len(body.lstrip())]
+        parts = re.split(r'(\s+)', body.strip())
+        # parts 中偶数位是字段，奇数位是原来的空白
+        fields = parts[::2]
+        if line.lstrip().startswith('#') or len(fields) < 4 or fields[2] not in STORAGE_TUNED_FILESYSTEMS:
+            new_lines.append(line)
+            continue
+
+        options = fields[3].split(',')
+        if any(option in STORAGE_ATIME_OPTIONS for option in options):
+            new_lines.append(line)
+            continue
+
+        parts[6] = ','.join(options + ['noatime'])
+        new_lines.append(indent + ''.join(parts) + ('\n' if line.endswith('\n') else ''))
+        changed_mount_points.append(_decode_mount_path(fields[1]))
+    return ''.join(new_lines), changed_mount_points
+
+
+def _print_text_diff(file_path, old_text, new_text):
+    import difflib
+
+    diff_lines = list(difflib.unified_diff(
+        old_text.splitlines(), new_text.splitlines(),
+        fromfile=f'{file_path}（当前）', tofile=f'{file_path}（调优后）', lineterm=''
+    ))
+    for line in diff_lines:
+        print(line)
+    return bool(diff_lines)
+
+
+@traced_action
+def tune_storage_io(system_info):
+    """
+    存储 I/O 调优：按磁盘类型设置调度器和预读（udev 规则），给 fstab 加 noatime。
+
+    先显示差异（相当于 dry-run），确认后才写入；fstab 写入前备份，校验失败自动还原。
+    """
+    devices = classify_block_devices()
+    if not devices:
+        print('[!] 没有找到可以调优的块设备')
+        return False
+
+    print(f"{'设备'.ljust(10)}{'类型'.ljust(10)}{'当前调度器'.ljust(14)}{'建议调度器'.ljust(14)}{'预读(KB)'}")
+    for device in devices:
+        class_info = STORAGE_DEVICE_CLASSES[device['device_class']]
+        print(f"{device['name'].ljust(10)}{device['device_class'].ljust(10)}{device['scheduler'].ljust(14)}"
+              f"{(choose_io_scheduler(device) or '-').ljust(14)}{device['read_ahead_kb']} -> {class_info['read_ahead_kb']}")
+
+    executor = get_command_executor()
+    planned_files = {STORAGE_UDEV_RULES_FILE: build_storage_udev_rules(devices)}
+    try:
+        with open(executor.resolve_path('/etc/fstab'), 'r', encoding='utf-8') as file:
+            fstab_text = file.read()
+    except OSError:
+        fstab_text = None
+    changed_mount_points = []
+    if fstab_text is not None:
+        new_fstab_text, changed_mount_points = update_fstab_mount_options(fstab_text)
+        planned_files['/etc/fstab'] = new_fstab_text
+
+    print('\n将要做的改动：')
+    print('=' * 50)
+    changed_files = {}
+    for file_path, new_text in planned_files.items():
+        try:
+            with open(executor.resolve_path(file_path), 'r', encoding='utf-8') as file:
+                old_text = file.read()
+        except OSError:
+            old_text = ''
+        if _print_text_diff(file_path, old_text, new_text):
+            changed_files[file_path] = new_text
+    print('=' * 50)
+
+    has_flash_disk = any(device['device_class'] != 'hdd' for device in devices)
+    if has_flash_disk:
+        # 挂载参数里的 discard 每次删除都同步 TRIM，写入多时会拖慢 I/O，定期 fstrim 更稳
+        print('[*] 建议：SSD / NVMe / 虚拟盘不在 fstab 加 discard，改为启用 fstrim.timer 每周批量 TRIM')
+
+    if not changed_files:
+        print('[OK] 存储参数已经是调优后的配置')
+        return True
+    if not confirm_with_menu('是否应用以上改动？（选否只预览，不修改系统）', default=False):
+        print('[*] 仅预览，未做任何修改')
+        return False
+
+    if STORAGE_UDEV_RULES_FILE in changed_files:
+        make_directory(os.path.dirname(STORAGE_UDEV_RULES_FILE))
+        write_text_file(STORAGE_UDEV_RULES_FILE, changed_files[STORAGE_UDEV_RULES_FILE])
+        print(f'[OK] 已写入 {STORAGE_UDEV_RULES_FILE}')
+        run_system_command(['udevadm', 'control', '--reload-rules'])
+        run_system_command(['udevadm', 'trigger', '--subsystem-match=block', '--action=change'])
+
+    if '/etc/fstab' in changed_files:
+        backup_path = backup_file_if_exists('/etc/fstab', f"/etc/fstab.{time.strftime('%Y%m%d-%H%M%S')}.backup")
+        write_text_file('/etc/fstab', changed_files['/etc/fstab'])
+        print(f'[OK] 已更新 /etc/fstab，原文件备份在 {backup_path}')
+
+        if check_command_exists('findmnt') and not run_system_command(['findmnt', '--verify']):
+            print('[!] fstab 校验失败，已恢复原文件')
+            shutil.copy2(executor.resolve_path(backup_path), executor.resolve_path('/etc/fstab'))
+            return False
+        if check_command_exists('systemctl'):
+            run_system_command(['systemctl', 'daemon-reload'])
+        for mount_point in changed_mount_points:
+            run_system_command(['mount', '-o', 'remount,noatime', mount_point])
+
+    if has_flash_disk and check_command_exists('systemctl'):
+        run_system_command(['systemctl', 'enable', '--now', 'fstrim.timer'])
+
+    print('[OK] 存储 I/O 调优完成')
+    return True
+
+
+# --------------------------------------------
+# 第八部分：数据库安装功能
+# 安装 MySQL 数据库
+# --------------------------------------------
+
+@traced_action
+def install_mysql_database(system_info):
+    """
+    安装 MySQL 数据库
+    
+    MySQL 是最流行的开源关系型数据库
+    
+    参数说明：
+        system_info: 系统信息字典
+    """
+    system_family = system_info['system_family']
+    pkg_manager = PackageManager(system_info)
+    
+    print('[*] 正在安装 MySQL 数据库...')
+    
+    if system_family == 'redhat':
+        # RedHat 系列：需要先配置 MySQL 仓库
+        print('[*] 配置 MySQL 软件源（清华大学镜像）...')
+        
+        # 生成 MySQL 仓库配置文件
+        mysql_repo_content = '''[mysql-connectors-community]
+name=MySQL Connectors Community
+baseurl=https://mirrors.tuna.tsinghua.edu.cn/mysql/yum/mysql-connectors-community-el7-$basearch/
+enabled=1
+gpgcheck=1
+gpgkey=https://repo.mysql.com/RPM-GPG-KEY-mysql-2022
+
+[mysql-tools-community]
+name=MySQL Tools Community
+baseurl=https://mirrors.tuna.tsinghua.edu.cn/mysql/yum/mysql-tools-community-el7-$basearch/
+enabled=1
+gpgcheck=1
+gpgkey=https://repo.mysql.com/RPM-GPG-KEY-mysql-2022
+
+[mysql-5.7-community]
+name=MySQL 5.7 Community Server
+baseurl=https://mirrors.tuna.tsinghua.edu.cn/mysql/yum/mysql-5.7-community-el7-$basearch/
+enabled=1
+gpgcheck=1
+gpgkey=https://repo.mysql.com/RPM-GPG-KEY-mysql-2022
+'''
+        
+        # 写入配置文件
+        write_text_file('/etc/yum.repos.d/mysql.repo', mysql_repo_content)
+        
+        print('[*] MySQL 软件源配置完成')
+        
+        # 安装 MySQL
+        if pkg_manager.install_packages(['mysql-community-server']):
+            # 启动 MySQL 服务
+            print('[*] 启动 MySQL 服务...')
+            run_system_command(['systemctl', 'start', 'mysqld'])
+            
+            # 设置开机自启
+            print('[*] 设置 MySQL 开机自启...')
+            run_system_command(['systemctl', 'enable', 'mysqld'])
+            
+            print('[OK] MySQL 数据库安装完成')
+            print('[!] 注意：MySQL 初始密码在日志文件中')
+            print('[!] 请执行以下命令查看初始密码：')
+            print('[!]   grep "temporary password" /var/log/mysqld.log')
+
+            tune_mysql_server(system_info, 'mysqld')
+        else:
+            print('[!] MySQL 安装失败')
+    
+    elif system_family == 'debian':
+        # Debian 系列：默认更适合安装 default-mysql-server
+        print('[*] 在 Debian 系列系统上安装默认 MySQL 实现...')
+        
+        if pkg_manager.install_packages(['default-mysql-server']):
+            service_name = start_and_enable_service(['mysql', 'mariadb'])
+            if service_name:
+                print(f'[OK] 数据库服务 {service_name} 已启动，并设置为开机自启')
+
+            print('[OK] Debian 系列数据库安装完成')
+            print('[!] 说明：Debian 默认通常安装的是 MariaDB（MySQL 兼容实现）')
+            print('[!] 建议运行 mysql_secure_installation 命令进行安全配置')
+
+            if service_name:
+                tune_mysql_server(system_info, service_name)
+        else:
+            print('[!] Debian 系列数据库安装失败')
+    else:
+        print('[!] 当前系统不支持自动安装 MySQL')
+
+
+# MySQL 调优预设：
+#   buffer_pool_ratio  innodb_buffer_pool_size 占内存的比例
+#   io_capacity        SSD / 机械盘 的 innodb_io_capacity
+#   connections_per_core  每个 CPU 核心对应的 max_connections
+MYSQL_TUNING_PRESETS = {
+    'oltp': {
+        'label': 'OLTP（专用数据库服务器，大量短事务）',
+        'buffer_pool_ratio': 0.70,
+        'io_capacity': {'ssd': 2000, 'hdd': 200},
+        'connections_per_core': 100,
+    },
+    'mixed': {
+        'label': '混合负载（和应用部署在同一台机器上）',
+        'buffer_pool_ratio': 0.45,
+        'io_capacity': {'ssd': 1000, 'hdd': 200},
+        'connections_per_core': 50,
+    },
+}
+# 每个连接大致占用的内存（排序、连接缓冲等），用来限制 max_connections
+MYSQL_MEMORY_PER_CONNECTION_MB = 12
+MYSQL_TUNING_FILE_NAME = 'zz-ops-toolbox-tuning.cnf'
+
+
+def is_path_on_rotational_disk(path):
+    """
+    判断路径所在的块设备是不是机械盘（读 /sys/dev/block/<主:次>/queue/rotational）。
+
+    分区向上找到整块磁盘；判断不出来时返回 None。
+    """
+    while not os.path.exists(path) and path != '/':
+        path = os.path.dirname(path)
+    try:
+        device_number = os.stat(path).st_dev
+    except OSError:
+        return None
+
+    device_path = os.path.realpath(f'/sys/dev/block/{os.major(device_number)}:{os.minor(device_number)}')
+    if os.path.exists(os.path.join(device_path, 'partition')):
+        device_path = os.path.dirname(device_path)
+    try:
+        with open(os.path.join(device_path, 'queue', 'rotational'), 'r', encoding='utf-8') as file:
+            return file.read().strip() == '1'
+    except OSError:
+        return None
+
+
+def get_mysql_server_version():
+    """
+    读取数据库服务端版本，返回 (类型, (主版本, 次版本))，类型是 'mariadb' 或 'mysql'；识别不了返回 None。
+
+    输出示例：mysqld  Ver 10.11.6-MariaDB-0+deb12u1 for debian-linux-gnu on x86_64
+    """
+    import re
+
+    for binary in ('mariadbd', 'mysqld', '/usr/sbin/mariadbd', '/usr/sbin/mysqld'):
+        if not (os.path.isabs(binary) and os.path.exists(binary)) and not check_command_exists(binary):
+            continue
+        match = re.search(r'Ver\s+(\d+)\.(\d+)\S*', get_command_output([binary, '--version'], timeout=30))
+        if match:
+            flavor = 'mariadb' if 'mariadb' in match.group(0).lower() else 'mysql'
+            return flavor, (int(match.group(1)), int(match.group(2)))
+    return None
+
+
+def compute_mysql_tuning(memory_total_kb, cpu_count, rotational, preset_name, server_version=None):
+    """
+    根据内存、CPU 核数、磁盘类型和负载预设计算 MySQL 参数，返回 {参数名: 值}。
+
+    server_version 是 get_mysql_server_version() 的返回值：MariaDB 10.5 起
+    innodb_buffer_pool_instances 已经废弃（10.6 删除，写了会起不来），这时不写这个参数；
+    版本未知时加 loose- 前缀，不认识这个参数的版本会忽略它而不是报错。
+    """
+    preset = MYSQL_TUNING_PRESETS[preset_name]
+    memory_mb = max(memory_total_kb // 1024, 512)
+    cpu_count = max(cpu_count or 1, 1)
+
+    # 小内存机器要给系统和连接留出更多余量
+    buffer_pool_ratio = preset['buffer_pool_ratio'] if memory_mb >= 4096 else min(preset['buffer_pool_ratio'], 0.35)
+    buffer_pool_mb = max(128, int(memory_mb * buffer_pool_ratio) // 128 * 128)
+    # 缓冲池不足 1 GB 时多实例不生效
+    buffer_pool_instances = min(8, max(1, buffer_pool_mb // 1024))
+    # 缓冲池大小要是 chunk（128 MB）× 实例数的整数倍
+    buffer_pool_mb = max(128 * buffer_pool_instances, buffer_pool_mb // (128 * buffer_pool_instances) * (128 * buffer_pool_instances))
+
+    # 两个 redo 日志文件合计约为缓冲池的 1/4
+    log_file_mb = min(2048, max(48, buffer_pool_mb // 8))
+
+    disk_type = 'hdd' if rotational else 'ssd'
+    io_capacity = preset['io_capacity'][disk_type]
+
+    connection_memory_mb = max(memory_mb - buffer_pool_mb - 512, 0)
+    max_connections = min(
+        cpu_count * preset['connections_per_core'],
+        max(151, connection_memory_mb // MYSQL_MEMORY_PER_CONNECTION_MB),
+        4000
+    )
+    max_connections = max(max_connections, 151)
+    thread_cache_size = min(256, 8 + max_connections // 100 * 8)
+
+    settings = {'innodb_buffer_pool_size': f'{buffer_pool_mb}M'}
+    if server_version is None:
+        settings['loose-innodb_buffer_pool_instances'] = buffer_pool_instances
+    elif not (server_version[0] == 'mariadb' and server_version[1] >= (10, 5)):
+        settings['innodb_buffer_pool_instances'] = buffer_pool_instances
+    settings.update({
+        'innodb_log_file_size': f'{log_file_mb}M',
+        'innodb_io_capacity': io_capacity,
+        'innodb_io_capacity_max': io_capacity * 2,
+        'innodb_flush_neighbors': 1 if rotational else 0,
+        'innodb_flush_method': 'O_DIRECT',
+        'max_connections': max_connections,
+        'thread_cache_size': thread_cache_size,
+    })
+    return settings
+
+
+def render_mysql_tuning(settings, preset_name, memory_total_kb, cpu_count, rotational):
+    """
+    生成 conf.d 片段的文本。
+    """
+    disk_text = '未知' if rotational is None else ('机械盘' if rotational else 'SSD')
+    lines = [
+        '# 由 Linux 运维工具箱生成，重新执行 MySQL 调优会覆盖本文件',
+        f"# 预设：{MYSQL_TUNING_PRESETS[preset_name]['label']}",
+        f'# 硬件：内存 {memory_total_kb // 1024} MB，{cpu_count} 核，数据盘 {disk_text}',
+        '[mysqld]',
+    ]
+    lines.extend(f'{name} = {value}' for name, value in settings.items())
+    return '\n'.join(lines) + '\n'
+
+
+def get_mysql_tuning_file(system_family):
+    """
+    返回调优片段的写入位置：放在最后加载的配置目录里，保证能覆盖发行版的默认值。
+    """
+    if system_family == 'redhat':
+        return f'/etc/my.cnf.d/{MYSQL_TUNING_FILE_NAME}'
+    for directory in ('/etc/mysql/mariadb.conf.d', '/etc/mysql/mysql.conf.d', '/etc/mysql/conf.d'):
+        if os.path.isdir(get_command_executor().resolve_path(directory)):
+            return f'{directory}/{MYSQL_TUNING_FILE_NAME}'
+    return f'/etc/mysql/conf.d/{MYSQL_TUNING_FILE_NAME}'
+
+
+def ensure_my_cnf_includes_directory(my_cnf_path='/etc/my.cnf', include_directory='/etc/my.cnf.d'):
+    """
+    MySQL 官方 RPM 的 /etc/my.cnf 默认不包含 my.cnf.d，需要时补上 !includedir。
+    """
+    resolved_path = get_command_executor().resolve_path(my_cnf_path)
+    try:
+        with open(resolved_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+    except OSError:
+        content = ''
+
+    if f'!includedir {include_directory}' in content:
+        return
+    backup_file_if_exists(my_cnf_path)
+    write_text_file(my_cnf_path, content.rstrip('\n') + f'\n\n!includedir {include_directory}\n')
+
+
+def tune_mysql_server(system_info, service_name):
+    """
+    按硬件生成 MySQL 调优片段，显示差异并确认后写入，然后重启一次数据库。
+    """
+    import difflib
+
+    preset_options = [(preset['label'], name) for name, preset in MYSQL_TUNING_PRESETS.items()]
+    preset_options.append(('不调优，保持默认配置', None))
+    preset_name = select_menu_option('请选择数据库负载类型', preset_options, '上下键选择，回车确认（参数按内存、CPU 和磁盘类型计算）')
+    if preset_name is None:
+        print('[*] 跳过 MySQL 调优')
+        return False
+
+    memory_total_kb = system_info.get('memory_total_kb') or 0
+    cpu_count = system_info.get('cpu_count') or os.cpu_count() or 1
+    rotational = is_path_on_rotational_disk('/var/lib/mysql')
+    settings = compute_mysql_tuning(memory_total_kb, cpu_count, rotational, preset_name, get_mysql_server_version())
+    new_content = render_mysql_tuning(settings, preset_name, memory_total_kb, cpu_count, rotational)
+
+    tuning_file = get_mysql_tuning_file(system_info['system_family'])
+    try:
+        with open(get_command_executor().resolve_path(tuning_file), 'r', encoding='utf-8') as file:
+            old_content = file.read()
+    except OSError:
+        old_content = ''
+
+    if old_content == new_content:
+        print(f'[OK] {tuning_file} 已经是相同的调优参数，无需重启')
+        return True
+
+    print(f'\n将写入 {tuning_file}：')
+    print('=' * 50)
+    diff_lines = difflib.unified_diff(
+        old_content.splitlines(), new_content.splitlines(),
+        fromfile=f'{tuning_file}（当前）', tofile=f'{tuning_file}（调优后）', lineterm=''
+    )
+    for line in diff_lines:
+        print(line)
+    print('=' * 50)
+
+    if not confirm_with_menu('是否应用这些参数并重启数据库？'):
+        print('[*] 已取消 MySQL 调优')
+        return False
+
+    if system_info['system_family'] == 'redhat':
+        ensure_my_cnf_includes_directory()
+    make_directory(os.path.dirname(tuning_file))
+    backup_path = backup_file_if_exists(tuning_file)
+    write_text_file(tuning_file, new_content)
+
+    print(f'[*] 正在重启 {service_name} 使参数生效...')
+    if run_system_command(['systemctl', 'restart', service_name], timeout=300):
+        print('[OK] MySQL 调优参数已生效')
+        return True
+
+    print('[!] 数据库重启失败，正在恢复原来的配置...')
+    if backup_path:
+        shutil.copy2(get_command_executor().resolve_path(backup_path), get_command_executor().resolve_path(tuning_file))
+    else:
+        os.remove(get_command_executor().resolve_path(tuning_file))
+    run_system_command(['systemctl', 'restart', service_name], timeout=300)
+    return False
+
+
+# --------------------------------------------
+# 第九部分：Docker 安装功能
+# 使用官方脚本安装 Docker
+# --------------------------------------------
+
+@traced_action
+def install_docker_engine(system_info=None):
+    """
+    安装 Docker 容器引擎
+    
+    Debian/Ubuntu 优先使用官方 APT 仓库安装；
+    其他系统保留原来的便捷脚本方式。
+    已经安装过且相关文件没变时直接跳过，可以用 --force docker 强制重装。
+    安装完成后再调优 daemon.json（镜像加速、并发、日志轮转、live-restore）。
+    """
+    if system_info is None:
+        system_info = load_host_facts()
+
+    step_inputs = {
+        'system_type': system_info.get('system_type'),
+        'system_version': system_info.get('system_version'),
+        'system_codename': system_info.get('system_codename'),
+        'system_family': system_info.get('system_family'),
+    }
+    if not run_journaled_step(
+        'docker',
+        step_inputs,
+        get_docker_result_files,
+        lambda: perform_docker_installation(system_info)
+    ):
+        return
+
+    tuning_inputs = {
+        'cpu_count': system_info.get('cpu_count'),
+        'mirror_candidates': list(DOCKER_REGISTRY_MIRROR_CANDIDATES),
+        'log_max_size': DOCKER_LOG_MAX_SIZE,
+        'log_max_file': DOCKER_LOG_MAX_FILE,
+    }
+    run_journaled_step(
+        'docker_tuning',
+        tuning_inputs,
+        [DOCKER_DAEMON_CONFIG_FILE],
+        lambda: tune_docker_daemon(system_info)
+    )
+
+
+def get_docker_result_files():
+    """
+    列出 Docker 安装完成后应该存在的文件。
+    """
+    candidate_files = [
+        '/etc/apt/keyrings/docker.asc',
+        '/etc/apt/sources.list.d/docker.list',
+        '/etc/yum.repos.d/docker-ce.repo',
+        shutil.which('docker'),
+        shutil.which('dockerd'),
+    ]
+    return [path for path in candidate_files if path and os.path.exists(path)]
+
+
+def perform_docker_installation(system_info):
+    """
+    真正执行 Docker 安装，成功返回 True。
+    """
+    print('[*] 准备安装 Docker...')
+    stop_package_prefetch()
+
+    if system_info['system_family'] == 'debian':
+        system_codename = system_info.get('system_codename') or ''
+        if system_codename in ['unknown', 'n/a', 'N/A', '']:
+            system_codename = normalize_debian_codename(system_info.get('system_version', ''), system_codename)
+
+        if not system_codename:
+            print('[!] 无法识别发行代号，暂时不能自动配置 Docker 官方仓库')
+            return False
+
+        docker_repo_os = 'ubuntu' if system_info.get('system_type') == 'ubuntu' else 'debian'
+        print(f'[*] 在 {docker_repo_os} 上使用 Docker 官方 APT 仓库安装...')
+        if not run_system_command(['apt', 'update']):
+            print('[!] apt update 失败，无法继续安装 Docker')
+            return False
+
+        if not run_system_command(['apt', 'install', '-y', 'ca-certificates', 'curl', 'gnupg']):
+            print('[!] Docker 依赖安装失败')
+            return False
+
+        print('[*] 准备 Docker 仓库密钥目录...')
+        make_directory('/etc/apt/keyrings')
+
+        print('[*] 下载 Docker 官方 GPG 密钥...')
+        if not download_file(f'https://download.docker.com/linux/{docker_repo_os}/gpg', '/etc/apt/keyrings/docker.asc'):
+            print('[!] Docker GPG 密钥下载失败')
+            return False
+
+        run_system_command(['chmod', 'a+r', '/etc/apt/keyrings/docker.asc'])
+
+        architecture = system_info.get('architecture') or get_command_output(['dpkg', '--print-architecture']).strip() or 'amd64'
+        docker_repo_content = (
+            f'deb [arch={architecture} signed-by=/etc/apt/keyrings/docker.asc] '
+            f'https://download.docker.com/linux/{docker_repo_os} {system_codename} stable\n'
+        )
+        write_text_file('/etc/apt/sources.list.d/docker.list', docker_repo_content)
+
+        print('[*] 更新 Docker 软件包索引...')
+        if not run_system_command(['apt', 'update']):
+            print('[!] Docker 仓库已写入，但 apt update 失败')
+            return False
+
+        if not run_system_command(['apt', 'install', '-y'] + DOCKER_APT_PACKAGES):
+            print('[!] Docker 安装失败')
+            return False
+
+        service_name = start_and_enable_service(['docker'])
+        if service_name:
+            print(f'[OK] {service_name} 服务已启动，并设置为开机自启')
+
+        print('[OK] Docker 安装完成')
+        return True
+
+    print('[*] 下载 Docker 安装脚本...')
+
+    if not download_file('https://xuanyuan.cloud/docker.sh', 'docker_install.sh'):
+        print('[!] Docker 安装脚本下载失败')
+        return False
+
+    print('[*] 添加执行权限...')
+    run_system_command(['chmod', '+x', 'docker_install.sh'])
+
+    print('[*] 执行安装脚本...')
+    if not run_system_command(['bash', 'docker_install.sh'], interactive=True):
+        print('[!] Docker 安装脚本执行失败')
+        return False
+
+    print('[OK] Docker 安装完成')
+    return True
+
+
+DOCKER_DAEMON_CONFIG_FILE = '/etc/docker/daemon.json'
+# 候选镜像加速地址，可以用环境变量 OPS_TOOLBOX_DOCKER_MIRRORS（逗号分隔）替换
+DOCKER_REGISTRY_MIRROR_CANDIDATES = tuple(
+    mirror.strip() for mirror in os.environ.get(
+        'OPS_TOOLBOX_DOCKER_MIRRORS',
+        'https://docker.m.daocloud.io,https://docker.1ms.run,https://dockerproxy.net,https://docker.xuanyuan.me'
+    ).split(',') if mirror.strip()
+)
+DOCKER_HUB_REGISTRY = 'https://registry-1.docker.io'
+DOCKER_MIRROR_PROBE_TIMEOUT = 3.0
+DOCKER_MIRROR_PROBE_ROUNDS = 3
+DOCKER_MAX_REGISTRY_MIRRORS = 3
+DOCKER_LOG_MAX_SIZE = '50m'
+DOCKER_LOG_MAX_FILE = '3'
+
+
+def measure_registry_latency(registry_url, timeout=DOCKER_MIRROR_PROBE_TIMEOUT):
+    """
+    请求镜像仓库的 /v2/ 接口，返回从发请求到收到响应的秒数，连不上返回 None。
+
+    /v2/ 是 docker pull 的第一个请求，未登录时返回 401 也说明仓库可用。
+    """
+    import urllib.error
+    import urllib.request
+
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f"{registry_url.rstrip('/')}/v2/", timeout=timeout):
+            pass
+    except urllib.error.HTTPError as error:
+        if error.code not in (401, 403):
+            return None
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+    return time.perf_counter() - started
+
+
+def rank_registry_mirrors(candidates=DOCKER_REGISTRY_MIRROR_CANDIDATES, rounds=DOCKER_MIRROR_PROBE_ROUNDS):
+    """
+    并发测量各镜像加速地址和 Docker Hub 本身的延迟，返回比直连 Docker Hub 更快的镜像（从快到慢）。
+
+    某一轮连不上的镜像直接淘汰；海外机器直连更快时返回空列表，也就是不配置加速。
+    """
+    import statistics
+    from concurrent.futures import ThreadPoolExecutor
+
+    registries = list(dict.fromkeys(list(candidates) + [DOCKER_HUB_REGISTRY]))
+    jobs = [registry for registry in registries for _ in range(rounds)]
+    with ThreadPoolExecutor(max_workers=min(32, len(jobs))) as pool:
+        latencies = list(pool.map(measure_registry_latency, jobs))
+
+    medians = {}
+    for registry in registries:
+        samples = [latency for job, latency in zip(jobs, latencies) if job == registry]
+        if all(latency is not None for latency in samples):
+            medians[registry] = statistics.median(samples)
+
+    for registry in registries:
+        latency = medians.get(registry)
+        label = 'Docker Hub 直连' if registry == DOCKER_HUB_REGISTRY else registry
+        print(f'    {label:<36} ' + (f'{latency * 1000:7.0f} ms' if latency is not None else '连接失败'))
+
+    hub_latency = medians.pop(DOCKER_HUB_REGISTRY, None)
+    ranked = sorted(medians, key=medians.get)
+    if hub_latency is not None:
+        ranked = [mirror for mirror in ranked if medians[mirror] < hub_latency]
+    return ranked
+
+
+def get_mount_fs_type(path, mounts_path='/proc/mounts'):
+    """
+    返回 path 所在挂载点的文件系统类型。
+    """
+    path = os.path.realpath(path)
+    best_match = ('', None)
+    try:
+        with open(mounts_path, 'r', encoding='utf-8', errors='replace') as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = _decode_mount_path(fields[1])
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) >= len(best_match[0]):
+                    best_match = (mount_point, fields[2])
+    except OSError:
+        pass
+    return best_match[1]
+
+
+def check_docker_storage_driver(existing_config):
+    """
+    检查 overlay2 存储驱动能否使用，有问题时打印提醒，不修改用户已有的 storage-driver 设置。
+    """
+    configured_driver = existing_config.get('storage-driver')
+    if configured_driver and configured_driver != 'overlay2':
+        print(f'[!] 提醒：daemon.json 已指定存储驱动 {configured_driver}，保持不变（更换驱动会看不到已有镜像）')
+        return
+
+    try:
+        with open('/proc/filesystems', 'r', encoding='utf-8') as file:
+            overlay_supported = 'overlay' in file.read()
+    except OSError:
+        overlay_supported = True
+    if not overlay_supported:
+        print('[!] 提醒：内核没有加载 overlay 模块，Docker 会退回到很慢的 vfs 驱动，请执行 modprobe overlay')
+
+    docker_root = '/var/lib/docker' if os.path.exists('/var/lib/docker') else '/var/lib'
+    if get_mount_fs_type(docker_root) == 'xfs' and check_command_exists('xfs_info'):
+        xfs_info = get_command_output(['xfs_info', docker_root])
+        if 'ftype=0' in xfs_info:
+            print(f'[!] 提醒：{docker_root} 所在的 XFS 是 ftype=0 格式，不支持 overlay2，需要重新格式化为 ftype=1')
+
+
+def build_docker_daemon_config(existing_config, system_info, ranked_mirrors, swarm_active=False):
+    """
+    在已有 daemon.json 的基础上合并性能参数，返回新的配置字典。
+
+    只改动这里管理的几个键，其他键原样保留；
+    镜像地址集合没变时保留原有顺序，保证重复执行得到完全相同的文件。
+    """
+    config = dict(existing_config)
+    cpu_count = system_info.get('cpu_count') or os.cpu_count() or 1
+
+    if ranked_mirrors:
+        preferred_mirrors = ranked_mirrors[:DOCKER_MAX_REGISTRY_MIRRORS]
+        existing_mirrors = list(existing_config.get('registry-mirrors', []))
+        if set(existing_mirrors[:len(preferred_mirrors)]) != set(preferred_mirrors):
+            extra_mirrors = [mirror for mirror in existing_mirrors if mirror not in preferred_mirrors]
+            config['registry-mirrors'] = preferred_mirrors + extra_mirrors
+
+    config['max-concurrent-downloads'] = min(10, max(3, cpu_count * 2))
+    config['max-concurrent-uploads'] = min(10, max(3, cpu_count))
+
+    if config.get('log-driver', 'json-file') in ('json-file', 'local'):
+        config.setdefault('log-driver', 'json-file')
+        log_options = dict(config.get('log-opts', {}))
+        log_options.update({'max-size': DOCKER_LOG_MAX_SIZE, 'max-file': DOCKER_LOG_MAX_FILE})
+        config['log-opts'] = log_options
+
+    # Swarm 模式下不支持 live-restore，开启会导致 dockerd 起不来
+    if not swarm_active:
+        config['live-restore'] = True
+    return config
+
+
+def validate_docker_daemon_config(config_path):
+    """
+    用 dockerd --validate 校验配置文件；旧版本 dockerd 不支持这个参数时只校验 JSON 格式。
+    """
+    if not check_command_exists('dockerd'):
+        return True
+    result = execute_command(['dockerd', '--validate', '--config-file', config_path], timeout=30, echo_output=False)
+    if result:
+        return True
+    error_text = '\n'.join(result.stderr_tail + result.stdout_tail)
+    if 'unknown flag' in error_text:
+        return True
+    print(f'[!] daemon.json 校验失败：{error_text.strip()}')
+    return False
+
+
+def tune_docker_daemon(system_info):
+    """
+    生成并合并 /etc/docker/daemon.json，校验通过后只重启一次 Docker，成功返回 True。
+    """
+    executor = get_command_executor()
+    config_path = executor.resolve_path(DOCKER_DAEMON_CONFIG_FILE)
+    existing_config = {}
+    if os.path.exists(config_path):
+        try:
+            with open(config_path, 'r', encoding='utf-8') as file:
+                existing_config = json.load(file)
+        except (OSError, ValueError) as error:
+            print(f'[!] 现有 {DOCKER_DAEMON_CONFIG_FILE} 无法解析（{error}），为避免覆盖用户配置，跳过调优')
+            return False
+
+    print('[*] 正在测量镜像加速地址的延迟...')
+    ranked_mirrors = rank_registry_mirrors()
+    if not ranked_mirrors:
+        print('[*] 没有比直连 Docker Hub 更快的镜像加速地址，不配置加速')
+
+    check_docker_storage_driver(existing_config)
+    swarm_state = get_command_output(['docker', 'info', '--format', '{{.Swarm.LocalNodeState}}'], timeout=30)
+    new_config = build_docker_daemon_config(existing_config, system_info, ranked_mirrors, swarm_state == 'active')
+
+    if new_config == existing_config:
+        print('[OK] daemon.json 已经是调优后的配置，无需重启 Docker')
+        return True
+
+    config_text = json.dumps(new_config, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    print('\n将写入的 daemon.json：')
+    print('=' * 50)
+    print(config_text.rstrip())
+    print('=' * 50)
+
+    make_directory(os.path.dirname(DOCKER_DAEMON_CONFIG_FILE))
+    temp_path = f'{DOCKER_DAEMON_CONFIG_FILE}.tmp'
+    write_text_file(temp_path, config_text)
+    if not validate_docker_daemon_config(executor.resolve_path(temp_path)):
+        os.remove(executor.resolve_path(temp_path))
+        return False
+
+    backup_path = backup_file_if_exists(DOCKER_DAEMON_CONFIG_FILE)
+    os.replace(executor.resolve_path(temp_path), config_path)
+
+    print('[*] 正在重启 Docker 使配置生效...')
+    if run_system_command(['systemctl', 'restart', 'docker'], timeout=180):
+        print('[OK] Docker 性能参数已生效')
+        return True
+
+    print('[!] Docker 重启失败，正在恢复原来的 daemon.json...')
+    if backup_path:
+        shutil.copy2(executor.resolve_path(backup_path), config_path)
+    else:
+        os.remove(config_path)
+    run_system_command(['systemctl', 'restart', 'docker'], timeout=180)
+    return False
+
+
+# --------------------------------------------
+# 第九部分（续）：Web 服务安装
+# Nginx 源码编译安装（带构建缓存）、Apache 安装调优
+# --------------------------------------------
+
+NGINX_VERSION = '1.26.2'
+NGINX_SHA256 = '627fe086209bba80a2853a0add9d958d7ebbdffa1a8467a5784c9a6b4f03d738'
+# {名称: (版本, 源码包 sha256)}，升级版本时两个值要一起改
+NGINX_DEPENDENCY_VERSIONS = {
+    'pcre2': ('10.44', '86b9cb0aa3bcb7994faa88018292bc704cdbb708e785f7c74352ff6ea7d3175b'),
+    'zlib': ('1.3.1', '9a93b2b7dfdac77ceba5a558a580e74667dd6fede4585b91eefb60f03b72df23'),
+    'openssl': ('3.0.15', '23c666d0edf20f14249b3d8f0368acaee9ab585b09e1de82107c66e1f3ec9533'),
+}
+NGINX_PREFIX = '/usr/local/nginx'
+NGINX_CONFIGURE_FLAGS = [
+    f'--prefix={NGINX_PREFIX}',
+    '--user=nginx',
+    '--group=nginx',
+    '--with-threads',
+    '--with-file-aio',
+    '--with-http_ssl_module',
+    '--with-http_v2_module',
+    '--with-http_realip_module',
+    '--with-http_stub_status_module',
+    '--with-http_gzip_static_module',
+    '--with-stream',
+    '--with-stream_ssl_module',
+    '--with-pcre-jit',
+]
+NGINX_SOURCE_CACHE_DIRECTORY = os.path.join(TOOLBOX_CACHE_DIR, 'sources')
+# 编译好的安装目录打包放在这里，按版本 + 编译参数 + 发行版区分；
+# 可以把这个目录共享（NFS）或复制给同发行版的其他机器
+NGINX_BUILD_CACHE_DIRECTORY = os.environ.get(
+    'OPS_TOOLBOX_BUILD_CACHE', os.path.join(TOOLBOX_CACHE_DIR, 'builds')
+)
+# 可选：存放构建产物的 HTTP 目录，本地没有缓存时先从这里找
+NGINX_BUILD_CACHE_URL = os.environ.get('OPS_TOOLBOX_BUILD_CACHE_URL')
+NGINX_BUILD_DIRECTORY = '/usr/local/src/ops_toolbox_build'
+NGINX_SYSTEMD_UNIT_FILE = '/etc/systemd/system/nginx.service'
+
+
+def get_nginx_source_urls():
+    """
+    返回 Nginx 及依赖库的源码包 {名称: (下载地址, 解压后的目录名, sha256)}。
+    """
+    pcre2_version, pcre2_sha256 = NGINX_DEPENDENCY_VERSIONS['pcre2']
+    zlib_version, zlib_sha256 = NGINX_DEPENDENCY_VERSIONS['zlib']
+    openssl_version, openssl_sha256 = NGINX_DEPENDENCY_VERSIONS['openssl']
+    return {
+        'nginx': (f'https://nginx.org/download/nginx-{NGINX_VERSION}.tar.gz', f'nginx-{NGINX_VERSION}',
+                  NGINX_SHA256),
+        'pcre2': (f'https://github.com/PCRE2Project/pcre2/releases/download/pcre2-{pcre2_version}/'
+                  f'pcre2-{pcre2_version}.tar.gz', f'pcre2-{pcre2_version}', pcre2_sha256),
+        # fossils 目录保留所有历史版本，新版本发布后地址也不会失效
+        'zlib': (f'https://zlib.net/fossils/zlib-{zlib_version}.tar.gz', f'zlib-{zlib_version}', zlib_sha256),
+        'openssl': (f'https://github.com/openssl/openssl/releases/download/openssl-{openssl_version}/'
+                    f'openssl-{openssl_version}.tar.gz', f'openssl-{openssl_version}', openssl_sha256),
+    }
+
+
+def get_nginx_build_key(system_info):
+    """
+    计算构建缓存的键：版本、依赖版本、编译参数、发行版和架构任何一个变了都要重新编译。
+    """
+    import hashlib
+
+    key_data = {
+        'nginx': NGINX_VERSION,
+        'dependencies': NGINX_DEPENDENCY_VERSIONS,
+        'flags': NGINX_CONFIGURE_FLAGS,
+        'system_type': system_info.get('system_type'),
+        'system_version': str(system_info.get('system_version', '')).split('.')[0],
+        'architecture': system_info.get('architecture') or os.uname().machine,
+    }
+    digest = hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"nginx-{NGINX_VERSION}-{key_data['system_type']}{key_data['system_version']}-" \
+           f"{key_data['architecture']}-{digest[:12]}"
+
+
+def read_nginx_artifact_checksum(artifact_path):
+    """
+    读取构建产物旁边的 <产物>.sha256（sha256sum 的输出格式），没有或格式不对时返回 None。
+    """
+    try:
+        with open(f'{artifact_path}.sha256', 'r', encoding='utf-8') as file:
+            fields = file.read().split()
+    except OSError:
+        return None
+    if not fields or len(fields[0]) != 64 or any(char not in '0123456789abcdef' for char in fields[0].lower()):
+        return None
+    return fields[0].lower()
+
+
+def verify_nginx_build_artifact(artifact_path):
+    """
+    用 <产物>.sha256 校验构建产物，缺少校验文件或不匹配都返回 False。
+    """
+    expected_digest = read_nginx_artifact_checksum(artifact_path)
+    if expected_digest is None:
+        print(f'[!] {os.path.basename(artifact_path)} 缺少 .sha256 校验文件，不使用这个构建缓存')
+        return False
+    if compute_file_digest(artifact_path, 'sha256') != expected_digest:
+        print(f'[!] {os.path.basename(artifact_path)} 校验失败，不使用这个构建缓存')
+        return False
+    return True
+
+
+def find_nginx_build_artifact(build_key):
+    """
+    查找构建产物：先找本地缓存目录，再试 OPS_TOOLBOX_BUILD_CACHE_URL，找不到返回 None。
+
+    产物必须带着 <产物>.sha256 且校验通过才会使用，因为安装时是以 root 身份解压的。
+    """
+    artifact_path = os.path.join(NGINX_BUILD_CACHE_DIRECTORY, f'{build_key}.tar.gz')
+    if os.path.exists(artifact_path) and verify_nginx_build_artifact(artifact_path):
+        return artifact_path
+    if NGINX_BUILD_CACHE_URL:
+        os.makedirs(NGINX_BUILD_CACHE_DIRECTORY, exist_ok=True)
+        print(f'[*] 本地没有可用的构建缓存，尝试从 {NGINX_BUILD_CACHE_URL} 获取...')
+        artifact_url = f"{NGINX_BUILD_CACHE_URL.rstrip('/')}/{build_key}.tar.gz"
+        if download_file(f'{artifact_url}.sha256', f'{artifact_path}.sha256'):
+            expected_digest = read_nginx_artifact_checksum(artifact_path)
+            if expected_digest is None:
+                print(f'[!] {artifact_url}.sha256 格式不对')
+            elif download_file(artifact_url, artifact_path, f'sha256:{expected_digest}'):
+                return artifact_path
+    return None
+
+
+def fetch_nginx_sources():
+    """
+    并发下载 Nginx 和 PCRE2 / zlib / OpenSSL 源码包，已经下载过的直接复用。
+
+    返回 {名称: 本地源码包路径}，有下载失败时返回 None。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    os.makedirs(NGINX_SOURCE_CACHE_DIRECTORY, exist_ok=True)
+    archives = {}
+    pending = []
+    for name, (url, _, sha256) in get_nginx_source_urls().items():
+        archive_path = os.path.join(NGINX_SOURCE_CACHE_DIRECTORY, os.path.basename(url))
+        archives[name] = archive_path
+        # 缓存里的源码包也要核对一遍，不对就删掉重新下载
+        if os.path.exists(archive_path) and compute_file_digest(archive_path, 'sha256') != sha256:
+            print(f'[!] 缓存的 {os.path.basename(archive_path)} 校验失败，重新下载')
+            os.remove(archive_path)
+        if not os.path.exists(archive_path):
+            pending.append((url, archive_path, f'sha256:{sha256}'))
+
+    if pending:
+        print(f'[*] 正在并发下载 {len(pending)} 个源码包...')
+        with SegmentedDownloader() as downloader, ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            results = list(pool.map(
+                lambda item: downloader.download(item[0], item[1], checksum=item[2], show_progress=False), pending
+            ))
+        if not all(results):
+            return None
+    return archives
+
+
+def get_nginx_build_packages(system_family):
+    """
+    编译 Nginx 需要的软件包（OpenSSL 3 的 Configure 脚本依赖 perl）。
+    """
+    if system_family == 'debian':
+        return ['build-essential', 'perl', 'tar']
+    return ['gcc', 'gcc-c++', 'make', 'perl', 'perl-IPC-Cmd', 'tar']
+
+
+def build_nginx_artifact(system_info, build_key):
+    """
+    下载源码、编译并把安装结果打包成构建缓存，成功返回产物路径，失败返回 None。
+
+    编译依赖的安装和源码下载同时进行；编译用 make -j<核数>，装了 ccache 时自动使用。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        source_future = pool.submit(fetch_nginx_sources)
+        packages_ready = PackageManager(system_info).install_packages(
+            get_nginx_build_packages(system_info['system_family'])
+        )
+        archives = source_future.result()
+    if not packages_ready:
+        print('[!] 编译依赖安装失败')
+        return None
+    if archives is None:
+        print('[!] 源码包下载失败')
+        return None
+
+    build_directory = os.path.join(NGINX_BUILD_DIRECTORY, build_key)
+    staging_directory = os.path.join(build_directory, 'staging')
+    run_system_command(['rm', '-rf', build_directory])
+    make_directory(staging_directory)
+    for archive_path in archives.values():
+        if not run_system_command(['tar', '-xzf', archive_path, '-C', build_directory]):
+            print(f'[!] 解压 {archive_path} 失败')
+            return None
+
+    source_directories = {name: os.path.join(build_directory, directory)
+                          for name, (_, directory, _) in get_nginx_source_urls().items()}
+    configure_command = ['./configure'] + NGINX_CONFIGURE_FLAGS + [
+        f"--with-pcre={source_directories['pcre2']}",
+        f"--with-zlib={source_directories['zlib']}",
+        f"--with-openssl={source_directories['openssl']}",
+    ]
+    # ccache 的 cc/gcc 替身目录放到 PATH 最前面，Nginx 和 OpenSSL 的编译都会经过 ccache
+    original_environment = {name: os.environ.get(name) for name in ('PATH', 'CCACHE_DIR')}
+    ccache_directory = next((path for path in ('/usr/lib/ccache', '/usr/lib64/ccache') if os.path.isdir(path)), None)
+    if ccache_directory:
+        print('[*] 检测到 ccache，编译时复用编译缓存')
+        os.environ['PATH'] = f"{ccache_directory}:{os.environ.get('PATH', '')}"
+        os.environ.setdefault('CCACHE_DIR', os.path.join(TOOLBOX_CACHE_DIR, 'ccache'))
+
+    cpu_count = system_info.get('cpu_count') or os.cpu_count() or 1
+    nginx_source = source_directories['nginx']
+    print(f'[*] 开始编译 Nginx {NGINX_VERSION}（{cpu_count} 个并发编译任务）...')
+    build_steps = [
+        configure_command,
+        ['make', f'-j{cpu_count}'],
+        ['make', 'install', f'DESTDIR={staging_directory}'],
+    ]
+    try:
+        for command in build_steps:
+            if not run_system_command(command, work_directory=nginx_source, timeout=3600):
+                print(f"[!] 编译失败：{' '.join(command[:2])}")
+                return None
+    finally:
+        for name, value in original_environment.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    # 构建缓存和源码缓存一样属于工具箱自己的缓存目录，不经过回放沙箱
+    os.makedirs(NGINX_BUILD_CACHE_DIRECTORY, exist_ok=True)
+    artifact_path = os.path.join(NGINX_BUILD_CACHE_DIRECTORY, f'{build_key}.tar.gz')
+    if not run_system_command(['tar', '-czf', f'{artifact_path}.tmp', '-C', staging_directory, '.']):
+        return None
+    if os.path.exists(f'{artifact_path}.tmp'):
+        os.replace(f'{artifact_path}.tmp', artifact_path)
+        # 校验文件用 sha256sum 的格式，其他机器也可以直接 sha256sum -c
+        with open(f'{artifact_path}.sha256', 'w', encoding='utf-8') as file:
+            file.write(f"{compute_file_digest(artifact_path, 'sha256')}  {os.path.basename(artifact_path)}\n")
+    run_system_command(['rm', '-rf', build_directory])
+    print(f'[OK] 构建产物已缓存：{artifact_path}')
+    print('[*] 把这个文件和同名的 .sha256 放到其他同发行版机器的构建缓存目录（或 OPS_TOOLBOX_BUILD_CACHE_URL）即可跳过编译')
+    return artifact_path
+
+
+def render_nginx_config(cpu_count, nofile_limit):
+    """
+    按 CPU 核数和文件句柄上限生成 nginx.conf。
+
+    反向代理时每个请求占用两个句柄（客户端和后端各一个），所以 worker_connections 取句柄上限的一半。
+    """
+    worker_connections = min(65535, max(1024, nofile_limit // 2))
+    return f"""# 由 Linux 运维工具箱生成
+user nginx;
+worker_processes {cpu_count};
+worker_cpu_affinity auto;
+worker_rlimit_nofile {nofile_limit};
+pid logs/nginx.pid;
+
+events {{
+    worker_connections {worker_connections};
+    multi_accept on;
+}}
+
+http {{
+    include       mime.types;
+    default_type  application/octet-stream;
+
+    sendfile        on;
+    tcp_nopush      on;
+    tcp_nodelay     on;
+    aio             threads;
+    keepalive_timeout  65;
+    keepalive_requests 1000;
+    server_tokens   off;
+
+    open_file_cache          max=10000 inactive=60s;
+    open_file_cache_valid    120s;
+    open_file_cache_errors   on;
+
+    gzip            on;
+    gzip_comp_level 5;
+    gzip_min_length 1024;
+    gzip_types      text/plain text/css application/json application/javascript text/xml application/xml image/svg+xml;
+
+    access_log  logs/access.log combined buffer=64k flush=5s;
+
+    server {{
+        listen       80 reuseport;
+        server_name  localhost;
+
+        location / {{
+            root   html;
+            index  index.html index.htm;
+        }}
+
+        location = /nginx_status {{
+            stub_status;
+            allow 127.0.0.1;
+            deny all;
+        }}
+    }}
+
+    include conf.d/*.conf;
+}}
+"""
+
+
+def render_nginx_systemd_unit(nofile_limit):
+    return f"""# 由 Linux 运维工具箱生成
+[Unit]
+Description=nginx - high performance web server
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+Type=forking
+PIDFile={NGINX_PREFIX}/logs/nginx.pid
+ExecStartPre={NGINX_PREFIX}/sbin/nginx -t
+ExecStart={NGINX_PREFIX}/sbin/nginx
+ExecReload={NGINX_PREFIX}/sbin/nginx -s reload
+ExecStop={NGINX_PREFIX}/sbin/nginx -s quit
+LimitNOFILE={nofile_limit}
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+
+def get_nginx_result_files():
+    """
+    列出 Nginx 安装完成后应该存在的文件。
+    """
+    return [f'{NGINX_PREFIX}/sbin/nginx', f'{NGINX_PREFIX}/conf/nginx.conf', NGINX_SYSTEMD_UNIT_FILE]
+
+
+def perform_nginx_installation(system_info):
+    """
+    真正执行 Nginx 安装：有构建缓存就直接解压，没有就编译一次并缓存，成功返回 True。
+    """
+    import resource
+
+    stop_package_prefetch()
+    build_key = get_nginx_build_key(system_info)
+    artifact_path = find_nginx_build_artifact(build_key)
+    if artifact_path:
+        print(f'[OK] 找到构建缓存 {os.path.basename(artifact_path)}，跳过编译')
+    else:
+        artifact_path = build_nginx_artifact(system_info, build_key)
+        if not artifact_path:
+            return False
+
+    # 构建产物里带着默认的 nginx.conf，解压前先备份现有配置
+    config_path = f'{NGINX_PREFIX}/conf/nginx.conf'
+    backup_path = backup_file_if_exists(config_path, f'{config_path}.backup')
+    if backup_path:
+        print(f'[*] 原有配置已备份到 {backup_path}')
+
+    # 先解压到临时目录，只把 usr/local/nginx 复制过去，不直接解压到 / 上，
+    # 免得产物里的其他路径（包括 ./ 本身的权限）覆盖到系统目录
+    print(f'[*] 正在安装到 {NGINX_PREFIX}...')
+    unpack_directory = os.path.join(NGINX_BUILD_DIRECTORY, f'{build_key}-unpack')
+    run_system_command(['rm', '-rf', unpack_directory])
+    make_directory(unpack_directory)
+    make_directory(NGINX_PREFIX)
+    # --remove-destination 先删后建，nginx 正在运行时也能替换二进制（否则会报 Text file busy）
+    installed = run_system_command(['tar', '-xzf', artifact_path, '-C', unpack_directory]) and run_system_command(
+        ['cp', '-a', '--remove-destination',
+         os.path.join(unpack_directory, NGINX_PREFIX.lstrip('/'), '.'), NGINX_PREFIX]
+    )
+    run_system_command(['rm', '-rf', unpack_directory])
+    if not installed:
+        print('[!] 解压构建产物失败')
+        return False
+
+    if not get_command_output(['id', '-u', 'nginx']):
+        run_system_command(['useradd', '--system', '--no-create-home', '--shell', '/sbin/nologin', 'nginx'])
+
+    # 句柄上限跟随系统（性能调优里设置过会更大），至少 65535
+    hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+    # RLIM_INFINITY 是 -1，要在取最大值之前单独处理
+    nofile_limit = 1048576 if hard_limit == resource.RLIM_INFINITY else max(65535, hard_limit)
+    cpu_count = system_info.get('cpu_count') or os.cpu_count() or 1
+
+    make_directory(f'{NGINX_PREFIX}/conf/conf.d')
+    write_text_file(config_path, render_nginx_config(cpu_count, nofile_limit))
+    make_directory(os.path.dirname(NGINX_SYSTEMD_UNIT_FILE))
+    write_text_file(NGINX_SYSTEMD_UNIT_FILE, render_nginx_systemd_unit(nofile_limit))
+
+    if not run_system_command([f'{NGINX_PREFIX}/sbin/nginx', '-t']):
+        print('[!] nginx.conf 校验失败')
+        return False
+
+    run_system_command(['systemctl', 'daemon-reload'])
+    if not run_system_command(['systemctl', 'enable', '--now', 'nginx']):
+        print('[!] Nginx 服务启动失败，请执行 journalctl -u nginx 查看原因')
+        return False
+    # 重复安装时服务已经在运行，重载一次让新配置生效
+    run_system_command(['systemctl', 'reload', 'nginx'])
+    print(f'[OK] Nginx {NGINX_VERSION} 安装完成：{cpu_count} 个 worker，句柄上限 {nofile_limit}')
+    return True
+
+
+@traced_action
+def install_nginx_from_source(system_info):
+    """
+    源码编译安装 Nginx
+
+    同一版本、同样编译参数、同一发行版第二次安装时直接使用构建缓存，几秒就能装好。
+    """
+    step_inputs = {
+        'build_key': get_nginx_build_key(system_info),
+        'cpu_count': system_info.get('cpu_count'),
+    }
+    run_journaled_step(
+        'nginx',
+        step_inputs,
+        get_nginx_result_files,
+        lambda: perform_nginx_installation(system_info)
+    )
+
+
+# Apache event MPM 调优参数
+APACHE_THREADS_PER_CHILD = 25
+# 估算每个工作线程占用的内存（MB），用来按内存限制 MaxRequestWorkers
+APACHE_MEMORY_PER_WORKER_MB = 2
+# 每个 CPU 核心最多分配的工作线程数
+APACHE_WORKERS_PER_CORE = 200
+APACHE_TUNING_FILE_NAME = 'ops-toolbox-tuning.conf'
+APACHE_BENCHMARK_CONCURRENCY = 32
+APACHE_BENCHMARK_REQUESTS = 3000
+
+
+def compute_apache_event_mpm(memory_total_kb, cpu_count):
+    """
+    按内存和 CPU 核数计算 event MPM 参数，返回 {指令名: 值}。
+
+    最多用一半内存给 Apache；MaxRequestWorkers 取内存和 CPU 两个上限里较小的那个，
+    并且是 ThreadsPerChild 的整数倍，ServerLimit 正好够用。
+    """
+    memory_mb = max(memory_total_kb // 1024, 512)
+    cpu_count = max(cpu_count or 1, 1)
+    threads_per_child = APACHE_THREADS_PER_CHILD
+
+    memory_workers = memory_mb // 2 // APACHE_MEMORY_PER_WORKER_MB
+    max_request_workers = min(memory_workers, cpu_count * APACHE_WORKERS_PER_CORE)
+    max_request_workers = max(threads_per_child * 6, max_request_workers // threads_per_child * threads_per_child)
+    server_limit = max_request_workers // threads_per_child
+
+    min_spare_threads = threads_per_child * min(server_limit, 2)
+    max_spare_threads = max(min_spare_threads + threads_per_child,
+                            max_request_workers // 4 // threads_per_child * threads_per_child)
+    return {
+        'StartServers': min(server_limit, max(2, cpu_count)),
+        'ServerLimit': server_limit,
+        'ThreadsPerChild': threads_per_child,
+        'ThreadLimit': threads_per_child,
+        'MaxRequestWorkers': max_request_workers,
+        'MinSpareThreads': min_spare_threads,
+        'MaxSpareThreads': max_spare_threads,
+        'MaxConnectionsPerChild': 10000,
+    }
+
+
+def render_apache_tuning(mpm_settings):
+    """
+    生成 Apache 调优配置：event MPM 参数、长连接和压缩。
+    """
+    mpm_lines = '\n'.join(f'    {name} {value}' for name, value in mpm_settings.items())
+    return f"""# 由 Linux 运维工具箱生成，重新安装 Apache 会覆盖本文件
+<IfModule mpm_event_module>
+{mpm_lines}
+</IfModule>
+
+KeepAlive On
+MaxKeepAliveRequests 1000
+KeepAliveTimeout 5
+EnableSendfile On
+HostnameLookups Off
+
+<IfModule mod_deflate.c>
+    DeflateCompressionLevel 5
+    AddOutputFilterByType DEFLATE text/html text/plain text/css text/xml
+    AddOutputFilterByType DEFLATE application/javascript application/json application/xml image/svg+xml
+</IfModule>
+"""
+
+
+def run_http_benchmark(url, concurrency=APACHE_BENCHMARK_CONCURRENCY, total_requests=APACHE_BENCHMARK_REQUESTS,
+                       timeout=10):
+    """
+    对 url 做一次简单压测：concurrency 个长连接并发发送 total_requests 个请求。
+
+    返回 {requests, errors, non_2xx, seconds, rps, p50_ms, p99_ms}。
+    压测客户端是 Python 线程，数值只用来确认服务能扛住并发、和调优前后对比，不代表服务器极限。
+    """
+    import http.client
+    import urllib.parse
+    from concurrent.futures import ThreadPoolExecutor
+
+    parsed = urllib.parse.urlsplit(url)
+    path = parsed.path or '/'
+    per_client = [total_requests // concurrency + (1 if index < total_requests % concurrency else 0)
+                  for index in range(concurrency)]
+
+    def run_client(request_count):
+        latencies = []
+        errors = 0
+        non_2xx = 0
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+        for _ in range(request_count):
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+                response = connection.getresponse()
+                response.read()
+                if not 200 <= response.status < 300:
+                    non_2xx += 1
+                if response.will_close:
+                    connection.close()
+            except (http.client.HTTPException, OSError):
+                errors += 1
+                connection.close()
+                continue
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+        return latencies, errors, non_2xx
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run_client, per_client))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    completed = len(latencies)
+    return {
+        'requests': completed,
+        'errors': sum(result[1] for result in results),
+        'non_2xx': sum(result[2] for result in results),
+        'seconds': elapsed,
+        'rps': completed / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': latencies[completed // 2] * 1000 if completed else 0.0,
+        'p99_ms': latencies[min(completed - 1, completed * 99 // 100)] * 1000 if completed else 0.0,
+    }
+
+
+def enable_apache_event_mpm(system_family):
+    """
+    切换到 event MPM，返回 Apache 调优配置文件的路径。
+    """
+    if system_family == 'debian':
+        # 装了依赖 prefork 的 mod_php 时 a2dismod 会失败，这里不中断安装
+        run_system_command(['a2dismod', '-q', 'mpm_prefork', 'mpm_worker'])
+        run_system_command(['a2enmod', '-q', 'mpm_event', 'deflate', 'headers'])
+        return f'/etc/apache2/conf-available/{APACHE_TUNING_FILE_NAME}'
+
+    # RedHat 系列在 00-mpm.conf 里三选一，注释掉其他两个
+    mpm_config = '/etc/httpd/conf.modules.d/00-mpm.conf'
+    run_system_command([
+        'sed', '-i', '-E',
+        '-e', r's/^(LoadModule mpm_(prefork|worker)_module)/#\1/',
+        '-e', r's/^#\s*(LoadModule mpm_event_module)/\1/',
+        mpm_config
+    ])
+    return f'/etc/httpd/conf.d/{APACHE_TUNING_FILE_NAME}'
+
+
+def perform_apache_installation(system_info):
+    """
+    真正执行 Apache 安装和调优，成功返回 True。
+    """
+    system_family = system_info['system_family']
+    if system_family == 'debian':
+        package_name, service_name = 'apache2', 'apache2'
+    elif system_family == 'redhat':
+        package_name, service_name = 'httpd', 'httpd'
+    else:
+        print('[!] 当前系统不支持自动安装 Apache')
+        return False
+
+    if not PackageManager(system_info).install_packages([package_name]):
+        print('[!] Apache 安装失败')
+        return False
+
+    print('[*] 切换到 event MPM...')
+    tuning_file = enable_apache_event_mpm(system_family)
+    mpm_settings = compute_apache_event_mpm(system_info.get('memory_total_kb') or 0, system_info.get('cpu_count'))
+    write_text_file(tuning_file, render_apache_tuning(mpm_settings))
+    if system_family == 'debian':
+        run_system_command(['a2enconf', '-q', os.path.splitext(APACHE_TUNING_FILE_NAME)[0]])
+
+    print('[*] event MPM 参数：')
+    for name, value in mpm_settings.items():
+        print(f'    {name} {value}')
+
+    if not run_system_command(['apachectl', 'configtest']):
+        print(f'[!] Apache 配置校验失败，请检查 {tuning_file}')
+        return False
+
+    start_and_enable_service([service_name])
+    # 切换 MPM 必须完全重启，reload 不生效
+    if not run_system_command(['systemctl', 'restart', service_name]):
+        print(f'[!] Apache 启动失败，请执行 journalctl -u {service_name} 查看原因')
+        return False
+
+    print(f'[OK] Apache 安装完成，最多同时处理 {mpm_settings["MaxRequestWorkers"]} 个请求')
+    if type(get_command_executor()) is CommandExecutor:
+        print(f'[*] 正在本机压测：{APACHE_BENCHMARK_CONCURRENCY} 个并发连接，共 {APACHE_BENCHMARK_REQUESTS} 个请求...')
+        time.sleep(1)
+        result = run_http_benchmark('http://127.0.0.1/')
+        print(f"[OK] {result['rps']:.0f} 请求/秒，P50 {result['p50_ms']:.1f} ms，P99 {result['p99_ms']:.1f} ms"
+              f"（失败 {result['errors']}，非 2xx {result['non_2xx']}）")
+        if result['non_2xx']:
+            print('[*] 非 2xx 通常是默认站点没有首页（比如返回 403 欢迎页），不影响压测结果')
+    return True
+
+
+def get_apache_result_files(system_family):
+    """
+    列出 Apache 安装完成后应该存在的文件。
+    """
+    if system_family == 'debian':
+        return [f'/etc/apache2/conf-available/{APACHE_TUNING_FILE_NAME}']
+    return [f'/etc/httpd/conf.d/{APACHE_TUNING_FILE_NAME}', '/etc/httpd/conf.modules.d/00-mpm.conf']
+
+
+@traced_action
+def install_apache_web_server(system_info):
+    """
+    安装 Apache，启用 event MPM 并按内存和 CPU 核数调优，最后在本机做一次压测。
+    """
+    step_inputs = {
+        'system_family': system_info.get('system_family'),
+        'system_type': system_info.get('system_type'),
+        'cpu_count': system_info.get('cpu_count'),
+        'memory_total_kb': system_info.get('memory_total_kb'),
+    }
+    run_journaled_step(
+        'apache',
+        step_inputs,
+        lambda: get_apache_result_files(system_info['system_family']),
+        lambda: perform_apache_installation(system_info)
+    )
+
+
+# --------------------------------------------
+# 第十部分：菜单系统
+# 提供上下键交互界面
+# --------------------------------------------
+
+@functools.lru_cache(maxsize=1024)
+def _measure_display_text(text):
+    """
+    计算字符串在终端里的显示宽度，以及每个字符结束处的累计宽度。
+
+    宽度按 Unicode 东亚宽度属性计算：全角/宽字符（中文、大部分 emoji）占 2 格，
+    组合附加符号、零宽字符和控制字符占 0 格，其余占 1 格。
+    结果按字符串缓存，菜单重画时同一个标签不用再逐字计算。
+    """
+    import unicodedata
+
+    boundaries = []
+    current_width = 0
+    for char in text:
+        if unicodedata.combining(char) or unicodedata.category(char) in ('Mn', 'Me', 'Cf', 'Cc'):
+            char_width = 0
+        elif unicodedata.east_asian_width(char) in ('W', 'F'):
+            char_width = 2
+        else:
+            char_width = 1
+        current_width += char_width
+        boundaries.append(current_width)
+    return current_width, tuple(boundaries)
+
+
+def _display_width(text):
+    """
+    计算字符串显示宽度。
+    """
+    return _measure_display_text(str(text))[0]
+
+
+def _truncate_display_text(text, max_width):
+    """
+    按显示宽度截断字符串，避免 curses 写出边界。
+
+    组合字符跟随前一个字符保留，不会把一个字拆成两半。
+    """
+    import bisect
+
+    if max_width <= 0:
+        return ''
+
+    text = str(text)
+    total_width, boundaries = _measure_display_text(text)
+    if total_width <= max_width:
+        return text
+    return text[:bisect.bisect_right(boundaries, max_width)]
+
+
+def _center_x(width, text):
+    return max(0, (width - _display_width(text)) // 2)
+
+
+def _safe_addstr(stdscr, row, column, text, style=0):
+    """
+    写一段文字；写到窗口右下角或窗口太小时 curses 会报错，这里直接忽略。
+    """
+    curses = load_curses()
+    try:
+        stdscr.addstr(row, column, text, style)
+    except curses.error:
+        pass
+
+
+def _option_label(option):
+    return option[0] if isinstance(option, tuple) else str(option)
+
+
+class _MenuScreen:
+    """
+    curses 菜单的绘制状态
+
+    整屏只在首次显示、窗口大小变化和列表滚动时重画；
+    平时上下移动只重画选中状态变化的那两行，
+    再用 noutrefresh/doupdate 一次性把差异发给终端，SSH 高延迟时也不会闪。
+    """
+
+    top_row = 6
+
+    def __init__(self, stdscr, title, options, subtitle):
+        self.curses = load_curses()
+        self.stdscr = stdscr
+        self.title = title
+        self.options = options
+        self.subtitle = subtitle
+        self.selected_index = 0
+        self.scroll_offset = 0
+        self.height, self.width = stdscr.getmaxyx()
+        self.has_colors = self.curses.has_colors()
+
+    @property
+    def visible_rows(self):
+        return max(1, self.height - 2 - self.top_row)
+
+    def _ensure_selection_visible(self):
+        """
+        调整滚动位置让选中项可见，返回滚动位置是否变化。
+        """
+        previous_offset = self.scroll_offset
+        if self.selected_index < self.scroll_offset:
+            self.scroll_offset = self.selected_index
+        elif self.selected_index >= self.scroll_offset + self.visible_rows:
+            self.scroll_offset = self.selected_index - self.visible_rows + 1
+        max_offset = max(0, len(self.options) - self.visible_rows)
+        self.scroll_offset = min(self.scroll_offset, max_offset)
+        return self.scroll_offset != previous_offset
+
+    def _draw_option(self, index):
+        row = self.top_row + index - self.scroll_offset
+        self.stdscr.move(row, 0)
+        self.stdscr.clrtoeol()
+
+        label = _truncate_display_text(_option_label(self.options[index]), max(0, self.width - 10))
+        if index == self.selected_index:
+            style = self.curses.A_BOLD | (self.curses.color_pair(1) if self.has_colors else self.curses.A_REVERSE)
+            _safe_addstr(self.stdscr, row, 4, '> ' + label, style)
+        else:
+            _safe_addstr(self.stdscr, row, 4, '  ' + label)
+
+    def _draw_scroll_hints(self):
+        curses = self.curses
+        hidden_above = self.scroll_offset
+        hidden_below = max(0, len(self.options) - self.scroll_offset - self.visible_rows)
+
+        self.stdscr.move(self.top_row - 1, 0)
+        self.stdscr.clrtoeol()
+        if hidden_above:
+            _safe_addstr(self.stdscr, self.top_row - 1, 4, f'↑ 上面还有 {hidden_above} 项', curses.A_DIM)
+
+        footer_text = '上/下选择   Enter 确认   Esc 返回'
+        if hidden_above or hidden_below:
+            footer_text = f'{footer_text}   ({self.selected_index + 1}/{len(self.options)})'
+        footer_text = _truncate_display_text(footer_text, max(0, self.width - 4))
+        self.stdscr.move(self.height - 2, 0)
+        self.stdscr.clrtoeol()
+        _safe_addstr(self.stdscr, self.height - 2, _center_x(self.width, footer_text), footer_text)
+
+    def draw_full(self):
+        """
+        重画整屏内容。
+        """
+        curses = self.curses
+        self.stdscr.erase()
+
+        title_text = _truncate_display_text(self.title, max(0, self.width - 4))
+        subtitle_text = _truncate_display_text(self.subtitle, max(0, self.width - 4))
+        _safe_addstr(self.stdscr, 1, _center_x(self.width, title_text), title_text, curses.A_BOLD)
+        _safe_addstr(self.stdscr, 3, _center_x(self.width, subtitle_text), subtitle_text,
+                     curses.color_pair(2) if self.has_colors else 0)
+        if self.width > 4 and self.height > 4:
+            self.stdscr.hline(4, 2, curses.ACS_HLINE, self.width - 4)
+
+        self._ensure_selection_visible()
+        last_index = min(len(self.options), self.scroll_offset + self.visible_rows)
+        for index in range(self.scroll_offset, last_index):
+            if self.top_row + index - self.scroll_offset < self.height - 2:
+                self._draw_option(index)
+        if self.height > self.top_row:
+            self._draw_scroll_hints()
+
+    def move_selection(self, new_index):
+        """
+        移动选中项；没有滚动时只重画新旧两行。
+        """
+        previous_index = self.selected_index
+        self.selected_index = new_index % len(self.options)
+        if self.selected_index == previous_index:
+            return
+
+        if self._ensure_selection_visible() or self.height - 2 <= self.top_row:
+            self.draw_full()
+            return
+
+        self._draw_option(previous_index)
+        self._draw_option(self.selected_index)
+        self._draw_scroll_hints()
+
+    def resize(self):
+        """
+        窗口大小变化后按新尺寸重画。
+        """
+        curses = self.curses
+        if hasattr(curses, 'update_lines_cols'):
+            curses.update_lines_cols()
+        self.height, self.width = self.stdscr.getmaxyx()
+        self.draw_full()
+
+    def flush(self):
+        self.stdscr.noutrefresh()
+        self.curses.doupdate()
+
+
+def _run_menu_screen(stdscr, title, options, subtitle='上下键选择，回车确认，Esc 返回'):
+    """
+    curses 菜单界面。
+    """
+    curses = load_curses()
+    curses.curs_set(0)
+    stdscr.keypad(True)
+
+    if curses.has_colors():
+        curses.start_color()
+        curses.use_default_colors()
+        curses.init_pair(1, curses.COLOR_BLACK, curses.COLOR_CYAN)
+        curses.init_pair(2, curses.COLOR_CYAN, -1)
+
+    screen = _MenuScreen(stdscr, title, options, subtitle)
+    screen.draw_full()
+
+    while True:
+        screen.flush()
+        if 'first_frame' not in STARTUP_TIMINGS:
+            STARTUP_TIMINGS['first_frame'] = time.perf_counter() - _MODULE_IMPORT_STARTED
+        key = stdscr.getch()
+
+        if key in (curses.KEY_UP, ord('k'), ord('K')):
+            screen.move_selection(screen.selected_index - 1)
+        elif key in (curses.KEY_DOWN, ord('j'), ord('J')):
+            screen.move_selection(screen.selected_index + 1)
+        elif key == curses.KEY_PPAGE:
+            screen.move_selection(max(0, screen.selected_index - screen.visible_rows))
+        elif key == curses.KEY_NPAGE:
+            screen.move_selection(min(len(options) - 1, screen.selected_index + screen.visible_rows))
+        elif key == curses.KEY_HOME:
+            screen.move_selection(0)
+        elif key == curses.KEY_END:
+            screen.move_selection(len(options) - 1)
+        elif key == curses.KEY_RESIZE:
+            screen.resize()
+        elif key in (10, 13, curses.KEY_ENTER):
+            selected_option = options[screen.selected_index]
+            if isinstance(selected_option, tuple):
+                return selected_option[1]
+            return selected_option
+        elif key == 27:
+            return None
+
+
+def select_menu_option(title, options, subtitle='上下键选择，回车确认，Esc 返回'):
+    """
+    使用 curses 提供菜单选择；不支持时退回到数字输入。
+    """
+    with trace_span(f'menu: {title}', 'menu'):
+        curses = load_curses()
+        if curses is not None:
+            try:
+                return curses.wrapper(_run_menu_screen, title, options, subtitle)
+            except curses.error:
+                pass
+
+        return _select_menu_option_by_number(title, options, subtitle)
+
+
+def _select_menu_option_by_number(title, options, subtitle):
+    """
+    没有 curses 可用时，用输入编号的方式选择。
+    """
+    print(f'\n{title}')
+    print(subtitle)
+    for index, option in enumerate(options, start=1):
+        print(f'  {index}. {_option_label(option)}')
+
+    fallback_choice = input('请输入编号: ').strip()
+    if not fallback_choice.isdigit():
+        return None
+
+    fallback_index = int(fallback_choice) - 1
+    if fallback_index < 0 or fallback_index >= len(options):
+        return None
+
+    selected_option = options[fallback_index]
+    if isinstance(selected_option, tuple):
+        return selected_option[1]
+    return selected_option
+
+
+def confirm_with_menu(prompt, default=True):
+    """
+    用菜单做是/否确认。
+    """
+    if default:
+        options = [('是', True), ('否', False)]
+    else:
+        options = [('否', False), ('是', True)]
+
+    result = select_menu_option(prompt, options, '上下键选择，回车确认')
+    if result is None:
+        return False
+    return result
+
+
+def clear_screen():
+    """
+    清屏。
+    """
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+
+def wait_for_enter(message='按回车继续...'):
+    """
+    等待用户确认后继续。
+    """
+    with trace_span('wait: enter', 'menu'):
+        input(f'\n{message}')
+
+
+# --------------------------------------------
+# 第十一部分（前置）：巡检数据采集
+# 纯 Python 读取日志和 /proc，不开子进程；所有路径都可以换成测试用的假目录
+# --------------------------------------------
+
+# 巡检告警阈值
+INSPECTION_DISK_ALERT_PERCENT = 90
+INSPECTION_MEMORY_ALERT_PERCENT = 90
+INSPECTION_SSH_FAILURE_ALERT_COUNT = 100
+
+# 需要关注的服务：(服务名, 对应的进程名)
+MONITORED_SERVICES = (
+    ('sshd', ('sshd',)),
+    ('cron', ('cron', 'crond')),
+    ('docker', ('dockerd',)),
+    ('mysql', ('mysqld', 'mariadbd')),
+    ('nginx', ('nginx',)),
+    ('apache', ('apache2', 'httpd')),
+)
+
+# wtmp 里每条登录记录的结构（glibc x86_64/aarch64 布局，每条 384 字节）
+WTMP_RECORD_FORMAT = '<hhi32s4s32s256shhiii4i20s'
+WTMP_USER_PROCESS = 7
+WTMP_BOOT_TIME = 2
+
+# 统计磁盘时忽略的伪文件系统
+PSEUDO_FILESYSTEM_TYPES = {
+    'proc', 'sysfs', 'devtmpfs', 'devpts', 'tmpfs', 'cgroup', 'cgroup2', 'securityfs',
+    'pstore', 'debugfs', 'tracefs', 'configfs', 'fusectl', 'mqueue', 'hugetlbfs',
+    'autofs', 'binfmt_misc', 'bpf', 'rpc_pipefs', 'nsfs', 'overlay', 'squashfs', 'ramfs',
+}
+
+
+def parse_auth_log_failures(log_path='/var/log/auth.log', top_n=10):
+    """
+    统计 SSH 登录失败记录，按来源 IP 计数。
+    
+    按块读取并且先用字节串快速过滤，几个 GB 的日志也不会整个读进内存。
+    
+    返回值：
+        {'total': 失败总次数, 'top_ips': [(IP, 次数), ...]}
+    """
+    import re
+    from collections import Counter
+
+    ip_pattern = re.compile(rb'Failed password for (?:invalid user )?\S+ from (\S+)')
+    ip_counter = Counter()
+    total = 0
+
+    try:
+        with open(log_path, 'rb') as file:
+            for line in file:
+                if b'Failed password' not in line:
+                    continue
+                total += 1
+                match = ip_pattern.search(line)
+                if match:
+                    ip_counter[match.group(1)] += 1
+    except OSError:
+        return {'total': 0, 'top_ips': []}
+
+    top_ips = [(ip.decode('ascii', errors='replace'), count) for ip, count in ip_counter.most_common(top_n)]
+    return {'total': total, 'top_ips': top_ips}
+
+
+def parse_wtmp_records(wtmp_path='/var/log/wtmp', top_n=3):
+    """
+    解析 wtmp 登录记录，统计登录来源 IP 和最近一次重启时间（相当于 last 命令）。
+    
+    返回值：
+        {'logins': 登录次数, 'top_ips': [(IP, 次数), ...], 'last_reboot': 时间戳或 None}
+    """
+    import struct
+    from collections import Counter
+
+    record = struct.Struct(WTMP_RECORD_FORMAT)
+    chunk_records = 4096
+    host_counter = Counter()
+    logins = 0
+    last_reboot = None
+
+    try:
+        with open(wtmp_path, 'rb') as file:
+            while True:
+                chunk = file.read(record.size * chunk_records)
+                usable = len(chunk) - len(chunk) % record.size
+                if usable <= 0:
+                    break
+                for fields in record.iter_unpack(memoryview(chunk)[:usable]):
+                    record_type = fields[0]
+                    if record_type == WTMP_USER_PROCESS:
+                        logins += 1
+                        host = fields[6].split(b'\0', 1)[0]
+                        if host:
+                            host_counter[host] += 1
+                    elif record_type == WTMP_BOOT_TIME:
+                        last_reboot = fields[10]
+    except OSError:
+        return {'logins': 0, 'top_ips': [], 'last_reboot': None}
+
+    top_ips = [(host.decode('ascii', errors='replace'), count) for host, count in host_counter.most_common(top_n)]
+    return {'logins': logins, 'top_ips': top_ips, 'last_reboot': last_reboot}
+
+
+def read_process_stat(proc_root, pid):
+    """
+    读取一个进程的名字、CPU 时间（时钟滴答）和常驻内存（页数）。
+    进程在读取过程中退出时返回 None。
+    """
+    try:
+        with open(f'{proc_root}/{pid}/stat', 'rb') as file:
+            stat_text = file.read()
+    except OSError:
+        return None
+
+    # 进程名在括号里，可能包含空格，所以从最后一个右括号切开
+    name_end = stat_text.rfind(b')')
+    if name_end < 0:
+        return None
+    name = stat_text[stat_text.find(b'(') + 1:name_end].decode('utf-8', errors='replace')
+    fields = stat_text[name_end + 2:].split()
+    try:
+        cpu_ticks = int(fields[11]) + int(fields[12])
+        rss_pages = int(fields[21])
+    except (IndexError, ValueError):
+        return None
+    return name, cpu_ticks, rss_pages
+
+
+def collect_process_stats(proc_root='/proc', top_n=5):
+    """
+    扫描所有进程，返回内存和 CPU 时间排行（相当于 ps aux --sort）。
+    
+    返回值：
+        {'count': 进程数, 'top_memory': [(pid, 名字, RSS 字节)], 'top_cpu': [(pid, 名字, CPU 滴答)],
+         'processes': {pid: (名字, CPU 滴答, RSS 页数)}}
+    """
+    import heapq
+
+    page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+    processes = {}
+    try:
+        entries = os.listdir(proc_root)
+    except OSError:
+        entries = []
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        stat = read_process_stat(proc_root, entry)
+        if stat is not None:
+            processes[int(entry)] = stat
+
+    top_memory = heapq.nlargest(top_n, processes.items(), key=lambda item: item[1][2])
+    top_cpu = heapq.nlargest(top_n, processes.items(), key=lambda item: item[1][1])
+    return {
+        'count': len(processes),
+        'top_memory': [(pid, stat[0], stat[2] * page_size) for pid, stat in top_memory],
+        'top_cpu': [(pid, stat[0], stat[1]) for pid, stat in top_cpu],
+        'processes': processes,
+    }
+
+
+def _decode_mount_path(raw_path):
+    """
+    /proc/mounts 里空格等字符用八进制转义（\\040），这里还原。
+    """
+    import re
+
+    if '\\' not in raw_path:
+        return raw_path
+    # 只还原三位八进制转义；路径里的中文等字符原样保留
+    return re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), raw_path)
+
+
+def collect_mount_usage(mounts_path='/proc/mounts'):
+    """
+    读取挂载点列表并统计使用率（相当于 df）。
+    
+    返回值：
+        [{'device', 'mount_point', 'fs_type', 'total_bytes', 'used_bytes', 'used_percent'}, ...]
+    """
+    usage_list = []
+    seen_mount_points = set()
+    try:
+        with open(mounts_path, 'r', encoding='utf-8', errors='replace') as file:
+            mount_lines = file.readlines()
+    except OSError:
+        return usage_list
+
+    for line in mount_lines:
+        fields = line.split()
+        if len(fields) < 3 or fields[2] in PSEUDO_FILESYSTEM_TYPES:
+            continue
+        mount_point = _decode_mount_path(fields[1])
+        if mount_point in seen_mount_points:
+            continue
+        seen_mount_points.add(mount_point)
+        try:
+            stats = os.statvfs(mount_point)
+        except OSError:
+            continue
+        total_bytes = stats.f_blocks * stats.f_frsize
+        if total_bytes <= 0:
+            continue
+        free_bytes = stats.f_bfree * stats.f_frsize
+        available_bytes = stats.f_bavail * stats.f_frsize
+        used_bytes = total_bytes - free_bytes
+        # 和 df 一样，按“已用 / (已用 + 普通用户可用)”计算
+        usable_bytes = used_bytes + available_bytes
+        used_percent = round(used_bytes * 100 / usable_bytes, 1) if usable_bytes else 0.0
+        usage_list.append({
+            'device': fields[0],
+            'mount_point': mount_point,
+            'fs_type': fields[2],
+            'total_bytes': total_bytes,
+            'used_bytes': used_bytes,
+            'used_percent': used_percent,
+        })
+
+    return usage_list
+
+
+def collect_network_counters(net_dev_path='/proc/net/dev'):
+    """
+    读取每块网卡的收发字节和包数。
+    
+    返回值：
+        {网卡名: {'rx_bytes', 'rx_packets', 'tx_bytes', 'tx_packets'}}
+    """
+    try:
+        with open(net_dev_path, 'r', encoding='utf-8') as file:
+            return parse_network_counters(file.read())
+    except OSError:
+        return {}
+
+
+def parse_network_counters(net_dev_text):
+    """
+    解析 /proc/net/dev 的内容。
+    """
+    counters = {}
+    for line in net_dev_text.splitlines()[2:]:
+        name, _, values = line.partition(':')
+        fields = values.split()
+        if len(fields) < 16:
+            continue
+        counters[name.strip()] = {
+            'rx_bytes': int(fields[0]),
+            'rx_packets': int(fields[1]),
+            'tx_bytes': int(fields[8]),
+            'tx_packets': int(fields[9]),
+        }
+    return counters
+
+
+def collect_memory_info(meminfo_path='/proc/meminfo'):
+    """
+    读取内存信息，返回 KB 为单位的字典，并计算使用率。
+    """
+    try:
+        with open(meminfo_path, 'r', encoding='utf-8') as file:
+            return parse_memory_info(file.read())
+    except OSError:
+        return {}
+
+
+def parse_memory_info(meminfo_text):
+    """
+    解析 /proc/meminfo 的内容。
+    """
+    memory_info = {}
+    for line in meminfo_text.splitlines():
+        key, _, value = line.partition(':')
+        parts = value.split()
+        if parts and parts[0].isdigit():
+            memory_info[key] = int(parts[0])
+
+    total = memory_info.get('MemTotal', 0)
+    available = memory_info.get('MemAvailable', memory_info.get('MemFree', 0))
+    memory_info['used_percent'] = round((total - available) * 100 / total, 1) if total else 0.0
+    return memory_info
+
+
+def collect_load_average(loadavg_path='/proc/loadavg'):
+    """
+    读取 1/5/15 分钟平均负载。
+    """
+    try:
+        with open(loadavg_path, 'r', encoding='utf-8') as file:
+            return parse_load_average(file.read())
+    except OSError:
+        return (0.0, 0.0, 0.0)
+
+
+def parse_load_average(loadavg_text):
+    """
+    解析 /proc/loadavg 的内容。
+    """
+    try:
+        return tuple(float(value) for value in loadavg_text.split()[:3])
+    except ValueError:
+        return (0.0, 0.0, 0.0)
+
+
+def collect_service_states(process_names):
+    """
+    根据正在运行的进程名判断常用服务是否在运行，返回 {服务名: 是否运行}。
+    """
+    return {
+        service_name: any(process_name in process_names for process_name in service_process_names)
+        for service_name, service_process_names in MONITORED_SERVICES
+    }
+
+
+def collect_inspection_summary(proc_root='/proc', auth_log_path=None):
+    """
+    采集一份结构化的巡检结果，供汇总服务和历史记录使用。
+    
+    返回值：
+        {'host', 'timestamp', 'metrics': {指标名: 数值}, 'services': {服务名: 是否运行},
+         'top_ips': [(IP, 失败次数)], 'findings': [{'key', 'message'}]}
+    """
+    if auth_log_path is None:
+        auth_log_path = '/var/log/auth.log' if os.path.exists('/var/log/auth.log') else '/var/log/secure'
+
+    metrics = {}
+    for mount in collect_mount_usage(f'{proc_root}/mounts'):
+        metrics[f"disk_used_percent:{mount['mount_point']}"] = mount['used_percent']
+    memory_info = collect_memory_info(f'{proc_root}/meminfo')
+    metrics['memory_used_percent'] = memory_info.get('used_percent', 0.0)
+    swap_total = memory_info.get('SwapTotal', 0)
+    metrics['swap_used_percent'] = round(
+        (swap_total - memory_info.get('SwapFree', 0)) * 100 / swap_total, 1
+    ) if swap_total else 0.0
+    metrics['load_1'], metrics['load_5'], metrics['load_15'] = collect_load_average(f'{proc_root}/loadavg')
+    metrics['cpu_count'] = os.cpu_count() or 1
+
+    process_stats = collect_process_stats(proc_root)
+    metrics['process_count'] = process_stats['count']
+    process_names = {stat[0] for stat in process_stats['processes'].values()}
+
+    auth_failures = parse_auth_log_failures(auth_log_path, top_n=5)
+    metrics['ssh_failed_logins'] = auth_failures['total']
+
+    summary = {
+        'host': os.uname().nodename,
+        'timestamp': time.time(),
+        'metrics': metrics,
+        'services': collect_service_states(process_names),
+        'top_ips': auth_failures['top_ips'],
+    }
+    summary['findings'] = evaluate_inspection_findings(summary)
+    return summary
+
+
+def evaluate_inspection_findings(summary):
+    """
+    按阈值从巡检结果里找出异常项。
+    
+    key 相同的异常在汇总时会合并，所以 key 里不能带主机相关的数值。
+    """
+    findings = []
+    metrics = summary['metrics']
+    for metric_name, value in metrics.items():
+        if metric_name.startswith('disk_used_percent:') and value >= INSPECTION_DISK_ALERT_PERCENT:
+            mount_point = metric_name.partition(':')[2]
+            findings.append({'key': f'disk:{mount_point}',
+                             'message': f'磁盘 {mount_point} 使用率超过 {INSPECTION_DISK_ALERT_PERCENT}%'})
+
+    if metrics.get('memory_used_percent', 0.0) >= INSPECTION_MEMORY_ALERT_PERCENT:
+        findings.append({'key': 'memory', 'message': f'内存使用率超过 {INSPECTION_MEMORY_ALERT_PERCENT}%'})
+    if metrics.get('load_5', 0.0) > metrics.get('cpu_count', 1):
+        findings.append({'key': 'load', 'message': '5 分钟负载超过 CPU 核数'})
+    if metrics.get('ssh_failed_logins', 0) >= INSPECTION_SSH_FAILURE_ALERT_COUNT:
+        findings.append({'key': 'ssh_failures',
+                         'message': f'SSH 登录失败超过 {INSPECTION_SSH_FAILURE_ALERT_COUNT} 次'})
+    return findings
+
+
+# --------------------------------------------
+# 第十一部分（前置）：实时监控面板
+# 类似 top 的界面，每秒从 /proc 读取一次，不开任何子进程
+# --------------------------------------------
+
+DASHBOARD_REFRESH_SECONDS = 1.0
+
+
+class ProcFileReader:
+    """
+    反复读取同一个 /proc 文件
+
+    文件只打开一次，之后每次用 pread 从头读，省掉每秒重复的 open/close。
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.fd = None
+
+    def read(self):
+        """
+        读取文件全部内容，文件不存在时返回空字符串。
+        """
+        if self.fd is None:
+            try:
+                self.fd = os.open(self.file_path, os.O_RDONLY)
+            except OSError:
+                return ''
+
+        chunks = []
+        offset = 0
+        try:
+            while True:
+                chunk = os.pread(self.fd, 65536, offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+        except OSError:
+            self.close()
+            return ''
+        return b''.join(chunks).decode('utf-8', errors='replace')
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def parse_cpu_times(stat_text):
+    """
+    解析 /proc/stat 的 cpu 行，返回 {cpu名: (忙碌滴答, 总滴答)}。
+    """
+    cpu_times = {}
+    for line in stat_text.splitlines():
+        if not line.startswith('cpu'):
+            break
+        fields = line.split()
+        values = [int(value) for value in fields[1:9]]
+        idle_ticks = values[3] + (values[4] if len(values) > 4 else 0)
+        total_ticks = sum(values)
+        cpu_times[fields[0]] = (total_ticks - idle_ticks, total_ticks)
+    return cpu_times
+
+
+def parse_disk_sectors(diskstats_text, disk_names):
+    """
+    解析 /proc/diskstats，返回 {磁盘名: (读扇区数, 写扇区数)}，只保留 disk_names 里的整块磁盘。
+    """
+    sectors = {}
+    for line in diskstats_text.splitlines():
+        fields = line.split()
+        if len(fields) >= 10 and fields[2] in disk_names:
+            sectors[fields[2]] = (int(fields[5]), int(fields[9]))
+    return sectors
+
+
+def list_physical_disks(sys_block_path='/sys/block'):
+    """
+    列出整块磁盘的名字（不含分区、loop 和 ram 设备）。
+    """
+    try:
+        names = os.listdir(sys_block_path)
+    except OSError:
+        return set()
+    return {name for name in names if not name.startswith(('loop', 'ram', 'zram'))}
+
+
+class DashboardSampler:
+    """
+    监控面板的数据采集
+
+    每次 sample() 读一遍 /proc，和上一次的计数相减得到 CPU 使用率、磁盘和网卡速率、
+    进程 CPU 占用。/proc 下的全局文件一直保持打开。
+    """
+
+    def __init__(self, proc_root='/proc', sys_block_path='/sys/block'):
+        self.proc_root = proc_root
+        self.stat_reader = ProcFileReader(f'{proc_root}/stat')
+        self.meminfo_reader = ProcFileReader(f'{proc_root}/meminfo')
+        self.loadavg_reader = ProcFileReader(f'{proc_root}/loadavg')
+        self.uptime_reader = ProcFileReader(f'{proc_root}/uptime')
+        self.net_dev_reader = ProcFileReader(f'{proc_root}/net/dev')
+        self.diskstats_reader = ProcFileReader(f'{proc_root}/diskstats')
+        self.disk_names = list_physical_disks(sys_block_path)
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.previous = None
+
+    def _read_processes(self):
+        processes = {}
+        try:
+            entries = os.listdir(self.proc_root)
+        except OSError:
+            return processes
+        for entry in entries:
+            if entry.isdigit():
+                stat = read_process_stat(self.proc_root, entry)
+                if stat is not None:
+                    processes[int(entry)] = stat
+        return processes
+
+    def sample(self, top_n=8):
+        """
+        采集一次，返回面板要显示的数据。第一次采集没有上一次可比，速率都是 0。
+        """
+        now = time.monotonic()
+        counters = {
+            'time': now,
+            'cpu': parse_cpu_times(self.stat_reader.read()),
+            'disks': parse_disk_sectors(self.diskstats_reader.read(), self.disk_names),
+            'network': parse_network_counters(self.net_dev_reader.read()),
+            'processes': self._read_processes(),
+        }
+        previous = self.previous or counters
+        self.previous = counters
+        elapsed = max(now - previous['time'], 1e-6)
+
+        cpu_usage = {}
+        for cpu_name, (busy_ticks, total_ticks) in counters['cpu'].items():
+            previous_busy, previous_total = previous['cpu'].get(cpu_name, (busy_ticks, total_ticks))
+            total_delta = total_ticks - previous_total
+            cpu_usage[cpu_name] = (busy_ticks - previous_busy) * 100 / total_delta if total_delta > 0 else 0.0
+
+        disk_rates = {}
+        for disk_name, (read_sectors, write_sectors) in sorted(counters['disks'].items()):
+            previous_read, previous_write = previous['disks'].get(disk_name, (read_sectors, write_sectors))
+            disk_rates[disk_name] = (
+                (read_sectors - previous_read) * 512 / elapsed,
+                (write_sectors - previous_write) * 512 / elapsed,
+            )
+
+        network_rates = {}
+        for interface_name, interface_counters in sorted(counters['network'].items()):
+            if interface_name == 'lo':
+                continue
+            previous_counters = previous['network'].get(interface_name, interface_counters)
+            network_rates[interface_name] = (
+                (interface_counters['rx_bytes'] - previous_counters['rx_bytes']) / elapsed,
+                (interface_counters['tx_bytes'] - previous_counters['tx_bytes']) / elapsed,
+            )
+
+        process_usage = []
+        process_names = set()
+        for pid, (name, cpu_ticks, rss_pages) in counters['processes'].items():
+            process_names.add(name)
+            previous_stat = previous['processes'].get(pid)
+            previous_ticks = previous_stat[1] if previous_stat and previous_stat[0] == name else cpu_ticks
+            cpu_percent = (cpu_ticks - previous_ticks) * 100 / (self.clock_ticks * elapsed)
+            process_usage.append((cpu_percent, rss_pages * self.page_size, pid, name))
+        process_usage.sort(reverse=True)
+
+        uptime_fields = self.uptime_reader.read().split()
+        return {
+            'cpu_usage': cpu_usage,
+            'memory': parse_memory_info(self.meminfo_reader.read()),
+            'load': parse_load_average(self.loadavg_reader.read()),
+            'uptime_seconds': float(uptime_fields[0]) if uptime_fields else 0.0,
+            'disk_rates': disk_rates,
+            'network_rates': network_rates,
+            'process_count': len(counters['processes']),
+            'top_processes': process_usage[:top_n],
+            'services': list(collect_service_states(process_names).items()),
+        }
+
+    def close(self):
+        for reader in (self.stat_reader, self.meminfo_reader, self.loadavg_reader,
+                       self.uptime_reader, self.net_dev_reader, self.diskstats_reader):
+            reader.close()
+
+
+def _format_bytes(byte_count):
+    """
+    把字节数格式化成 B/K/M/G。
+    """
+    for unit in ('B', 'K', 'M', 'G'):
+        if abs(byte_count) < 1024:
+            return f'{byte_count:.0f}{unit}' if unit == 'B' else f'{byte_count:.1f}{unit}'
+        byte_count /= 1024
+    return f'{byte_count:.1f}T'
+
+
+def _usage_bar(percent, bar_width):
+    filled = int(round(max(0.0, min(percent, 100.0)) * bar_width / 100))
+    return '[' + '|' * filled + ' ' * (bar_width - filled) + ']'
+
+
+def format_dashboard_lines(snapshot, width):
+    """
+    把一次采集结果排成若干行文字，返回 [(文字, 样式)]，样式为 'title'、'header'、'alert' 或 ''。
+    """
+    lines = []
+    uptime_minutes = int(snapshot['uptime_seconds'] // 60)
+    load_1, load_5, load_15 = snapshot['load']
+    lines.append((f"实时监控  {time.strftime('%H:%M:%S')}  已运行 {uptime_minutes // 1440} 天 "
+                  f"{uptime_minutes // 60 % 24:02d}:{uptime_minutes % 60:02d}  "
+                  f"负载 {load_1:.2f} {load_5:.2f} {load_15:.2f}  进程 {snapshot['process_count']}", 'title'))
+    lines.append(('', ''))
+
+    cpu_usage = snapshot['cpu_usage']
+    core_names = sorted((name for name in cpu_usage if name != 'cpu'), key=lambda name: int(name[3:] or 0))
+    bar_width = 20
+    cell_width = bar_width + 16
+    columns = max(1, width // cell_width)
+    total_percent = cpu_usage.get('cpu', 0.0)
+    lines.append((f"CPU 总计 {total_percent:5.1f}% {_usage_bar(total_percent, bar_width)}",
+                  'alert' if total_percent >= 90 else 'header'))
+    for row_start in range(0, len(core_names), columns):
+        cells = []
+        for core_name in core_names[row_start:row_start + columns]:
+            percent = cpu_usage[core_name]
+            cells.append(f'{core_name:>6} {percent:5.1f}% {_usage_bar(percent, bar_width)}'.ljust(cell_width))
+        lines.append((''.join(cells).rstrip(), ''))
+
+    memory = snapshot['memory']
+    swap_used_kb = memory.get('SwapTotal', 0) - memory.get('SwapFree', 0)
+    lines.append((f"内存 {memory.get('used_percent', 0.0):5.1f}% {_usage_bar(memory.get('used_percent', 0.0), bar_width)} "
+                  f"总计 {_format_bytes(memory.get('MemTotal', 0) * 1024)}  "
+                  f"可用 {_format_bytes(memory.get('MemAvailable', 0) * 1024)}  "
+                  f"缓存 {_format_bytes(memory.get('Cached', 0) * 1024)}  "
+                  f"交换 {_format_bytes(swap_used_kb * 1024)}/{_format_bytes(memory.get('SwapTotal', 0) * 1024)}",
+                  'alert' if memory.get('used_percent', 0.0) >= 90 else ''))
+    lines.append(('', ''))
+
+    io_cells = [f'{name} 读 {_format_bytes(read_rate)}/s 写 {_format_bytes(write_rate)}/s'
+                for name, (read_rate, write_rate) in snapshot['disk_rates'].items()]
+    io_cells += [f'{name} 收 {_format_bytes(rx_rate)}/s 发 {_format_bytes(tx_rate)}/s'
+                 for name, (rx_rate, tx_rate) in snapshot['network_rates'].items()]
+    lines.append(('磁盘 / 网络', 'header'))
+    for row_start in range(0, len(io_cells), columns):
+        lines.append(('  '.join(cell.ljust(cell_width - 2) for cell in io_cells[row_start:row_start + columns]).rstrip(), ''))
+    lines.append(('', ''))
+
+    service_text = '  '.join(f"{label} {'● 运行' if running else '○ 未运行'}" for label, running in snapshot['services'])
+    lines.append((f'服务  {service_text}', ''))
+    lines.append(('', ''))
+
+    lines.append((f"{'PID':>7}  {'CPU%':>6}  {'内存':>6}  名称", 'header'))
+    for cpu_percent, rss_bytes, pid, name in snapshot['top_processes']:
+        lines.append((f'{pid:>7}  {cpu_percent:6.1f}  {_format_bytes(rss_bytes):>8}  {name}',
+                      'alert' if cpu_percent >= 90 else ''))
+    return lines
+
+
+def _run_dashboard_screen(stdscr, sampler, refresh_seconds):
+    """
+    监控面板的 curses 界面。
+
+    每行和上一帧比较，只重写变了的行；行内没变的字符由 curses 的 doupdate 跳过。
+    """
+    curses = load_curses()
+    curses.curs_set(0)
+    stdscr.keypad(True)
+    stdscr.timeout(int(refresh_seconds * 1000))
+
+    styles = {'': 0, 'title': curses.A_BOLD, 'header': curses.A_BOLD, 'alert': curses.A_BOLD}
+    if curses.has_colors():
+        curses.start_color()
+        curses.use_default_colors()
+        curses.init_pair(3, curses.COLOR_RED, -1)
+        curses.init_pair(2, curses.COLOR_CYAN, -1)
+        styles['header'] = curses.A_BOLD | curses.color_pair(2)
+        styles['alert'] = curses.A_BOLD | curses.color_pair(3)
+
+    previous_lines = []
+    next_sample_at = 0.0
+    stdscr.erase()
+
+    while True:
+        if time.monotonic() >= next_sample_at:
+            next_sample_at = time.monotonic() + refresh_seconds
+            height, width = stdscr.getmaxyx()
+            lines = format_dashboard_lines(sampler.sample(), width)[:max(0, height - 1)]
+            lines.append(('q / Esc 返回    每秒刷新', 'header'))
+            lines += [('', '')] * max(0, len(previous_lines) - len(lines))
+
+            for row, line in enumerate(lines):
+                if row < len(previous_lines) and previous_lines[row] == line:
+                    continue
+                text, style_name = line
+                stdscr.move(row, 0)
+                stdscr.clrtoeol()
+                _safe_addstr(stdscr, row, 0, _truncate_display_text(text, width - 1), styles[style_name])
+            previous_lines = lines
+            stdscr.noutrefresh()
+            curses.doupdate()
+
+        key = stdscr.getch()
+        if key in (ord('q'), ord('Q'), 27):
+            return
+        if key == curses.KEY_RESIZE:
+            if hasattr(curses, 'update_lines_cols'):
+                curses.update_lines_cols()
+            stdscr.erase()
+            previous_lines = []
+            next_sample_at = 0.0
+
+
+@traced_action
+def show_live_dashboard():
+    """
+    显示实时监控面板；没有 curses 时打印一次快照。
+    """
+    sampler = DashboardSampler()
+    try:
+        curses = load_curses()
+        if curses is not None:
+            try:
+                curses.wrapper(_run_dashboard_screen, sampler, DASHBOARD_REFRESH_SECONDS)
+                return
+            except curses.error:
+                pass
+
+        sampler.sample()
+        time.sleep(DASHBOARD_REFRESH_SECONDS)
+        for text, _ in format_dashboard_lines(sampler.sample(), shutil.get_terminal_size().columns):
+            print(text)
+    finally:
+        sampler.close()
+
+
+# --------------------------------------------
+# 第十一部分：系统巡检功能
+# 检查系统运行状态
+# --------------------------------------------
+
+# 巡检输出在内存里最多保留的行数（用于微信通知，日志文件里是完整的）
+CHECK_REPORT_MAX_LINES = 2000
+
+
+@traced_action
+def run_system_check():
+    """
+    执行系统巡检，并可选发送微信通知。
+    """
+    from collections import deque
+
+    print('[*] 准备执行系统巡检...')
+
+    if not os.path.exists('check_system.sh'):
+        print('[!] 当前目录没有找到 check_system.sh，暂时无法执行巡检')
+        return
+
+    # 配置了汇总服务时由汇总服务统一发微信，这里不再单独推送
+    push_to_wechat = not REPORT_AGGREGATOR_URL and confirm_with_menu('是否推送微信告警？', default=False)
+
+    print('[*] 正在执行巡检脚本...')
+    print('\n' + '=' * 60)
+    print('巡检结果')
+    print('=' * 60)
+    # 输出一边显示一边写日志；内存里只保留最后 CHECK_REPORT_MAX_LINES 行，用于微信通知
+    report_lines = deque(maxlen=CHECK_REPORT_MAX_LINES)
+    with open('check_system.log', 'w', encoding='utf-8') as log_file:
+        def tee_line(line):
+            log_file.write(line + '\n')
+            report_lines.append(line)
+
+        result = execute_command(['bash', 'check_system.sh'], line_callback=tee_line)
+    print('=' * 60)
+
+    if result.timed_out:
+        print(f'[!] 巡检脚本执行超时（已运行 {result.duration:.0f} 秒），已终止')
+    elif not result:
+        print(f'[!] 巡检脚本执行失败（退出码 {result.returncode}）')
+
+    summary = collect_inspection_summary()
+    record_inspection_history([summary])
+    if REPORT_AGGREGATOR_URL:
+        print('[*] 正在把巡检结果发送到汇总服务...')
+        if send_report_to_aggregator(summary):
+            print('[*] 巡检结果已发送')
+
+    if not push_to_wechat:
+        return
+
+    if not os.path.exists('wechat.py'):
+        print('[!] 当前目录没有找到 wechat.py，无法发送微信通知')
+        return
+
+    print('[*] 正在发送微信通知...')
+    log_content = '\n'.join(report_lines)
+
+    try:
+        result = get_command_executor().capture(['python3', 'wechat.py', log_content], timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as error:
+        print(f'[!] 微信通知发送失败: {error}')
+        return
+
+    if result.returncode == 0:
+        print('[*] 微信通知发送成功')
+    else:
+        print('[!] 微信通知发送失败')
+        if result.stderr:
+            print(f'[!] 错误信息: {result.stderr}')
+
+
+def run_initialization_menu(system_info):
+    """
+    系统初始化菜单。
+    """
+    actions = {
+        'static_ip': lambda: config_static_ip(system_info),
+        'firewall': lambda: disable_firewall_and_selinux(system_info),
+        'repo': lambda: change_software_repository(system_info),
+        'tools': lambda: install_common_tools(system_info),
+        'tuning': lambda: tune_kernel_parameters(system_info),
+        'storage': lambda: tune_storage_io(system_info),
+    }
+
+    options = [
+        ('配置静态 IP', 'static_ip'),
+        ('关闭防火墙和 SELinux', 'firewall'),
+        ('更换软件源', 'repo'),
+        ('安装常用工具', 'tools'),
+        ('性能调优', 'tuning'),
+        ('存储 I/O 调优', 'storage'),
+        ('返回上一级', 'back'),
+        ('退出程序', 'exit'),
+    ]
+
+    while True:
+        clear_screen()
+        choice = select_menu_option('系统初始化', options, '上下键选择功能，回车确认')
+
+        if choice in (None, 'back'):
+            return
+
+        if choice == 'exit':
+            print('[*] 已退出程序')
+            sys.exit(0)
+
+        clear_screen()
+        actions[choice]()
+        wait_for_enter()
+
+
+def run_service_installation_menu(system_info):
+    """
+    常用服务安装菜单。
+    """
+    options = [
+        ('安装 Apache', 'apache'),
+        ('安装 Nginx（源码编译）', 'nginx'),
+        ('安装 MySQL', 'mysql'),
+        ('安装 Docker', 'docker'),
+        ('返回上一级', 'back'),
+        ('退出程序', 'exit'),
+    ]
+
+    while True:
+        clear_screen()
+        choice = select_menu_option('常用服务安装', options, '上下键选择功能，回车确认')
+
+        if choice in (None, 'back'):
             return
-        
-        print('[OK] Debian 系列系统软件源更换完成')
-    else:
-        print('[!] 当前系统不支持自动更换软件源')
+
+        if choice == 'exit':
+            print('[*] 已退出程序')
+            sys.exit(0)
+
+        clear_screen()
+        if choice == 'apache':
+            install_apache_web_server(system_info)
+        elif choice == 'nginx':
+            install_nginx_from_source(system_info)
+        elif choice == 'mysql':
+            install_mysql_database(system_info)
+        elif choice == 'docker':
+            install_docker_engine(system_info)
+
+        wait_for_enter()
 
 
 # --------------------------------------------
-# 第六部分：常用软件安装功能
-# 安装开发和运维常用的工具
+# 第十二部分：巡检报告归档
+# check_system.sh 每次都在 /opt 下生成一个报告文件，这里按天压缩归档并清理
 # --------------------------------------------
 
-def install_common_tools(system_info):
+REPORT_DIRECTORY = os.environ.get('OPS_TOOLBOX_REPORT_DIR', '/opt')
+REPORT_ARCHIVE_DIRECTORY = os.path.join(REPORT_DIRECTORY, '巡检报告归档')
+REPORT_FILE_PREFIX = '巡检报告_'
+REPORT_TIME_FORMAT = '%Y-%m-%d_%H:%M:%S'
+
+# 超过这个时间的报告才归档，最近的报告保留原文件方便直接查看
+REPORT_ARCHIVE_AFTER_SECONDS = 24 * 3600
+# 归档最多保留的天数和总大小
+REPORT_RETENTION_DAYS = 365
+REPORT_RETENTION_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def parse_report_timestamp(file_name):
     """
-    安装常用的工具软件
-    
-    这些工具包括：
-    - vim: 文本编辑器
-    - wget: 文件下载工具
-    - curl: 另一个文件下载和HTTP工具
-    - net-tools: 网络工具（ifconfig等）
-    - lrzsz: 文件上传下载工具（rz/sz命令）
-    - bash-completion: bash 命令自动补全
-    - git: 版本控制工具
-    
-    参数说明：
-        system_info: 系统信息字典
+    从报告文件名（巡检报告_2024-05-01_08:30:00.log）解析出时间戳，不是报告文件时返回 None。
     """
-    # 定义要安装的常用工具列表
-    common_tool_list = [
-        'vim',              # 文本编辑器
-        'wget',             # 下载工具
-        'curl',             # HTTP工具
-        'net-tools',        # 网络工具
-        'lrzsz',            # 上传下载工具
-        'bash-completion',  # 命令补全
-        'git'               # 版本控制
-    ]
+    if not file_name.startswith(REPORT_FILE_PREFIX) or not file_name.endswith('.log'):
+        return None
+    try:
+        return time.mktime(time.strptime(file_name[len(REPORT_FILE_PREFIX):-4], REPORT_TIME_FORMAT))
+    except ValueError:
+        return None
 
-    if system_info['system_family'] == 'debian':
-        # Debian 下这些包经常会作为其他功能前置依赖用到
-        common_tool_list.extend([
-            'ca-certificates',
-            'gnupg',
-            'lsb-release'
-        ])
 
-    # 去重，保留原顺序
-    common_tool_list = list(dict.fromkeys(common_tool_list))
-    
-    # 显示要安装的软件列表
-    print('[*] 即将安装以下常用工具：')
-    for tool_name in common_tool_list:
-        print(f'    - {tool_name}')
-    
-    # 询问用户是否确认安装
-    print()
-    user_confirm = input('是否继续安装？(y/n): ')
-    
-    if user_confirm.lower() == 'y':
-        # 创建包管理器对象
-        pkg_manager = PackageManager(system_info)
-        
-        # 使用包管理器安装软件
-        if pkg_manager.install_packages(common_tool_list):
-            print('[OK] 常用工具安装完成')
+def list_plain_reports(report_directory=None):
+    """
+    列出还没归档的报告，返回按时间排序的 [(时间戳, 路径)]。
+    """
+    report_directory = report_directory or REPORT_DIRECTORY
+    reports = []
+    try:
+        with os.scandir(report_directory) as entries:
+            for entry in entries:
+                timestamp = parse_report_timestamp(entry.name)
+                if timestamp is not None and entry.is_file():
+                    reports.append((timestamp, entry.path))
+    except OSError:
+        return []
+    reports.sort()
+    return reports
 
 
-# --------------------------------------------
-# 第八部分：数据库安装功能
-# 安装 MySQL 数据库
-# --------------------------------------------
+def _archive_paths(archive_directory, day):
+    return os.path.join(archive_directory, f'{day}.gz'), os.path.join(archive_directory, f'{day}.index')
 
-def install_mysql_database(system_info):
+
+def load_report_index(archive_directory, day):
     """
-    安装 MySQL 数据库
-    
-    MySQL 是最流行的开源关系型数据库
-    
-    参数说明：
-        system_info: 系统信息字典
+    读取某一天的归档索引，返回按时间排序的条目列表。
+
+    每个条目记录报告在归档文件里的偏移和长度，取某一份报告时只需要解压这一段。
     """
-    system_family = system_info['system_family']
-    pkg_manager = PackageManager(system_info)
-    
-    print('[*] 正在安装 MySQL 数据库...')
-    
-    if system_family == 'redhat':
-        # RedHat 系列：需要先配置 MySQL 仓库
-        print('[*] 配置 MySQL 软件源（清华大学镜像）...')
-        
-        # 生成 MySQL 仓库配置文件
-        mysql_repo_content = '''[mysql-connectors-community]
-name=MySQL Connectors Community
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/mysql/yum/mysql-connectors-community-el7-$basearch/
-enabled=1
-gpgcheck=1
-gpgkey=https://repo.mysql.com/RPM-GPG-KEY-mysql-2022
+    _, index_path = _archive_paths(archive_directory, day)
+    entries = []
+    try:
+        with open(index_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # 写到一半断电留下的半行，忽略
+                    continue
+    except OSError:
+        return []
+    entries.sort(key=lambda entry: entry['timestamp'])
+    return entries
 
-[mysql-tools-community]
-name=MySQL Tools Community
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/mysql/yum/mysql-tools-community-el7-$basearch/
-enabled=1
-gpgcheck=1
-gpgkey=https://repo.mysql.com/RPM-GPG-KEY-mysql-2022
 
-[mysql-5.7-community]
-name=MySQL 5.7 Community Server
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/mysql/yum/mysql-5.7-community-el7-$basearch/
-enabled=1
-gpgcheck=1
-gpgkey=https://repo.mysql.com/RPM-GPG-KEY-mysql-2022
-'''
-        
-        # 写入配置文件
-        with open('/etc/yum.repos.d/mysql.repo', 'w') as repo_file:
-            repo_file.write(mysql_repo_content)
-        
-        print('[*] MySQL 软件源配置完成')
-        
-        # 安装 MySQL
-        if pkg_manager.install_packages(['mysql-community-server']):
-            # 启动 MySQL 服务
-            print('[*] 启动 MySQL 服务...')
-            run_system_command(['systemctl', 'start', 'mysqld'])
-            
-            # 设置开机自启
-            print('[*] 设置 MySQL 开机自启...')
-            run_system_command(['systemctl', 'enable', 'mysqld'])
-            
-            print('[OK] MySQL 数据库安装完成')
-            print('[!] 注意：MySQL 初始密码在日志文件中')
-            print('[!] 请执行以下命令查看初始密码：')
-            print('[!]   grep "temporary password" /var/log/mysqld.log')
-        else:
-            print('[!] MySQL 安装失败')
-    
-    elif system_family == 'debian':
-        # Debian 系列：默认更适合安装 default-mysql-server
-        print('[*] 在 Debian 系列系统上安装默认 MySQL 实现...')
-        
-        if pkg_manager.install_packages(['default-mysql-server']):
-            service_name = start_and_enable_service(['mysql', 'mariadb'])
-            if service_name:
-                print(f'[OK] 数据库服务 {service_name} 已启动，并设置为开机自启')
+def archive_reports(report_directory=None, archive_directory=None, archive_after_seconds=None, now=None):
+    """
+    把较早的报告按天追加到压缩归档，并删除原文件。
 
-            print('[OK] Debian 系列数据库安装完成')
-            print('[!] 说明：Debian 默认通常安装的是 MariaDB（MySQL 兼容实现）')
-            print('[!] 建议运行 mysql_secure_installation 命令进行安全配置')
-        else:
-            print('[!] Debian 系列数据库安装失败')
-    else:
-        print('[!] 当前系统不支持自动安装 MySQL')
+    每份报告单独压缩成一个 gzip 成员追加到当天的归档文件末尾，
+    再往索引里追加一行 {name, timestamp, offset, length, size}。
+    先写归档和索引并落盘，最后才删原文件；中途中断的话下次运行会按索引跳过已归档的报告。
 
+    返回值：
+        (归档的报告数, 节省的字节数)
+    """
+    import gzip
+
+    report_directory = report_directory or REPORT_DIRECTORY
+    archive_directory = archive_directory or REPORT_ARCHIVE_DIRECTORY
+    if archive_after_seconds is None:
+        archive_after_seconds = REPORT_ARCHIVE_AFTER_SECONDS
+    cutoff = (now or time.time()) - archive_after_seconds
+
+    reports_by_day = {}
+    for timestamp, report_path in list_plain_reports(report_directory):
+        if timestamp < cutoff:
+            reports_by_day.setdefault(time.strftime('%Y-%m-%d', time.localtime(timestamp)), []).append(
+                (timestamp, report_path)
+            )
+    if not reports_by_day:
+        return 0, 0
+
+    os.makedirs(archive_directory, exist_ok=True)
+    archived_count = 0
+    saved_bytes = 0
+
+    for day, reports in sorted(reports_by_day.items()):
+        archive_path, index_path = _archive_paths(archive_directory, day)
+        archived_names = {entry['name'] for entry in load_report_index(archive_directory, day)}
+        index_lines = []
+        archived_paths = []
+
+        with open(archive_path, 'ab') as archive_file:
+            for timestamp, report_path in reports:
+                report_name = os.path.basename(report_path)
+                if report_name not in archived_names:
+                    try:
+                        with open(report_path, 'rb') as report_file:
+                            content = report_file.read()
+                    except OSError:
+                        continue
+                    member = gzip.compress(content, compresslevel=6, mtime=int(timestamp))
+                    offset = archive_file.tell()
+                    archive_file.write(member)
+                    index_lines.append(json.dumps({
+                        'name': report_name,
+                        'timestamp': timestamp,
+                        'offset': offset,
+                        'length': len(member),
+                        'size': len(content),
+                    }, ensure_ascii=False))
+                    saved_bytes += len(content) - len(member)
+                archived_paths.append(report_path)
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+
+        if index_lines:
+            with open(index_path, 'a', encoding='utf-8') as index_file:
+                index_file.write('\n'.join(index_lines) + '\n')
+                index_file.flush()
+                os.fsync(index_file.fileno())
+
+        for report_path in archived_paths:
+            try:
+                os.remove(report_path)
+                archived_count += 1
+            except OSError:
+                pass
+
+    return archived_count, saved_bytes
+
+
+def enforce_report_retention(archive_directory=None, retention_days=None, max_total_bytes=None, now=None):
+    """
+    按保留天数和总大小删除最早的整天归档，返回删除的天数。
+    """
+    archive_directory = archive_directory or REPORT_ARCHIVE_DIRECTORY
+    retention_days = REPORT_RETENTION_DAYS if retention_days is None else retention_days
+    max_total_bytes = REPORT_RETENTION_MAX_BYTES if max_total_bytes is None else max_total_bytes
+    oldest_day_kept = time.strftime('%Y-%m-%d', time.localtime((now or time.time()) - retention_days * 86400))
 
-# --------------------------------------------
-# 第九部分：Docker 安装功能
-# 使用官方脚本安装 Docker
-# --------------------------------------------
+    day_sizes = {}
+    try:
+        with os.scandir(archive_directory) as entries:
+            for entry in entries:
+                day, extension = os.path.splitext(entry.name)
+                if extension in ('.gz', '.index'):
+                    day_sizes[day] = day_sizes.get(day, 0) + entry.stat().st_size
+    except OSError:
+        return 0
+
+    total_bytes = sum(day_sizes.values())
+    removed_days = 0
+    for day in sorted(day_sizes):
+        if day >= oldest_day_kept and total_bytes <= max_total_bytes:
+            break
+        for file_path in _archive_paths(archive_directory, day):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        total_bytes -= day_sizes[day]
+        removed_days += 1
+    return removed_days
 
-def install_docker_engine(system_info=None):
+
+def fetch_report(timestamp, report_directory=None, archive_directory=None):
     """
-    安装 Docker 容器引擎
-    
-    Debian/Ubuntu 优先使用官方 APT 仓库安装；
-    其他系统保留原来的便捷脚本方式。
+    取出某个时间点的报告：优先找没归档的原文件，否则从归档里只解压对应的那一段。
+
+    参数说明：
+        timestamp: 时间戳；没有正好这个时间的报告时返回当天在它之前的最近一份
+
+    返回值：
+        (报告文件名, 报告内容)，找不到时返回 None
     """
-    if system_info is None:
-        system_info = read_system_info()
+    import bisect
+    import gzip
 
-    print('[*] 准备安装 Docker...')
+    report_directory = report_directory or REPORT_DIRECTORY
+    archive_directory = archive_directory or REPORT_ARCHIVE_DIRECTORY
 
-    if system_info['system_family'] == 'debian':
-        system_codename = system_info.get('system_codename') or ''
-        if system_codename in ['unknown', 'n/a', 'N/A', '']:
-            system_codename = normalize_debian_codename(system_info.get('system_version', ''), system_codename)
+    plain_reports = list_plain_reports(report_directory)
+    day = time.strftime('%Y-%m-%d', time.localtime(timestamp))
+    candidates = [(report_timestamp, report_path, None) for report_timestamp, report_path in plain_reports
+                  if report_timestamp <= timestamp
+                  and time.strftime('%Y-%m-%d', time.localtime(report_timestamp)) == day]
 
-        if not system_codename:
-            print('[!] 无法识别发行代号，暂时不能自动配置 Docker 官方仓库')
-            return
+    index_entries = load_report_index(archive_directory, day)
+    position = bisect.bisect_right([entry['timestamp'] for entry in index_entries], timestamp)
+    if position:
+        entry = index_entries[position - 1]
+        candidates.append((entry['timestamp'], entry['name'], entry))
 
-        docker_repo_os = 'ubuntu' if system_info.get('system_type') == 'ubuntu' else 'debian'
-        print(f'[*] 在 {docker_repo_os} 上使用 Docker 官方 APT 仓库安装...')
-        if not run_system_command(['apt', 'update']):
-            print('[!] apt update 失败，无法继续安装 Docker')
-            return
+    if not candidates:
+        return None
 
-        if not run_system_command(['apt', 'install', '-y', 'ca-certificates', 'curl', 'gnupg']):
-            print('[!] Docker 依赖安装失败')
-            return
+    _, report_path, entry = max(candidates, key=lambda candidate: candidate[0])
+    if entry is None:
+        with open(report_path, 'r', encoding='utf-8', errors='replace') as file:
+            return os.path.basename(report_path), file.read()
 
-        print('[*] 准备 Docker 仓库密钥目录...')
-        os.makedirs('/etc/apt/keyrings', exist_ok=True)
+    archive_path, _ = _archive_paths(archive_directory, day)
+    with open(archive_path, 'rb') as archive_file:
+        archive_file.seek(entry['offset'])
+        member = archive_file.read(entry['length'])
+    return entry['name'], gzip.decompress(member).decode('utf-8', errors='replace')
 
-        print('[*] 下载 Docker 官方 GPG 密钥...')
-        if not run_system_command(['curl', '-fsSL', f'https://download.docker.com/linux/{docker_repo_os}/gpg', '-o', '/etc/apt/keyrings/docker.asc']):
-            print('[!] Docker GPG 密钥下载失败')
-            return
 
-        run_system_command(['chmod', 'a+r', '/etc/apt/keyrings/docker.asc'])
+def parse_report_time_argument(time_text):
+    """
+    解析用户输入的时间，支持 "2024-05-01 08:30"、"2024-05-01 08:30:00" 和 "2024-05-01_08:30:00"。
+    """
+    time_text = time_text.strip().replace('_', ' ')
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            parsed = time.strptime(time_text, time_format)
+        except ValueError:
+            continue
+        # 只给到日期时取当天最后一份
+        if time_format == '%Y-%m-%d':
+            return time.mktime(parsed) + 86399
+        if time_format == '%Y-%m-%d %H:%M':
+            return time.mktime(parsed) + 59
+        return time.mktime(parsed)
+    return None
 
-        architecture = get_command_output(['dpkg', '--print-architecture']).strip() or 'amd64'
-        docker_repo_content = (
-            f'deb [arch={architecture} signed-by=/etc/apt/keyrings/docker.asc] '
-            f'https://download.docker.com/linux/{docker_repo_os} {system_codename} stable\n'
-        )
-        write_text_file('/etc/apt/sources.list.d/docker.list', docker_repo_content)
 
-        print('[*] 更新 Docker 软件包索引...')
-        if not run_system_command(['apt', 'update']):
-            print('[!] Docker 仓库已写入，但 apt update 失败')
-            return
+def tidy_inspection_reports():
+    """
+    归档旧报告并按保留策略清理。
+    """
+    print(f'[*] 正在归档 {REPORT_ARCHIVE_AFTER_SECONDS // 3600} 小时前的巡检报告...')
+    archived_count, saved_bytes = archive_reports()
+    print(f'[OK] 归档 {archived_count} 份报告，节省 {_format_bytes(max(saved_bytes, 0))}')
 
-        docker_packages = [
-            'docker-ce',
-            'docker-ce-cli',
-            'containerd.io',
-            'docker-buildx-plugin',
-            'docker-compose-plugin'
-        ]
-        if not run_system_command(['apt', 'install', '-y'] + docker_packages):
-            print('[!] Docker 安装失败')
-            return
+    removed_days = enforce_report_retention()
+    if removed_days:
+        print(f'[OK] 按保留策略删除了 {removed_days} 天的归档')
 
-        service_name = start_and_enable_service(['docker'])
-        if service_name:
-            print(f'[OK] {service_name} 服务已启动，并设置为开机自启')
 
-        print('[OK] Docker 安装完成')
-        return
+def show_inspection_report(time_text=None):
+    """
+    按时间查看一份历史报告。
+    """
+    if time_text is None:
+        time_text = input('请输入报告时间（例如 2024-05-01 08:30）：')
+    timestamp = parse_report_time_argument(time_text)
+    if timestamp is None:
+        print('[!] 时间格式不正确')
+        return False
 
-    print('[*] 下载 Docker 安装脚本...')
+    report = fetch_report(timestamp)
+    if report is None:
+        print('[!] 没有找到这个时间之前的当天报告')
+        return False
 
-    if not run_system_command(['wget', '-O', 'docker_install.sh', 'https://xuanyuan.cloud/docker.sh']):
-        print('[!] Docker 安装脚本下载失败')
-        return
+    report_name, content = report
+    print('=' * 60)
+    print(report_name)
+    print('=' * 60)
+    print(content)
+    return True
 
-    print('[*] 添加执行权限...')
-    run_system_command(['chmod', '+x', 'docker_install.sh'])
 
-    print('[*] 执行安装脚本...')
-    run_system_command(['bash', 'docker_install.sh'])
+def run_inspection_menu():
+    """
+    系统巡检菜单。
+    """
+    options = [
+        ('执行巡检', 'run'),
+        ('整理历史报告（压缩归档并清理）', 'tidy'),
+        ('查看历史报告', 'show'),
+        ('返回上一级', 'back'),
+    ]
+
+    while True:
+        clear_screen()
+        choice = select_menu_option('系统巡检', options, '上下键选择功能，回车确认')
+        if choice in (None, 'back'):
+            return
 
-    print('[OK] Docker 安装完成')
+        clear_screen()
+        if choice == 'run':
+            run_system_check()
+        elif choice == 'tidy':
+            tidy_inspection_reports()
+        elif choice == 'show':
+            show_inspection_report()
+        wait_for_enter()
 
 
 # --------------------------------------------
-# 第十部分：菜单系统
-# 提供上下键交互界面
+# 第十三部分：巡检历史记录
+# 巡检结果按行存进本地 SQLite，方便按主机、指标、服务状态查询
 # --------------------------------------------
 
-def _display_width(text):
-    """
-    粗略计算字符串显示宽度，中文按 2 格处理。
-    """
-    return sum(2 if ord(char) > 127 else 1 for char in str(text))
+INSPECTION_HISTORY_DB = os.environ.get(
+    'OPS_TOOLBOX_HISTORY_DB', os.path.join(TOOLBOX_STATE_DIR, 'inspection_history.db')
+)
+
+INSPECTION_HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS metrics (
+    host TEXT NOT NULL,
+    ts REAL NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS services (
+    host TEXT NOT NULL,
+    ts REAL NOT NULL,
+    service TEXT NOT NULL,
+    running INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS top_ips (
+    host TEXT NOT NULL,
+    ts REAL NOT NULL,
+    ip TEXT NOT NULL,
+    failures INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metrics_by_metric ON metrics (metric, ts, value, host);
+CREATE INDEX IF NOT EXISTS metrics_by_host ON metrics (host, ts);
+CREATE INDEX IF NOT EXISTS services_by_state ON services (service, running, ts, host);
+CREATE INDEX IF NOT EXISTS top_ips_by_ip ON top_ips (ip, ts, host);
+'''
 
 
-def _truncate_display_text(text, max_width):
+class InspectionHistory:
     """
-    按显示宽度截断字符串，避免 curses 写出边界。
+    巡检历史数据库
+
+    使用 WAL 模式，写入时不阻塞查询；一批报告在一个事务里用 executemany 写入。
+    汇总服务里会被多个线程调用，所以连接上加了锁。
     """
-    if max_width <= 0:
-        return ''
 
-    current_width = 0
-    result = []
-    for char in str(text):
-        char_width = 2 if ord(char) > 127 else 1
-        if current_width + char_width > max_width:
-            break
-        result.append(char)
-        current_width += char_width
-    return ''.join(result)
+    def __init__(self, database_path=None):
+        import sqlite3
 
+        self.database_path = database_path or INSPECTION_HISTORY_DB
+        directory = os.path.dirname(self.database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.database_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(INSPECTION_HISTORY_SCHEMA)
 
-def _center_x(width, text):
-    return max(0, (width - _display_width(text)) // 2)
+    def record(self, summaries):
+        """
+        批量写入巡检结果（collect_inspection_summary 的返回格式），返回写入的报告数。
+        """
+        metric_rows = []
+        service_rows = []
+        ip_rows = []
+        for summary in summaries:
+            host, timestamp = summary['host'], float(summary.get('timestamp') or time.time())
+            metric_rows.extend(
+                (host, timestamp, str(metric), float(value))
+                for metric, value in summary.get('metrics', {}).items()
+                if isinstance(value, (int, float))
+            )
+            service_rows.extend(
+                (host, timestamp, str(service), int(bool(running)))
+                for service, running in summary.get('services', {}).items()
+            )
+            ip_rows.extend((host, timestamp, str(ip), int(failures)) for ip, failures in summary.get('top_ips', []))
+
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT INTO metrics VALUES (?, ?, ?, ?)', metric_rows)
+            self.connection.executemany('INSERT INTO services VALUES (?, ?, ?, ?)', service_rows)
+            self.connection.executemany('INSERT INTO top_ips VALUES (?, ?, ?, ?)', ip_rows)
+        return len(summaries)
+
+    def find_hosts(self, conditions, since):
+        """
+        找出 since 之后满足任意一个条件的主机。
+
+        参数说明：
+            conditions: parse_history_condition 的返回值列表
+
+        返回值：
+            [(主机, 条件说明, 最近一次满足的时间, 期间最大值)]，按主机排序
+        """
+        queries = []
+        parameters = []
+        for kind, name, operator, threshold in conditions:
+            if kind == 'metric':
+                description = f'{name} {operator} {threshold:g}'
+            elif kind == 'service':
+                description = f'{name} {threshold}'
+            else:
+                description = f'SSH 失败来源 {name}'
+            if kind == 'metric':
+                aggregate = 'MAX(value)' if operator == '>' else 'MIN(value)'
+                queries.append(
+                    f'SELECT host, ?, MAX(ts), {aggregate} FROM metrics '
+                    f'WHERE metric = ? AND ts >= ? AND value {operator} ? GROUP BY host'
+                )
+                parameters.extend([description, name, since, threshold])
+            elif kind == 'service':
+                queries.append(
+                    'SELECT host, ?, MAX(ts), NULL FROM services '
+                    'WHERE service = ? AND running = ? AND ts >= ? GROUP BY host'
+                )
+                parameters.extend([description, name, 1 if threshold == 'up' else 0, since])
+            else:
+                queries.append(
+                    'SELECT host, ?, MAX(ts), MAX(failures) FROM top_ips '
+                    'WHERE ip = ? AND ts >= ? GROUP BY host'
+                )
+                parameters.extend([description, name, since])
 
+        if not queries:
+            return []
+        with self.lock:
+            rows = self.connection.execute(' UNION ALL '.join(queries), parameters).fetchall()
+        return sorted(rows)
 
-def _run_menu_screen(stdscr, title, options, subtitle='上下键选择，回车确认，Esc 返回'):
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def parse_history_condition(condition_text):
     """
-    curses 菜单界面。
+    解析查询条件：
+        'disk_used_percent:/>85'、'memory_used_percent<10'  指标比较
+        'mysql=down'、'docker=up'                          服务状态
+        'ip=1.2.3.4'                                       SSH 失败来源 IP
+
+    返回值：
+        (类型, 名称, 比较符, 阈值)，格式不对时抛 ValueError
     """
-    curses.curs_set(0)
-    stdscr.keypad(True)
+    for operator in ('>', '<'):
+        name, found, value = condition_text.rpartition(operator)
+        if found and name:
+            return 'metric', name.strip(), operator, float(value)
 
-    if curses.has_colors():
-        curses.start_color()
-        curses.use_default_colors()
-        curses.init_pair(1, curses.COLOR_BLACK, curses.COLOR_CYAN)
-        curses.init_pair(2, curses.COLOR_CYAN, -1)
+    name, found, value = condition_text.partition('=')
+    if found and name.strip() == 'ip':
+        return 'ip', value.strip(), '=', value.strip()
+    if found and value.strip() in ('up', 'down'):
+        return 'service', name.strip(), '=', value.strip()
+    raise ValueError(f'无法识别的查询条件：{condition_text}')
 
-    selected_index = 0
 
-    while True:
-        stdscr.clear()
-        height, width = stdscr.getmaxyx()
+def record_inspection_history(summaries, database_path=None):
+    """
+    把巡检结果写进历史数据库，失败时只打印警告，不影响巡检本身。
+    """
+    try:
+        history = InspectionHistory(database_path)
+    except Exception as error:
+        print(f'[!] 警告：无法打开巡检历史数据库: {error}')
+        return False
+    try:
+        history.record(summaries)
+        return True
+    except Exception as error:
+        print(f'[!] 警告：写入巡检历史失败: {error}')
+        return False
+    finally:
+        history.close()
 
-        title_text = _truncate_display_text(title, max(0, width - 4))
-        subtitle_text = _truncate_display_text(subtitle, max(0, width - 4))
-        footer_text = '上/下选择   Enter 确认   Esc 返回'
-        footer_text = _truncate_display_text(footer_text, max(0, width - 4))
 
-        stdscr.addstr(1, _center_x(width, title_text), title_text, curses.A_BOLD)
-        if curses.has_colors():
-            stdscr.addstr(3, _center_x(width, subtitle_text), subtitle_text, curses.color_pair(2))
-        else:
-            stdscr.addstr(3, _center_x(width, subtitle_text), subtitle_text)
+def query_inspection_history(condition_texts, days=7, database_path=None):
+    """
+    按条件查询巡检历史并打印结果，例如：
+        --history 'disk_used_percent:/>85' --history 'mysql=down' --history-days 7
+    """
+    try:
+        conditions = [parse_history_condition(text) for text in condition_texts]
+    except ValueError as error:
+        print(f'[!] {error}')
+        return False
 
-        if width > 4:
-            stdscr.hline(4, 2, curses.ACS_HLINE, width - 4)
+    database_path = database_path or INSPECTION_HISTORY_DB
+    if not os.path.exists(database_path):
+        print(f'[!] 巡检历史数据库不存在：{database_path}')
+        return False
 
-        top_row = 6
-        max_label_width = max(0, width - 10)
+    history = InspectionHistory(database_path)
+    try:
+        started = time.perf_counter()
+        rows = history.find_hosts(conditions, time.time() - days * 86400)
+        elapsed = time.perf_counter() - started
+    finally:
+        history.close()
 
-        for idx, option in enumerate(options):
-            label = option[0] if isinstance(option, tuple) else str(option)
-            label = _truncate_display_text(label, max_label_width)
-            row = top_row + idx
-            if row >= height - 2:
-                break
+    print(f'最近 {days} 天满足条件的主机（查询耗时 {elapsed * 1000:.1f} ms）')
+    print('=' * 60)
+    for host, description, last_seen, value in rows:
+        value_text = '' if value is None else f'  峰值 {value:g}'
+        print(f"{host:<24} {description:<28} 最近 {time.strftime('%m-%d %H:%M', time.localtime(last_seen))}{value_text}")
+    if not rows:
+        print('没有满足条件的主机')
+    print('=' * 60)
+    return True
 
-            text = '> ' + label if idx == selected_index else '  ' + label
-            if idx == selected_index:
-                style = curses.A_BOLD | (curses.color_pair(1) if curses.has_colors() else curses.A_REVERSE)
-                stdscr.addstr(row, 4, text, style)
-            else:
-                stdscr.addstr(row, 4, text)
 
-        if height >= 2:
-            stdscr.addstr(height - 2, _center_x(width, footer_text), footer_text)
+# --------------------------------------------
+# 第十四部分：巡检汇总服务
+# 多台主机把巡检结果发给一台汇总服务，按时间窗口合并后只发一条微信
+# --------------------------------------------
 
-        stdscr.refresh()
-        key = stdscr.getch()
+AGGREGATION_WINDOW_SECONDS = 300
+AGGREGATION_MAX_REPORT_BYTES = 1024 * 1024
+# 企业微信文本消息最长 2048 字节
+WECHAT_MESSAGE_MAX_BYTES = 2048
 
-        if key in (curses.KEY_UP, ord('k'), ord('K')):
-            selected_index = (selected_index - 1) % len(options)
-        elif key in (curses.KEY_DOWN, ord('j'), ord('J')):
-            selected_index = (selected_index + 1) % len(options)
-        elif key in (10, 13, curses.KEY_ENTER):
-            selected_option = options[selected_index]
-            if isinstance(selected_option, tuple):
-                return selected_option[1]
-            return selected_option
-        elif key == 27:
-            return None
+# 巡检完成后把结果发到这个汇总地址（通过 --report-to 或环境变量设置）
+REPORT_AGGREGATOR_URL = os.environ.get('OPS_TOOLBOX_REPORT_URL')
+# 汇总服务和各主机共用的口令，放在 X-Report-Token 请求头里；监听非本机地址时必须设置
+REPORT_AGGREGATOR_TOKEN = os.environ.get('OPS_TOOLBOX_REPORT_TOKEN')
 
 
-def select_menu_option(title, options, subtitle='上下键选择，回车确认，Esc 返回'):
+def _coerce_report_number(value, field_name, number_type):
     """
-    使用 curses 提供菜单选择；不支持时退回到数字输入。
+    把报告里的数值字段转换成 number_type（float 或 int），不是有限数字时抛 ValueError。
     """
-    try:
-        return curses.wrapper(_run_menu_screen, title, options, subtitle)
-    except curses.error:
-        print(f'\n{title}')
-        print(subtitle)
-        for index, option in enumerate(options, start=1):
-            label = option[0] if isinstance(option, tuple) else str(option)
-            print(f'  {index}. {label}')
-
-        fallback_choice = input('请输入编号: ').strip()
-        if not fallback_choice.isdigit():
-            return None
-
-        fallback_index = int(fallback_choice) - 1
-        if fallback_index < 0 or fallback_index >= len(options):
-            return None
+    import math
 
-        selected_option = options[fallback_index]
-        if isinstance(selected_option, tuple):
-            return selected_option[1]
-        return selected_option
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'{field_name} 必须是数字')
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'{field_name} 必须是数字') from None
+    if not math.isfinite(number):
+        raise ValueError(f'{field_name} 必须是有限的数字')
+    return int(number) if number_type is int else number
 
 
-def confirm_with_menu(prompt, default=True):
+class ReportAggregator:
     """
-    用菜单做是/否确认。
+    巡检结果汇总
+
+    收到的报告只在锁里做一次字典合并，几千份/分钟也不会成为瓶颈；
+    同一个异常（比如"磁盘 / 使用率超过 90%"）不管多少台主机报告，汇总里都只占一行。
     """
-    if default:
-        options = [('是', True), ('否', False)]
-    else:
-        options = [('否', False), ('是', True)]
 
-    result = select_menu_option(prompt, options, '上下键选择，回车确认')
-    if result is None:
-        return False
-    return result
+    def __init__(self, send_function, history=None):
+        self.send_function = send_function
+        self.history = history
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.window_started = time.time()
+        self.pending_reports = []
+        self.report_count = 0
+        self.hosts = set()
+        self.unhealthy_hosts = set()
+        self.findings = {}
+
+    def add_report(self, report):
+        """
+        合并一份报告，格式不对时抛 ValueError。
 
+        数值字段在这里就转换好类型，保证后面批量写历史数据库时不会因为一份坏报告整批回滚。
+        """
+        if not isinstance(report, dict) or not isinstance(report.get('host'), str):
+            raise ValueError('报告缺少 host 字段')
+        findings = report.get('findings', [])
+        if not isinstance(findings, list):
+            raise ValueError('findings 必须是列表')
+        if not isinstance(report.get('metrics', {}), dict) or not isinstance(report.get('services', {}), dict):
+            raise ValueError('metrics 和 services 必须是字典')
+        top_ips = report.get('top_ips', [])
+        if not isinstance(top_ips, list) or not all(isinstance(item, list) and len(item) == 2 for item in top_ips):
+            raise ValueError('top_ips 必须是 [IP, 次数] 列表')
+
+        host = report['host']
+        normalized_report = {
+            'host': host,
+            'timestamp': _coerce_report_number(report.get('timestamp') or time.time(), 'timestamp', float),
+            'metrics': {
+                str(metric): _coerce_report_number(value, f'metrics.{metric}', float)
+                for metric, value in report.get('metrics', {}).items()
+                if value is not None
+            },
+            'services': {str(service): bool(running) for service, running in report.get('services', {}).items()},
+            'top_ips': [[str(ip), _coerce_report_number(failures, 'top_ips 次数', int)] for ip, failures in top_ips],
+        }
+        with self.lock:
+            if self.history is not None:
+                self.pending_reports.append(normalized_report)
+            self.report_count += 1
+            self.hosts.add(host)
+            for finding in findings:
+                if not isinstance(finding, dict) or 'key' not in finding:
+                    continue
+                entry = self.findings.setdefault(
+                    str(finding['key']),
+                    {'message': str(finding.get('message', finding['key'])), 'hosts': set()}
+                )
+                entry['hosts'].add(host)
+                self.unhealthy_hosts.add(host)
+
+    def take_digest(self):
+        """
+        取出当前窗口的汇总文字并开始新窗口；窗口内没有收到报告时返回 None。
 
-def clear_screen():
+        配置了历史数据库时，本窗口收到的报告也在这里一次性批量写入。
+        """
+        with self.lock:
+            if not self.report_count:
+                self.window_started = time.time()
+                return None
+            window_started, report_count = self.window_started, self.report_count
+            hosts, unhealthy_hosts, findings = self.hosts, self.unhealthy_hosts, self.findings
+            pending_reports = self.pending_reports
+            self._reset()
+
+        if pending_reports:
+            try:
+                self.history.record(pending_reports)
+            except Exception as error:
+                print(f'[!] 警告：写入巡检历史失败: {error}')
+
+        return format_aggregation_digest(window_started, time.time(), report_count, hosts, unhealthy_hosts, findings)
+
+    def flush(self):
+        digest = self.take_digest()
+        if digest is not None:
+            self.send_function(digest)
+
+
+def format_aggregation_digest(window_started, window_ended, report_count, hosts, unhealthy_hosts, findings):
     """
-    清屏。
+    生成汇总消息，超过企业微信长度上限时省略靠后的异常项。
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    time_format = '%m-%d %H:%M'
+    lines = [
+        f"巡检汇总 {time.strftime(time_format, time.localtime(window_started))}"
+        f" ~ {time.strftime(time_format, time.localtime(window_ended))}",
+        f'共 {report_count} 份报告，来自 {len(hosts)} 台主机，其中 {len(unhealthy_hosts)} 台有异常',
+    ]
+    if not findings:
+        lines.append('所有主机均未发现异常')
+        return '\n'.join(lines)
+
+    lines.append('')
+    ordered_findings = sorted(findings.values(), key=lambda entry: (-len(entry['hosts']), entry['message']))
+    used_bytes = len('\n'.join(lines).encode('utf-8'))
+    for index, entry in enumerate(ordered_findings):
+        sample_hosts = sorted(entry['hosts'])[:3]
+        host_text = '、'.join(sample_hosts) + (' 等' if len(entry['hosts']) > len(sample_hosts) else '')
+        line = f"- {entry['message']}：{len(entry['hosts'])} 台（{host_text}）"
+        remaining = len(ordered_findings) - index
+        # 给"另有 N 项"留出位置
+        if used_bytes + len(line.encode('utf-8')) + 40 > WECHAT_MESSAGE_MAX_BYTES:
+            lines.append(f'……另有 {remaining} 项异常未列出')
+            break
+        lines.append(line)
+        used_bytes += len(line.encode('utf-8')) + 1
+    return '\n'.join(lines)
 
 
-def wait_for_enter(message='按回车继续...'):
+def send_digest_to_wechat(message):
     """
-    等待用户确认后继续。
+    通过 wechat.py 里的 send_wechat_alert 发送汇总消息。
     """
-    input(f'\n{message}')
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+    if script_directory not in sys.path:
+        sys.path.insert(0, script_directory)
+    try:
+        import wechat
+    except ImportError as error:
+        print(f'[!] 无法加载 wechat.py（{error}），汇总内容如下：')
+        print(message)
+        return
+    wechat.send_wechat_alert(wechat.WECOM_WEBHOOK_URL, message)
 
 
-def _run_optional_function(function_name, *args):
-    """
-    按函数名调用功能，没实现时给出友好提示。
-    """
-    function_object = globals().get(function_name)
-    if callable(function_object):
-        return function_object(*args)
+def _make_report_handler(aggregator, token=None):
+    import hmac
+    from http.server import BaseHTTPRequestHandler
 
-    print(f'[!] 这个功能还没在脚本里实现：{function_name}')
-    return None
+    class ReportHandler(BaseHTTPRequestHandler):
+        """
+        POST /report 接收一份 JSON 报告；GET /health 返回当前窗口的统计。
+        """
 
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != '/report':
+                self._reply(404, {'error': 'not found'})
+                return
+            if token and not hmac.compare_digest(
+                    self.headers.get('X-Report-Token', '').encode('utf-8'), token.encode('utf-8')):
+                self._reply(401, {'error': 'bad token'})
+                return
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                content_length = -1
+            if not 0 < content_length <= AGGREGATION_MAX_REPORT_BYTES:
+                self._reply(413 if content_length > 0 else 411, {'error': 'bad content length'})
+                return
+            try:
+                aggregator.add_report(json.loads(self.rfile.read(content_length)))
+            except ValueError as error:
+                self._reply(400, {'error': str(error)})
+                return
+            self._reply(202, {'accepted': True})
 
-# --------------------------------------------
-# 第十一部分：系统巡检功能
-# 检查系统运行状态
-# --------------------------------------------
+        def do_GET(self):
+            if self.path != '/health':
+                self._reply(404, {'error': 'not found'})
+                return
+            with aggregator.lock:
+                stats = {'reports': aggregator.report_count, 'hosts': len(aggregator.hosts)}
+            self._reply(200, stats)
 
-def run_system_check():
-    """
-    执行系统巡检，并可选发送微信通知。
-    """
-    print('[*] 准备执行系统巡检...')
+        def log_message(self, format, *args):
+            pass
 
-    if not os.path.exists('check_system.sh'):
-        print('[!] 当前目录没有找到 check_system.sh，暂时无法执行巡检')
-        return
+    return ReportHandler
 
-    push_to_wechat = confirm_with_menu('是否推送微信告警？', default=False)
 
-    print('[*] 正在执行巡检脚本...')
-    with open('check_system.log', 'w', encoding='utf-8') as log_file:
-        subprocess.run(['bash', 'check_system.sh'], stdout=log_file, stderr=log_file)
+def run_aggregation_server(listen_address, window_seconds=AGGREGATION_WINDOW_SECONDS,
+                           send_function=send_digest_to_wechat, history_database=None, token=None):
+    """
+    启动汇总服务，每 window_seconds 秒发一次汇总，Ctrl+C 退出时把剩下的也发出去。
 
-    print('\n' + '=' * 60)
-    print('巡检结果')
-    print('=' * 60)
-    subprocess.run(['cat', 'check_system.log'])
-    print('=' * 60)
+    参数说明：
+        listen_address: '端口' 或 '地址:端口'，只写端口时只监听 127.0.0.1
+        token: 各主机上报时要带的口令，默认取 OPS_TOOLBOX_REPORT_TOKEN；监听非本机地址时必须设置
 
-    if not push_to_wechat:
-        return
+    服务没有启动时返回 False。
+    """
+    import ipaddress
+    from http.server import ThreadingHTTPServer
 
-    if not os.path.exists('wechat.py'):
-        print('[!] 当前目录没有找到 wechat.py，无法发送微信通知')
-        return
+    if window_seconds < 1:
+        raise ValueError('汇总时间窗口至少 1 秒')
 
-    print('[*] 正在发送微信通知...')
-    with open('check_system.log', 'r', encoding='utf-8') as log_file:
-        log_content = log_file.read()
+    class ReportServer(ThreadingHTTPServer):
+        daemon_threads = True
+        # 几百台主机的 cron 同一分钟触发时，默认的 5 个排队连接不够用
+        request_queue_size = 256
 
-    result = subprocess.run(
-        ['python3', 'wechat.py', log_content],
-        capture_output=True,
-        text=True
-    )
+    host, _, port = listen_address.rpartition(':')
+    host = host.strip('[]') or '127.0.0.1'
+    token = token or REPORT_AGGREGATOR_TOKEN
+    try:
+        loopback = host == 'localhost' or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    # 没有口令时谁都能往微信群里推假消息，只允许本机上报
+    if not loopback and not token:
+        print(f'[!] 监听 {host} 会接受其他主机的上报，请先设置 OPS_TOOLBOX_REPORT_TOKEN 口令')
+        return False
 
-    if result.returncode == 0:
-        print('[*] 微信通知发送成功')
-    else:
-        print('[!] 微信通知发送失败')
-        if result.stderr:
-            print(f'[!] 错误信息: {result.stderr}')
+    try:
+        history = InspectionHistory(history_database)
+    except Exception as error:
+        print(f'[!] 警告：无法打开巡检历史数据库，本次不保存历史: {error}')
+        history = None
+    aggregator = ReportAggregator(send_function, history)
+    server = ReportServer((host, int(port)), _make_report_handler(aggregator, token))
+    stop_event = threading.Event()
+
+    def flush_periodically():
+        while not stop_event.wait(window_seconds):
+            aggregator.flush()
+
+    flush_thread = threading.Thread(target=flush_periodically, name='aggregation-flush', daemon=True)
+    flush_thread.start()
+    print(f'[*] 巡检汇总服务已启动：{host}:{port}，每 {window_seconds} 秒汇总一次')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\n[*] 正在停止汇总服务...')
+    finally:
+        stop_event.set()
+        server.server_close()
+        aggregator.flush()
+        if history is not None:
+            history.close()
+    return True
 
 
-def run_initialization_menu(system_info):
+def send_report_to_aggregator(report, aggregator_url=None, timeout=10):
     """
-    系统初始化菜单。
+    把巡检结果发给汇总服务，成功返回 True。
     """
-    actions = {
-        'static_ip': lambda: config_static_ip(system_info),
-        'firewall': lambda: disable_firewall_and_selinux(system_info),
-        'repo': lambda: change_software_repository(system_info),
-        'tools': lambda: install_common_tools(system_info),
-    }
-
-    options = [
-        ('配置静态 IP', 'static_ip'),
-        ('关闭防火墙和 SELinux', 'firewall'),
-        ('更换软件源', 'repo'),
-        ('安装常用工具', 'tools'),
-        ('返回上一级', 'back'),
-        ('退出程序', 'exit'),
-    ]
-
-    while True:
-        clear_screen()
-        choice = select_menu_option('系统初始化', options, '上下键选择功能，回车确认')
+    import urllib.error
+    import urllib.request
+
+    aggregator_url = (aggregator_url or REPORT_AGGREGATOR_URL).rstrip('/')
+    if not aggregator_url.endswith('/report'):
+        aggregator_url += '/report'
+    headers = {'Content-Type': 'application/json'}
+    if REPORT_AGGREGATOR_TOKEN:
+        headers['X-Report-Token'] = REPORT_AGGREGATOR_TOKEN
+    request = urllib.request.Request(
+        aggregator_url,
+        data=json.dumps(report, ensure_ascii=False).encode('utf-8'),
+        headers=headers,
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status == 202
+    except (urllib.error.URLError, OSError) as error:
+        print(f'[!] 发送巡检结果到汇总服务失败: {error}')
+        return False
 
-        if choice in (None, 'back'):
-            return
 
-        if choice == 'exit':
-            print('[*] 已退出程序')
-            sys.exit(0)
+def parse_command_line(argv=None):
+    """
+    解析命令行参数。
+    """
+    import argparse
 
-        clear_screen()
-        actions[choice]()
-        wait_for_enter()
+    def positive_integer(text):
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'不是整数：{text}')
+        if value < 1:
+            raise argparse.ArgumentTypeError(f'至少为 1：{text}')
+        return value
+
+    parser = argparse.ArgumentParser(description='Linux 运维工具箱')
+    parser.add_argument(
+        '--force',
+        action='append',
+        default=[],
+        metavar='STEP',
+        choices=sorted(JOURNALED_STEPS) + ['all'],
+        help='忽略步骤状态记录，强制重做某个步骤（可重复指定）：'
+             + '、'.join(f'{name}={label}' for name, label in JOURNALED_STEPS.items())
+             + '，all=全部'
+    )
+    parser.add_argument(
+        '--command-timings',
+        metavar='FILE',
+        help='退出时打印命令耗时汇总，并把每条命令的墙钟/CPU 时间写入 JSON 文件'
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help='记录每个功能和命令的耗时，退出时导出；.folded 结尾导出火焰图折叠栈，否则导出 Chrome trace JSON'
+    )
+    parser.add_argument(
+        '--startup-benchmark',
+        action='store_true',
+        help='测量启动各阶段耗时（导入、系统信息、curses 加载）后退出'
+    )
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument(
+        '--record',
+        metavar='FILE',
+        help='照常执行，同时把每条命令的输出、退出码和真实耗时录制到 JSONL 文件'
+    )
+    replay_group.add_argument(
+        '--replay',
+        metavar='FILE',
+        help='不执行真实命令，按录制文件回放；写入的系统文件会重定向到临时目录'
+    )
+    parser.add_argument(
+        '--replay-speed',
+        type=float,
+        default=1.0,
+        metavar='SCALE',
+        help='回放耗时缩放比例：1=真实耗时，0.1=快 10 倍，0=不等待（默认 1）'
+    )
+    parser.add_argument(
+        '--replay-root',
+        metavar='DIR',
+        help='回放时系统文件的写入目录（默认新建临时目录）'
+    )
+    parser.add_argument(
+        '--tidy-reports',
+        action='store_true',
+        help='不进入菜单，归档旧的巡检报告并按保留策略清理后退出（适合放进 cron）'
+    )
+    parser.add_argument(
+        '--show-report',
+        metavar='TIME',
+        help='不进入菜单，打印某个时间的巡检报告后退出，例如 "2024-05-01 08:30"'
+    )
+    parser.add_argument(
+        '--history',
+        action='append',
+        default=[],
+        metavar='CONDITION',
+        help='查询巡检历史后退出，可重复指定（满足任意一个即列出）：'
+             '"disk_used_percent:/>85"、"memory_used_percent>90"、"mysql=down"、"ip=1.2.3.4"'
+    )
+    parser.add_argument(
+        '--history-days',
+        type=int,
+        default=7,
+        metavar='DAYS',
+        help='查询最近多少天的巡检历史（默认 7 天）'
+    )
+    parser.add_argument(
+        '--report-to',
+        metavar='URL',
+        help='巡检结果发送到这个汇总服务地址，由汇总服务统一推送微信'
+    )
+    parser.add_argument(
+        '--send-report',
+        action='store_true',
+        help='不进入菜单，采集一次巡检结果发送到 --report-to 后退出（适合放进 cron）'
+    )
+    parser.add_argument(
+        '--aggregate-server',
+        metavar='[HOST:]PORT',
+        help='以巡检汇总服务模式运行，接收各主机的巡检结果并定时合并推送；'
+             '只写端口时只监听 127.0.0.1，监听其他地址需要设置 OPS_TOOLBOX_REPORT_TOKEN 口令'
+    )
+    parser.add_argument(
+        '--aggregate-window',
+        type=positive_integer,
+        default=AGGREGATION_WINDOW_SECONDS,
+        metavar='SECONDS',
+        help=f'汇总服务合并推送的时间窗口（默认 {AGGREGATION_WINDOW_SECONDS} 秒）'
+    )
+    return parser.parse_args(argv)
 
 
-def run_service_installation_menu(system_info):
+def run_startup_benchmark(repeat=5):
     """
-    常用服务安装菜单。
+    测量启动耗时：子进程冷启动导入、系统信息（无缓存/有缓存）、curses 加载。
+
+    目标是从启动到第一帧菜单不超过 50 毫秒。
     """
-    options = [
-        ('安装 Apache（暂未实现）', 'apache'),
-        ('安装 Nginx（暂未实现）', 'nginx'),
-        ('安装 MySQL', 'mysql'),
-        ('安装 Docker', 'docker'),
-        ('返回上一级', 'back'),
-        ('退出程序', 'exit'),
+    import contextlib
+    import io
+
+    def measure(function):
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                function()
+            durations.append(time.perf_counter() - started)
+        return min(durations)
+
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+    import_command = [
+        sys.executable, '-c',
+        f'import sys; sys.path.insert(0, {script_directory!r}); import ops_toolbox'
     ]
+    process_startup = measure(lambda: subprocess.run(import_command, check=False))
 
-    while True:
-        clear_screen()
-        choice = select_menu_option('常用服务安装', options, '上下键选择功能，回车确认')
+    facts_cold = measure(lambda: gather_host_facts(use_cache=False))
+    facts_cached = measure(gather_host_facts)
 
-        if choice in (None, 'back'):
-            return
+    curses_started = time.perf_counter()
+    curses_available = load_curses() is not None
+    curses_import = time.perf_counter() - curses_started
 
-        if choice == 'exit':
-            print('[*] 已退出程序')
-            sys.exit(0)
+    estimated_first_frame = process_startup + facts_cached + curses_import
 
-        clear_screen()
-        if choice == 'apache':
-            _run_optional_function('install_apache_web_server', system_info)
-        elif choice == 'nginx':
-            _run_optional_function('install_nginx_from_source', system_info)
-        elif choice == 'mysql':
-            install_mysql_database(system_info)
-        elif choice == 'docker':
-            install_docker_engine(system_info)
+    rows = [
+        ('进程启动 + 导入工具箱（子进程实测）', process_startup),
+        ('本进程导入工具箱', STARTUP_TIMINGS.get('import', 0.0)),
+        ('读取系统信息（无缓存）', facts_cold),
+        ('读取系统信息（有缓存）', facts_cached),
+        ('加载 curses' + ('' if curses_available else '（不可用）'), curses_import),
+        ('预计到第一帧菜单', estimated_first_frame),
+    ]
 
-        wait_for_enter()
+    print('启动耗时测量（每项取 %d 次中的最小值）' % repeat)
+    print('=' * 60)
+    for label, seconds in rows:
+        padding = ' ' * max(1, 40 - _display_width(label))
+        print(f'{label}{padding}{seconds * 1000:8.2f} ms')
+    print('=' * 60)
+    if estimated_first_frame <= 0.05:
+        print('[OK] 启动耗时在 50 ms 目标以内')
+    else:
+        print('[!] 启动耗时超过 50 ms 目标')
 
 
-def main():
+def main(argv=None):
     """
     程序入口。
     """
+    arguments = parse_command_line(argv)
+    FORCED_STEPS.update(arguments.force)
+
+    if arguments.startup_benchmark:
+        run_startup_benchmark()
+        return
+
+    global TRACE_ENABLED
+    TRACE_ENABLED = bool(arguments.trace)
+
+    if arguments.record:
+        use_command_executor(RecordingExecutor(arguments.record))
+    elif arguments.replay:
+        executor = ReplayExecutor(arguments.replay, arguments.replay_speed, arguments.replay_root)
+        use_command_executor(executor)
+        # 回放时步骤状态日志也写进沙盒，避免和本机的真实记录互相影响
+        global STEP_JOURNAL_FILE
+        STEP_JOURNAL_FILE = executor.resolve_path(STEP_JOURNAL_FILE)
+
+    global REPORT_AGGREGATOR_URL
+    if arguments.report_to:
+        REPORT_AGGREGATOR_URL = arguments.report_to
+
+    if arguments.history:
+        sys.exit(0 if query_inspection_history(arguments.history, arguments.history_days) else 1)
+    if arguments.tidy_reports:
+        tidy_inspection_reports()
+        return
+    if arguments.show_report:
+        sys.exit(0 if show_inspection_report(arguments.show_report) else 1)
+    if arguments.aggregate_server:
+        if not run_aggregation_server(arguments.aggregate_server, arguments.aggregate_window):
+            sys.exit(1)
+        return
+    if arguments.send_report:
+        if not REPORT_AGGREGATOR_URL:
+            print('[!] 请用 --report-to 指定汇总服务地址')
+            sys.exit(1)
+        summary = collect_inspection_summary()
+        record_inspection_history([summary])
+        sys.exit(0 if send_report_to_aggregator(summary) else 1)
+
+    try:
+        with trace_span('session', 'session'):
+            run_toolbox()
+    finally:
+        get_command_executor().close()
+        if arguments.command_timings:
+            dump_command_timings(arguments.command_timings)
+        if arguments.trace:
+            export_trace(arguments.trace)
+
+
+def run_toolbox():
+    """
+    启动检查并进入主菜单。
+    """
     clear_screen()
     print('=' * 60)
     print('Linux 运维工具箱')
     print('=' * 60)
     print()
 
+    step_started = time.perf_counter()
     check_if_linux_system()
+    STARTUP_TIMINGS['check_system'] = time.perf_counter() - step_started
     print()
 
-    system_info = read_system_info()
+    step_started = time.perf_counter()
+    system_info = load_host_facts()
+    STARTUP_TIMINGS['host_facts'] = time.perf_counter() - step_started
     print()
 
     if not system_info.get('is_supported'):
@@ -1805,6 +8032,7 @@ def main():
         ('系统初始化', 'init'),
         ('安装常用服务', 'service'),
         ('系统巡检', 'check'),
+        ('实时监控', 'dashboard'),
         ('退出程序', 'exit'),
     ]
 
@@ -1822,8 +8050,12 @@ def main():
         elif choice == 'service':
             run_service_installation_menu(system_info)
         elif choice == 'check':
-            run_system_check()
-            wait_for_enter()
+            run_inspection_menu()
+        elif choice == 'dashboard':
+            show_live_dashboard()
+
+
+STARTUP_TIMINGS['import'] = time.perf_counter() - _MODULE_IMPORT_STARTED
 
 
 if __name__ == '__main__':
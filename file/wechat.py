@@ -4,10 +4,17 @@
 企业微信告警脚本
 """
 
+import os
 import requests
 import sys
 import json
 
+# 企业微信机器人地址，可以用环境变量 WECOM_WEBHOOK_URL 覆盖
+WECOM_WEBHOOK_URL = os.environ.get(
+    "WECOM_WEBHOOK_URL",
+    "https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=cf367029-1ab1-462c-8e4a-944b4547df94"
+)
+
 # 移除is_markdown函数，不再检测消息格式
 
 def send_wechat_alert(webhook_url, message):
@@ -41,7 +48,7 @@ def send_wechat_alert(webhook_url, message):
 
 
 if __name__ == "__main__":
-    webhook_url = "https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=cf367029-1ab1-462c-8e4a-944b4547df94"
+    webhook_url = WECOM_WEBHOOK_URL
 
     if not webhook_url:
         print("错误: 请设置WECOM_WEBHOOK_URL")